@@ -2,6 +2,7 @@ import threading
 import queue
 import time
 from PyQt6.QtCore import QObject, pyqtSignal, QThread, QMutex
+from search_query import SearchQuery
 
 
 class Worker(QObject):
@@ -134,42 +135,48 @@ class AsyncEmailProcessor:
         self.thread_pool = ThreadPool(max_workers=4)
         self.thread_pool.start()
         self.cache = AsyncOperationCache(max_size=100)
+        self.folder_stats = {}
+        # 从本地邮件存储恢复、还没有与服务器核对过UID的邮件列表（缓存键）
+        self.restored_keys = set()
         
-    def fetch_emails_async(self, callback=None, error_callback=None, folder='INBOX', search_criteria='ALL'):
-        """异步获取邮件"""
+    def fetch_emails_async(self, callback=None, error_callback=None, folder='INBOX', search_criteria='ALL',
+                           incremental=None):
+        """异步获取邮件
+        
+        Args:
+            callback: 完成时的回调，参数为邮件列表
+            error_callback: 出错时的回调
+            folder: 文件夹名称
+            search_criteria: IMAP搜索条件字符串或 SearchQuery，由服务器筛选
+            incremental: 是否增量同步，None 时使用连接器的配置（只适用于 'ALL'）
+        """
         cache_key = f"emails_{folder}_{search_criteria}"
         
-        cached_result = self.cache.get(cache_key)
+        # 增量同步只适用于获取整个文件夹
+        if incremental is None:
+            incremental = getattr(self.email_connector, 'incremental_sync', False)
+        if incremental and str(search_criteria) == 'ALL':
+            return self._sync_emails_async(cache_key, folder, callback, error_callback)
+        
+        # 筛选条件（如未读、最近N天）的结果会随时间变化，每次都由服务器重新搜索
+        cached_result = None if isinstance(search_criteria, SearchQuery) else self.cache.get(cache_key)
         if cached_result:
             print(f"使用缓存的邮件列表: {len(cached_result)} 封邮件")
             if callback:
                 callback(cached_result)
             return None
         
-        if not self.email_connector.mail:
-            print("邮箱未连接，尝试重新连接...")
-            if not self.email_connector.connect():
-                if error_callback:
-                    error_callback("邮箱连接失败，请重新登录")
-                return None
-        
         def fetch_emails_wrapper():
-            """包装获取邮件方法，确保使用已连接的实例，并添加重试机制"""
+            """包装获取邮件方法，从连接池借用连接，并添加重试机制"""
             # 添加重试机制
             max_retries = 3
             retry_count = 0
             
             while retry_count < max_retries:
                 try:
-                    # 检查连接是否有效
-                    if not self.email_connector.mail:
-                        print(f"重试 {retry_count+1}/{max_retries}: 邮箱未连接，尝试重新连接")
-                        if not self.email_connector.connect():
-                            retry_count += 1
-                            continue
-                    
-                    # 尝试获取邮件
-                    result = self.email_connector.fetch_emails(folder=folder, search_criteria=search_criteria)
+                    # 从连接池借用独立连接，多个获取任务可以并行执行
+                    with self.email_connector.session() as connector:
+                        result = connector.fetch_emails(folder=folder, search_criteria=search_criteria)
                     
                     # 如果成功获取邮件，返回结果
                     if result:
@@ -184,13 +191,8 @@ class AsyncEmailProcessor:
                     retry_count += 1
                     
                 except Exception as e:
+                    # 出错的连接已由 session() 处理，重试时借用其他连接
                     print(f"重试 {retry_count+1}/{max_retries}: 获取邮件出错: {e}")
-                    # 出错了，重置连接
-                    try:
-                        self.email_connector.close()
-                    except:
-                        pass
-                        
                     retry_count += 1
                     if retry_count >= max_retries:
                         raise Exception(f"获取邮件失败，已重试 {max_retries} 次: {e}")
@@ -212,42 +214,379 @@ class AsyncEmailProcessor:
             error_callback=error_callback
         )
         
-    def classify_emails_async(self, emails, callback=None, error_callback=None):
-        """异步分类邮件"""
-        # 创建缓存键 - 使用邮件ID列表
-        email_ids = [email.get('id', '') for email in emails]
-        cache_key = f"classify_{'_'.join(email_ids)}"
+    def _sync_emails_async(self, cache_key, folder, callback=None, error_callback=None):
+        """异步增量同步邮件，并与已缓存的邮件列表合并"""
+        def sync_emails_wrapper():
+            merged, _ = self._sync_folder(folder, cache_key)
+            return merged
+        
+        return self.thread_pool.submit(
+            sync_emails_wrapper,
+            callback=callback,
+            error_callback=error_callback
+        )
         
-        # 检查缓存
+    def _cached_folder(self, folder, cache_key):
+        """读取文件夹的邮件列表：先查内存缓存，没有时从本地邮件存储恢复上次同步到的列表
+
+        恢复的列表会先分类再放入缓存，之后的同步按 SyncStateStore 中保存的位置增量进行，
+        启动后的第一次刷新不必重新下载整个文件夹。
+
+        Returns:
+            list: 邮件列表，都没有时返回 None
+        """
         cached_result = self.cache.get(cache_key)
-        if cached_result:
-            print(f"使用缓存的分类结果")
-            if callback:
-                callback(cached_result)
+        if cached_result is not None:
+            return cached_result
+        
+        stored = self.email_connector.load_stored_emails(folder)
+        if not stored:
             return None
+        self._classify_in_place(stored)
+        print(f"{folder}: 从本地存储恢复 {len(stored)} 封邮件")
+        self.cache.put(cache_key, stored)
+        self.restored_keys.add(cache_key)
+        return stored
+        
+    def _sync_folder(self, folder, cache_key, max_retries=3, on_batch=None, on_reset=None):
+        """在当前线程中增量同步一个文件夹
+
+        内存中没有该文件夹的邮件列表时先从本地邮件存储恢复，是否需要全量同步由
+        sync_emails() 根据保存的 UIDVALIDITY 和同步位置决定；本地也没有邮件时执行全量同步。
+        on_batch 和 on_reset 的含义与 EmailConnector.sync_emails() 相同，重试时可能再次收到已获取过的邮件。
+        
+        Returns:
+            tuple: (合并后的邮件列表, 本次新获取的邮件列表)
+        """
+        for retry_count in range(max_retries):
+            cached_result = self._cached_folder(folder, cache_key)
+            # 恢复的列表可能缺少被存储淘汰的邮件，第一次同步时与服务器上的全部UID核对
+            known_uids = None
+            if cached_result is not None and cache_key in self.restored_keys:
+                known_uids = set(email_data.get('id') for email_data in cached_result)
+            try:
+                with self.email_connector.session() as connector:
+                    new_emails, full = connector.sync_emails(folder=folder, full=cached_result is None,
+                                                             on_batch=on_batch, on_reset=on_reset,
+                                                             known_uids=known_uids)
+            except Exception as e:
+                print(f"重试 {retry_count+1}/{max_retries}: 获取IMAP连接失败: {e}")
+                continue
             
-        def classify_emails(emails):
-            for i, email_data in enumerate(emails):
-                # 分类邮件
-                category = self.email_classifier.classify_email(email_data)
-                self.email_classifier.tag_email(email_data, category)
+            if new_emails is None:
+                print(f"重试 {retry_count+1}/{max_retries}: 同步邮件失败")
+                continue
+            
+            if full:
+                merged = new_emails
+            else:
+                known_ids = set(email_data.get('id') for email_data in cached_result)
+                merged = list(cached_result) + [e for e in new_emails if e.get('id') not in known_ids]
+                if known_uids is not None:
+                    # 补回的被淘汰邮件按UID放回原来的位置
+                    merged.sort(key=lambda email_data: int(email_data.get('id')))
                 
+            print(f"{folder}: 新增 {len(new_emails)} 封邮件，共 {len(merged)} 封")
+            self.cache.put(cache_key, merged)
+            self.restored_keys.discard(cache_key)
+            return merged, new_emails
+        
+        raise Exception(f"同步邮件失败，已重试 {max_retries} 次")
+        
+    def stream_emails_async(self, chunk_callback, callback=None, error_callback=None, folder='INBOX',
+                            search_criteria='ALL', incremental=None, reset_callback=None):
+        """异步流式获取邮件
+        
+        每收到一批邮件就立即分类，并通过 chunk_callback 交给调用者显示，
+        不必等整个文件夹下载完成。全部完成后 callback 收到完整的邮件列表。
+        每封邮件只交给 chunk_callback 一次，同步失败重试时不会重复发送之前的批次。
+        
+        Args:
+            chunk_callback: 每批已分类邮件的回调
+            callback: 完成时的回调，参数为完整邮件列表
+            error_callback: 出错时的回调
+            folder: 文件夹名称
+            search_criteria: IMAP搜索条件字符串或 SearchQuery
+            incremental: 是否增量同步，None 时使用连接器的配置
+            reset_callback: 已显示缓存的邮件后转为全量同步（如 UIDVALIDITY 变化）时的回调，
+                调用者应清除已收到的邮件，之后 chunk_callback 重新发送完整的邮件列表
+        """
+        cache_key = f"emails_{folder}_{search_criteria}"
+        if incremental is None:
+            incremental = getattr(self.email_connector, 'incremental_sync', False)
+        incremental = incremental and str(search_criteria) == 'ALL'
+        
+        # 已交给 chunk_callback 的邮件ID
+        delivered = set()
+        shown_cached = False
+        
+        def on_batch(batch_emails):
+            batch_emails = [e for e in batch_emails if e.get('id') not in delivered]
+            if not batch_emails:
+                return
+            delivered.update(e.get('id') for e in batch_emails)
+            self._classify_in_place(batch_emails)
+            chunk_callback(batch_emails)
+        
+        def on_reset():
+            # 只有已显示的缓存邮件需要替换；全量同步失败重试时，之前发送的批次仍然有效
+            nonlocal shown_cached
+            if shown_cached and reset_callback:
+                shown_cached = False
+                delivered.clear()
+                reset_callback()
+        
+        def stream_emails():
+            nonlocal shown_cached
+            if isinstance(search_criteria, SearchQuery):
+                cached_result = None
+            elif incremental:
+                cached_result = self._cached_folder(folder, cache_key)
+            else:
+                cached_result = self.cache.get(cache_key)
+            if cached_result:
+                # 先显示已缓存的邮件，增量同步只会追加新邮件
+                delivered.update(e.get('id') for e in cached_result)
+                shown_cached = True
+                chunk_callback(list(cached_result))
+                if not incremental:
+                    return cached_result
+            
+            if incremental:
+                merged, _ = self._sync_folder(folder, cache_key, on_batch=on_batch, on_reset=on_reset)
+                return merged
+            
+            emails = []
+            with self.email_connector.session() as connector:
+                batch_size = max(1, connector.fetch_batch_size)
+                first_size = connector.stream_first_batch_size or batch_size
+                chunk = []
+                for email_data in connector.iter_emails(folder=folder, search_criteria=search_criteria):
+                    chunk.append(email_data)
+                    if len(chunk) >= (first_size if not emails else batch_size):
+                        on_batch(chunk)
+                        emails.extend(chunk)
+                        chunk = []
+                if chunk:
+                    on_batch(chunk)
+                    emails.extend(chunk)
+            
+            if emails:
+                self.cache.put(cache_key, emails)
             return emails
+        
+        return self.thread_pool.submit(
+            stream_emails,
+            callback=callback,
+            error_callback=error_callback
+        )
+        
+    def _classify_in_place(self, emails):
+        """在当前线程中对邮件批量分类并打上标签"""
+        return self.email_classifier.tag_batch(emails)
+        
+    def fetch_folders(self, folders, folder_callback=None, callback=None, error_callback=None,
+                      search_criteria='ALL', incremental=None):
+        """并行获取多个文件夹的邮件
+        
+        每个文件夹作为独立任务提交到线程池，各自从连接池借用IMAP连接。
+        某个文件夹完成后立即通过 folder_callback 返回该文件夹的结果，
+        全部完成后通过 callback 返回各文件夹的吞吐量和耗时统计。
+        
+        Args:
+            folders: 文件夹名称列表
+            folder_callback: 单个文件夹完成时的回调，参数为 (文件夹, 邮件列表, 统计信息)
+            callback: 全部完成时的回调，参数为 {文件夹: 统计信息}
+            error_callback: 单个文件夹失败时的回调，参数为 (文件夹, 错误信息)
+            search_criteria: IMAP搜索条件字符串或 SearchQuery
+            incremental: 是否增量同步，None 时使用连接器的配置
             
-        def cache_result_callback(result):
-            # 缓存结果
-            self.cache.put(cache_key, result)
-            # 调用原回调
-            if callback:
-                callback(result)
+        Returns:
+            list: 各文件夹的任务ID
+        """
+        if incremental is None:
+            incremental = getattr(self.email_connector, 'incremental_sync', False)
+        incremental = incremental and str(search_criteria) == 'ALL'
+        
+        folders = list(folders)
+        results = {}
+        lock = threading.Lock()
+        
+        def folder_done(folder, stats):
+            with lock:
+                results[folder] = stats
+                finished = len(results) == len(folders)
+            if finished:
+                self._report_folder_stats(results)
+                if callback:
+                    callback(dict(results))
+        
+        def make_task(folder):
+            cache_key = f"emails_{folder}_{search_criteria}"
+            
+            def fetch_folder():
+                start = time.time()
+                try:
+                    if incremental:
+                        emails, fetched = self._sync_folder(folder, cache_key)
+                    else:
+                        with self.email_connector.session() as connector:
+                            emails = connector.fetch_emails(folder=folder, search_criteria=search_criteria)
+                        fetched = emails
+                        if emails:
+                            self.cache.put(cache_key, emails)
+                except Exception as e:
+                    stats = {'folder': folder, 'error': str(e), 'seconds': time.time() - start}
+                    if error_callback:
+                        error_callback(folder, str(e))
+                    folder_done(folder, stats)
+                    return None
                 
+                seconds = time.time() - start
+                stats = {
+                    'folder': folder,
+                    'count': len(emails),
+                    'fetched': len(fetched),
+                    'bytes': sum(email_data.get('size', 0) for email_data in fetched),
+                    'seconds': seconds,
+                    'messages_per_second': len(fetched) / seconds if seconds > 0 else 0,
+                }
+                if folder_callback:
+                    folder_callback(folder, emails, stats)
+                folder_done(folder, stats)
+                return emails
+            
+            fetch_folder.__name__ = f"fetch_folder[{folder}]"
+            return fetch_folder
+        
+        return [self.thread_pool.submit(make_task(folder)) for folder in folders]
+        
+    def _report_folder_stats(self, results):
+        """按耗时从高到低打印各文件夹的获取统计"""
+        self.folder_stats = dict(results)
+        print("各文件夹获取统计（按耗时排序）:")
+        for stats in sorted(results.values(), key=lambda x: x.get('seconds', 0), reverse=True):
+            if 'error' in stats:
+                print(f"  {stats['folder']}: 失败 ({stats['error']})，耗时 {stats['seconds']:.2f} 秒")
+            else:
+                print(f"  {stats['folder']}: {stats['fetched']}/{stats['count']} 封，"
+                      f"{stats['bytes'] / 1024:.1f} KB，耗时 {stats['seconds']:.2f} 秒，"
+                      f"{stats['messages_per_second']:.1f} 封/秒")
+        
+    def fetch_new_emails_async(self, folder, uids, callback=None, error_callback=None):
+        """异步获取并分类指定UID的新邮件（由IDLE监听触发）
+        
+        新邮件会合并到该文件夹已缓存的邮件列表中，并推进保存的同步位置，回调只收到新邮件。
+        """
+        def fetch_new_emails():
+            with self.email_connector.session() as connector:
+                new_emails = connector.fetch_uids(folder, uids)
+                connector.advance_sync_state(folder, uids, new_emails)
+            self._classify_in_place(new_emails)
+            
+            cache_key = f"emails_{folder}_ALL"
+            cached_result = self.cache.get(cache_key)
+            if cached_result is not None:
+                known_ids = set(email_data.get('id') for email_data in cached_result)
+                self.cache.put(cache_key, list(cached_result) + [
+                    e for e in new_emails if e.get('id') not in known_ids
+                ])
+            return new_emails
+        
+        return self.thread_pool.submit(
+            fetch_new_emails,
+            callback=callback,
+            error_callback=error_callback
+        )
+        
+    def remove_cached_emails(self, folder, uids):
+        """从文件夹的缓存邮件列表中移除已删除的邮件"""
+        cache_key = f"emails_{folder}_ALL"
+        cached_result = self.cache.get(cache_key)
+        if cached_result is not None:
+            removed = set(uids)
+            self.cache.put(cache_key, [e for e in cached_result if e.get('id') not in removed])
+        
+    def resync_flags_async(self, folder='INBOX', callback=None, error_callback=None):
+        """异步同步其他客户端对文件夹中邮件标记的修改（CONDSTORE/QRESYNC）
+        
+        同步结果会直接应用到缓存的邮件列表上。
+        
+        Args:
+            folder: 文件夹名称
+            callback: 完成时的回调，参数为 {'folder', 'changed', 'vanished'}；
+                      服务器不支持或需要全量同步时参数为 None
+            error_callback: 出错时的回调
+        """
+        def resync_flags():
+            cache_key = f"emails_{folder}_ALL"
+            cached_result = self.cache.get(cache_key)
+            known_uids = [email_data.get('id') for email_data in cached_result] if cached_result else None
+            
+            with self.email_connector.session() as connector:
+                result = connector.resync_flags(folder, known_uids)
+            if result is None:
+                return None
+            
+            if cached_result:
+                for email_data in cached_result:
+                    flags = result['changed'].get(email_data.get('id'))
+                    if flags is not None:
+                        email_data['flags'] = flags
+            if result['vanished']:
+                self.remove_cached_emails(folder, result['vanished'])
+            
+            result['folder'] = folder
+            return result
+        
+        return self.thread_pool.submit(
+            resync_flags,
+            callback=callback,
+            error_callback=error_callback
+        )
+        
+    def classify_emails_async(self, emails, callback=None, error_callback=None):
+        """异步分类邮件
+
+        分类器按邮件内容缓存结果，已分类过且内容未变的邮件不会重新分类。
+        """
+        def classify_emails(emails):
+            return self._classify_in_place(emails)
+            
         return self.thread_pool.submit(
             classify_emails,
-            cache_result_callback,
+            callback,
             error_callback,
             emails
         )
         
+    def reclassify_stale_async(self, emails, callback=None, error_callback=None):
+        """分类规则更新后，重新分类按旧规则自动分类的邮件
+
+        Args:
+            emails: 界面中显示的邮件，只重新分类其中按旧规则分类的邮件（原地修改）
+            callback: 完成后的回调，参数为重新分类的邮件列表
+            error_callback: 出错时的回调
+        """
+        def reclassify_stale():
+            stale = self.email_classifier.stale_emails(emails)
+            self.email_classifier.tag_batch(stale)
+            
+            # 数据库中保存的邮件同样按新规则重新分类
+            if self.analytics:
+                stored = self.analytics.get_stale_emails(self.email_classifier.rules_version)
+                if stored:
+                    self.email_classifier.tag_batch(stored)
+                    self.analytics.update_email_categories(stored)
+                    print(f"已按新规则重新分类 {len(stored)} 封已保存的邮件")
+            return stale
+            
+        return self.thread_pool.submit(
+            reclassify_stale,
+            callback,
+            error_callback
+        )
+        
     def batch_process_async(self, emails, target_category=None, reply_content=None, callback=None, error_callback=None):
         """异步批量处理邮件"""
         print(f"开始批量处理 {len(emails)} 封邮件，目标分类: {target_category}")
@@ -275,6 +614,10 @@ class AsyncEmailProcessor:
                     except Exception as e:
                         print(f"处理邮件失败: {e}")
                 
+                # 用户手动指定的分类作为统计模型的训练样本
+                if target_cat and processed and hasattr(self.email_classifier, 'learn'):
+                    self.email_classifier.learn(processed, target_cat)
+                
                 print(f"批量处理完成，成功处理 {len(processed)}/{total} 封邮件")
                 return processed
                 
@@ -304,6 +647,10 @@ class AsyncEmailProcessor:
     def close(self):
         """关闭处理器"""
         self.thread_pool.stop()
+        if hasattr(self.email_connector, 'close_pool'):
+            self.email_connector.close_pool()
+        if hasattr(self.email_classifier, 'close'):
+            self.email_classifier.close()
 
 
 class QtThreadWorker(QThread):
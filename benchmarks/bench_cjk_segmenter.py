@@ -0,0 +1,77 @@
+"""中文关键词匹配方式的比较：按单个汉字匹配、只用分类关键词分词、使用完整词典分词
+
+词典为 jieba 的 dict.txt 等每行一个词的文件，会先用 cjk_segmenter.build_dictionary() 转换。
+不指定词典时只比较前两种方式。除速度外还检查 "开发票据" 是否被误判为包含关键词 "发票"。
+
+    python benchmarks/bench_cjk_segmenter.py [词典路径] [邮件数量]
+"""
+import copy
+import os
+import random
+import sys
+import tempfile
+import time
+
+from common import make_config, quiet
+import config
+from cjk_segmenter import build_dictionary
+from email_classifier import EmailClassifier
+
+CHINESE = ['您好，附件是本月的发票和付款通知，请查收。', '会议安排在下周三下午两点，地点在三楼会议室。',
+           '我们的研发部门正在开发票据识别系统。', '请问您的订单什么时候发货？快递单号是多少？',
+           '对于这个问题我们深表歉意，客服会尽快联系您。', '感谢您的反馈和建议，我们会持续改进产品。',
+           '系统将于今晚进行维护升级，届时服务暂停。', '开会时间另行通知，请大家留意邮件。']
+ENGLISH = ['please find the attached invoice for this month.', 'the meeting is scheduled for next wednesday.',
+           'your order has been shipped and the delivery is expected tomorrow.', 'thanks for your feedback.',
+           'we are sorry for the problem and our support team will help you.']
+EXTRA_KEYWORDS = {'账单': ['发票'], '会议': ['会议', '开会'], '订单': ['订单', '快递'],
+                  '投诉': ['投诉', '问题'], '反馈': ['反馈', '建议'], '通知': ['通知', '维护']}
+PROBE = '我们的研发部门正在开发票据识别系统。'
+
+
+def make_emails(count):
+    random.seed(5)
+    emails = []
+    for _ in range(count):
+        parts = random.choices(CHINESE, k=random.randint(3, 25)) + random.choices(ENGLISH, k=random.randint(0, 10))
+        random.shuffle(parts)
+        emails.append({'subject': random.choice(CHINESE)[:12], 'body': ''.join(parts)})
+    return emails
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else None
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    emails = make_emails(count)
+    megabytes = sum(len((e['subject'] + e['body']).encode()) for e in emails) / 1e6
+
+    keywords = copy.deepcopy(config.CATEGORY_KEYWORDS)
+    for category, words in EXTRA_KEYWORDS.items():
+        keywords.setdefault(category, []).extend(words)
+
+    modes = [('按单个汉字', 'char', None), ('只用分类关键词分词', 'dict', None)]
+    if source:
+        dict_path = os.path.join(tempfile.mkdtemp(prefix='mail-bench-'), 'cjk_dict.txt')
+        words = build_dictionary(source, dict_path)
+        modes.append((f'词典分词（{words} 词）', 'dict', dict_path))
+
+    for label, mode, path in modes:
+        with quiet():
+            start = time.perf_counter()
+            classifier = EmailClassifier(make_config(CATEGORY_KEYWORDS=keywords, CJK_SEGMENTATION=mode,
+                                                     CJK_DICT_PATH=path))
+            init = time.perf_counter() - start
+            start = time.perf_counter()
+            classifier.classify_batch(emails[:200])
+            warm_up = time.perf_counter() - start
+            start = time.perf_counter()
+            classifier.classify_batch(emails)
+            seconds = time.perf_counter() - start
+            probe = classifier.classify_batch([{'subject': '', 'body': PROBE}])[0][0]
+            classifier.close()
+        print(f"{label:20s} 初始化 {init * 1000:6.1f} ms  前200封 {warm_up * 1000:6.0f} ms  "
+              f"{count / seconds:7.0f} 封/秒  {megabytes / seconds:5.2f} MB/s  \"开发票据\" -> {probe}")
+
+
+if __name__ == '__main__':
+    main()
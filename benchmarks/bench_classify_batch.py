@@ -0,0 +1,51 @@
+"""逐封分类（classify_email）、批量分类（classify_batch）和分类进程池的速度比较
+
+    python benchmarks/bench_classify_batch.py [进程数]
+"""
+import random
+import sys
+import time
+
+from common import make_config, quiet
+from email_classifier import EmailClassifier
+
+WORDS = ('hello please find attached the invoice for this month let us know if you have any question about '
+         'payment schedule meeting order delivery refund support feedback we are sorry for the problem').split()
+
+
+def make_emails(count):
+    return [{'subject': ' '.join(random.choices(WORDS, k=6)).title() + '!',
+             'body': ' '.join(random.choices(WORDS, k=random.randint(40, 300))) + '.'} for _ in range(count)]
+
+
+def main():
+    random.seed(3)
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    with quiet():
+        serial = EmailClassifier(make_config(CLASSIFY_WORKERS=0))
+        pooled = EmailClassifier(make_config(CLASSIFY_WORKERS=workers, CLASSIFY_POOL_MIN_BATCH=2000))
+        # 预热：加载分词器、启动子进程
+        serial.classify_batch(make_emails(10))
+        pooled.classify_batch(make_emails(3000))
+
+    for count in (1000, 10000, 100000):
+        emails = make_emails(count)
+        start = time.perf_counter()
+        one_by_one = [serial.classify_email(email_data) for email_data in emails]
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        batch = serial.classify_batch(emails)
+        batched = time.perf_counter() - start
+        start = time.perf_counter()
+        pool = pooled.classify_batch(emails)
+        parallel = time.perf_counter() - start
+        assert one_by_one == [category for category, _ in batch] == [category for category, _ in pool]
+        print(f"{count:7d} 封  classify_email {count / single:8.0f} 封/秒  classify_batch {count / batched:8.0f} 封/秒  "
+              f"进程池({workers}) {count / parallel:8.0f} 封/秒")
+
+    serial.close()
+    pooled.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""UID FETCH 批量大小（FETCH_BATCH_SIZE）对获取速度的影响
+
+在本地模拟的IMAP服务器上获取1000封邮件，比较每条 FETCH 请求1封、50封和200封邮件的速度，
+并模拟每条命令5毫秒的网络延迟。
+
+    python benchmarks/bench_fetch_batch.py [邮件数量]
+"""
+import imaplib
+import sys
+import time
+
+from common import make_config, quiet
+import fake_imap
+
+# 模拟服务器使用明文连接
+imaplib.IMAP4_SSL = imaplib.IMAP4
+
+from email_connector import EmailConnector
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    fake_imap.MAILBOXES['INBOX'] = fake_imap.Mailbox(count)
+    _, port = fake_imap.start()
+
+    for latency in (0.0, 0.005):
+        fake_imap.LATENCY = latency
+        for batch_size in (1, 50, 200):
+            connector = EmailConnector(make_config(IMAP_PORT=port, FETCH_BATCH_SIZE=batch_size,
+                                                   INCREMENTAL_SYNC=False, IMAP_POOL_SIZE=1))
+            with quiet():
+                connector.connect()
+                start = time.perf_counter()
+                emails = connector.fetch_emails()
+                seconds = time.perf_counter() - start
+                connector.close()
+            assert [email_data['id'] for email_data in emails] == [str(uid) for uid in range(1, count + 1)]
+            print(f"延迟 {latency * 1000:.0f}ms  每批 {batch_size:3d} 封: {len(emails)} 封邮件 {seconds:.2f} 秒，"
+                  f"{len(emails) / seconds:.0f} 封/秒")
+
+
+if __name__ == '__main__':
+    main()
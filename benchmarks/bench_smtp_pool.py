@@ -0,0 +1,66 @@
+"""SMTP连接池：每封邮件新建连接与复用已登录连接的发送速度比较
+
+另外检查服务器每个连接只接受5封邮件（之后回复 421）、空闲连接超时和连接被断开时邮件仍能发出。
+需要 openssl 命令生成模拟服务器的证书。
+
+    python benchmarks/bench_smtp_pool.py
+"""
+import socket
+import time
+
+from common import make_config, quiet
+from fake_smtp import FakeSMTP
+from email_sender import EmailSender
+
+
+def make_sender(server, **overrides):
+    return EmailSender(make_config(SMTP_PORT=server.port, **overrides))
+
+
+def throughput(pool, count, latency, handshake_latency):
+    server = FakeSMTP(latency=latency, handshake_latency=handshake_latency)
+    with quiet():
+        sender = make_sender(server, SMTP_POOL_ENABLED=pool)
+        start = time.perf_counter()
+        for index in range(count):
+            assert sender.send_email(f'u{index}@example.com', 'Re: hi', 'body ' * 50)
+        seconds = time.perf_counter() - start
+        sender.close()
+    server.close()
+    print(f"连接池={'开' if pool else '关'}  回复延迟 {latency * 1000:.0f}ms  登录延迟 {handshake_latency * 1000:.0f}ms: "
+          f"{count / seconds:7.1f} 封/秒，连接 {server.connections} 次，RSET {server.rsets} 次")
+
+
+def main():
+    for latency, handshake_latency, count in ((0, 0, 300), (0.005, 0.02, 60)):
+        throughput(False, count, latency, handshake_latency)
+        throughput(True, count, latency, handshake_latency)
+
+    # 服务器每个连接只接受5封邮件
+    server = FakeSMTP(fail_421_after=5)
+    with quiet():
+        sender = make_sender(server, SMTP_POOL_ENABLED=True)
+        sent = sum(sender.send_email('a@example.com', 's', 'b') for _ in range(20))
+        sender.close()
+    print(f"421 断开: 发送成功 {sent}/20，服务器收到 {server.messages} 封，连接 {server.connections} 次")
+
+    # 空闲连接超时后重新连接，连接被断开后用新连接重试
+    server = FakeSMTP()
+    with quiet():
+        sender = make_sender(server, SMTP_POOL_ENABLED=True, SMTP_POOL_IDLE_TIMEOUT=0.3,
+                             SMTP_POOL_HEALTH_CHECK_INTERVAL=0.1)
+        sender.send_email('a@example.com', 's', 'b')
+        time.sleep(0.5)
+        sender.send_email('a@example.com', 's', 'b')
+        idle_connections = server.connections
+        connection = sender.pool.acquire()
+        connection.sock.shutdown(socket.SHUT_RDWR)
+        sender.pool.release(connection)
+        broken = sender.send_email('a@example.com', 's', 'b')
+        sender.close()
+    print(f"空闲超时: 连接 {idle_connections} 次；连接被断开后发送{'成功' if broken else '失败'}，"
+          f"服务器共收到 {server.messages} 封，连接 {server.connections} 次")
+
+
+if __name__ == '__main__':
+    main()
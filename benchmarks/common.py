@@ -0,0 +1,47 @@
+"""基准测试的公共设置
+
+把项目根目录加入导入路径，并生成连接本地模拟服务器的配置。所有数据库都放在临时目录中，
+不会读写项目目录下的 email_data.db 等文件。
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import config as _config
+
+
+def make_config(**overrides):
+    """复制 config.py 中的设置，账号指向本地模拟服务器，数据库放在临时目录"""
+    settings = {name: getattr(_config, name) for name in dir(_config) if name.isupper()}
+    workdir = tempfile.mkdtemp(prefix='mail-bench-')
+    settings.update(
+        EMAIL_ADDRESS='me@example.com',
+        EMAIL_PASSWORD='x',
+        IMAP_SERVER='127.0.0.1',
+        SMTP_SERVER='127.0.0.1',
+        SYNC_STATE_DB=os.path.join(workdir, 'state.db'),
+        MESSAGE_STORE_ENABLED=False,
+        OUTBOX_ENABLED=False,
+        OUTBOX_DB_PATH=os.path.join(workdir, 'outbox.db'),
+        SMTP_RATE_LIMIT=0,
+        CLASSIFICATION_CACHE_ENABLED=False,
+        CLASSIFICATION_RULES_FILE=None,
+        RULES_RELOAD_INTERVAL=0,
+        NLTK_DATA_DIR=None,
+    )
+    settings.update(overrides)
+    return types.SimpleNamespace(**settings)
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测代码的进度输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
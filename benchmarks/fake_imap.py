@@ -0,0 +1,198 @@
+"""用于基准测试的最小 IMAP4rev1 模拟服务器（明文 TCP）
+
+只实现 EmailConnector 获取邮件用到的命令：CAPABILITY、LOGIN、ID、NOOP、LOGOUT、SELECT/EXAMINE、
+UID SEARCH 和 UID FETCH（FLAGS、RFC822.SIZE、BODYSTRUCTURE、BODY[...] 和 RFC822）。
+每条命令回复前可以按 LATENCY 秒延迟，用来模拟网络往返时间。
+"""
+import email
+import re
+import socketserver
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# 每条命令回复前的延迟（秒）
+LATENCY = 0.0
+# 文件夹名称 -> Mailbox
+MAILBOXES = {}
+
+
+def make_message(index, chinese=False):
+    """生成一封测试邮件的原始字节"""
+    msg = MIMEMultipart()
+    msg['From'] = f'"User {index}" <user{index}@example.com>'
+    msg['To'] = 'me@example.com'
+    msg['Subject'] = f'订单 {index} 付款通知' if chinese else f'Invoice {index} payment reminder'
+    msg['Date'] = 'Mon, 01 Jan 2024 10:00:00 +0800'
+    body = '您好，这是关于订单的问题。' * 20 if chinese else 'Hello, please find the invoice for your order. ' * 20
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+    return msg.as_bytes()
+
+
+class Mailbox:
+    """一个文件夹，邮件为 (UID, 原始字节, 标记集合)"""
+
+    def __init__(self, count=0, uidvalidity=1000):
+        self.uidvalidity = uidvalidity
+        self.messages = [(uid, make_message(uid, chinese=uid % 2 == 0), set()) for uid in range(1, count + 1)]
+        self.next_uid = count + 1
+
+
+def _parse_set(spec, max_uid):
+    """把 "1:5,7,9:*" 解析为 [(起, 止)]"""
+    ranges = []
+    for part in spec.split(','):
+        first, _, last = part.partition(':')
+        first = max_uid if first == '*' else int(first)
+        last = first if not last else max_uid if last == '*' else int(last)
+        ranges.append((min(first, last), max(first, last)))
+    return ranges
+
+
+def _in_set(uid, ranges):
+    return any(first <= uid <= last for first, last in ranges)
+
+
+def _bodystructure(raw):
+    """生成邮件的 BODYSTRUCTURE（只包含 EmailConnector 用到的字段）"""
+    def structure(part):
+        if part.is_multipart():
+            return '(' + ''.join(structure(child) for child in part.get_payload()) + \
+                f' "{part.get_content_subtype().upper()}")'
+        payload = part.get_payload(decode=False)
+        size = len(payload.encode() if isinstance(payload, str) else payload)
+        charset = part.get_content_charset()
+        params = f'("CHARSET" "{charset}")' if charset else 'NIL'
+        encoding = (part.get('Content-Transfer-Encoding') or '7bit').upper()
+        maintype, subtype = part.get_content_maintype().upper(), part.get_content_subtype().upper()
+        lines = f' {payload.count(chr(10))}' if maintype == 'TEXT' else ''
+        return f'("{maintype}" "{subtype}" {params} NIL NIL "{encoding}" {size}{lines})'
+    return structure(email.message_from_bytes(raw))
+
+
+def _section(raw, section):
+    """取出 BODY[section] 的内容"""
+    msg = email.message_from_bytes(raw)
+    if section.startswith('HEADER.FIELDS'):
+        fields = re.search(r'\((.*)\)', section).group(1).split()
+        data = b''.join(f'{field.title()}: {msg[field]}\r\n'.encode() for field in fields if msg[field] is not None)
+        return data + b'\r\n'
+    if section == 'HEADER':
+        return raw.split(b'\n\n', 1)[0] + b'\n\n'
+    if section == '':
+        return raw
+    part = msg
+    for number in section.split('.'):
+        if part.is_multipart():
+            part = part.get_payload()[int(number) - 1]
+    payload = part.get_payload(decode=False)
+    return payload.encode() if isinstance(payload, str) else payload
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.mailbox = None
+        self.wfile.write(b'* OK fake imap ready\r\n')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.decode().rstrip('\r\n')
+            if not line:
+                continue
+            if LATENCY:
+                time.sleep(LATENCY)
+            tag, _, rest = line.partition(' ')
+            command, _, args = rest.partition(' ')
+            command = command.upper()
+            if command == 'UID':
+                sub, _, args = args.partition(' ')
+                command = f'UID_{sub.upper()}'
+            handler = getattr(self, f'do_{command}', None)
+            if handler is None:
+                self.send(f'{tag} BAD unknown command\r\n')
+            elif handler(tag, args) == 'quit':
+                return
+
+    def send(self, data):
+        self.wfile.write(data.encode() if isinstance(data, str) else data)
+
+    def do_CAPABILITY(self, tag, args):
+        self.send(f'* CAPABILITY IMAP4rev1 UIDPLUS\r\n{tag} OK done\r\n')
+
+    def do_LOGIN(self, tag, args):
+        self.send(f'{tag} OK LOGIN completed\r\n')
+
+    def do_ID(self, tag, args):
+        self.send(f'* ID NIL\r\n{tag} OK ID completed\r\n')
+
+    def do_NOOP(self, tag, args):
+        self.send(f'{tag} OK NOOP completed\r\n')
+
+    def do_LOGOUT(self, tag, args):
+        self.send(f'* BYE\r\n{tag} OK LOGOUT completed\r\n')
+        return 'quit'
+
+    def do_SELECT(self, tag, args):
+        self.mailbox = MAILBOXES.setdefault(args.split(' ')[0].strip('"'), Mailbox())
+        mailbox = self.mailbox
+        self.send(f'* {len(mailbox.messages)} EXISTS\r\n* 0 RECENT\r\n'
+                  f'* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid\r\n'
+                  f'* OK [UIDNEXT {mailbox.next_uid}] next\r\n'
+                  f'{tag} OK [READ-WRITE] SELECT completed\r\n')
+
+    do_EXAMINE = do_SELECT
+
+    def do_UID_SEARCH(self, tag, args):
+        uids = [uid for uid, _, _ in self.mailbox.messages]
+        match = re.match(r'(?:CHARSET \S+ )?UID (\S+)$', args.strip())
+        if match and uids:
+            ranges = _parse_set(match.group(1), uids[-1])
+            uids = [uid for uid in uids if _in_set(uid, ranges)]
+        self.send(f'* SEARCH {" ".join(map(str, uids))}\r\n{tag} OK SEARCH completed\r\n')
+
+    def do_UID_FETCH(self, tag, args):
+        messages = self.mailbox.messages
+        spec, _, items = args.partition(' ')
+        ranges = _parse_set(spec, messages[-1][0] if messages else 0)
+        upper = items.upper()
+        response = []
+        for seq, (uid, raw, flags) in enumerate(messages, 1):
+            if not _in_set(uid, ranges):
+                continue
+            fields = [f'UID {uid}']
+            if 'FLAGS' in upper:
+                fields.append(f'FLAGS ({" ".join(sorted(flags))})')
+            if 'RFC822.SIZE' in upper:
+                fields.append(f'RFC822.SIZE {len(raw)}')
+            if 'BODYSTRUCTURE' in upper:
+                fields.append(f'BODYSTRUCTURE {_bodystructure(raw)}')
+            literals = []
+            for match in re.finditer(r'BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?', items, re.I):
+                data = _section(raw, match.group(1).upper())
+                label = f'BODY[{match.group(1)}]'
+                if match.group(2):
+                    start = int(match.group(2))
+                    data = data[start:start + int(match.group(3))]
+                    label += f'<{start}>'
+                literals.append((label, data))
+            if re.search(r'\bRFC822\b(?!\.)', upper):
+                literals.append(('RFC822', raw))
+            line = f'* {seq} FETCH ({" ".join(fields)}'.encode()
+            for label, data in literals:
+                line += f' {label} {{{len(data)}}}\r\n'.encode() + data
+            response.append(line + b')\r\n')
+        self.send(b''.join(response) + f'{tag} OK FETCH completed\r\n'.encode())
+
+
+class Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def start(port=0):
+    """在后台线程中启动服务器，返回 (服务器, 端口)"""
+    server = Server(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
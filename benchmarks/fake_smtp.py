@@ -0,0 +1,123 @@
+"""用于基准测试的SMTP模拟服务器
+
+支持 EHLO、STARTTLS（启动时用 openssl 生成自签名证书）、AUTH、MAIL、RCPT、DATA、RSET、NOOP 和 QUIT，
+每条回复可以加上延迟来模拟网络往返，建立连接和登录的回复可以单独设置更长的延迟。
+"""
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def _tls_context():
+    """生成自签名证书并创建服务端 TLS 上下文，只生成一次"""
+    global _context
+    with _context_lock:
+        if _context is None:
+            workdir = tempfile.mkdtemp(prefix='mail-bench-')
+            cert, key = os.path.join(workdir, 'cert.pem'), os.path.join(workdir, 'key.pem')
+            subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                            '-subj', '/CN=127.0.0.1', '-keyout', key, '-out', cert],
+                           check=True, capture_output=True)
+            _context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            _context.load_cert_chain(cert, key)
+        return _context
+
+
+class FakeSMTP:
+    """在后台线程中运行的SMTP服务器，每个连接一个线程"""
+
+    def __init__(self, latency=0.0, handshake_latency=0.0, fail_421_after=None):
+        """启动服务器
+
+        Args:
+            latency: 每条回复的延迟（秒）
+            handshake_latency: 连接问候、STARTTLS 和 AUTH 回复的延迟（秒）
+            fail_421_after: 每个连接发送该数量的邮件后回复 421 并断开
+        """
+        self.latency = latency
+        self.handshake_latency = handshake_latency
+        self.fail_421_after = fail_421_after
+        self.context = _tls_context()
+        self.connections = 0
+        self.messages = 0
+        self.rsets = 0
+        self.lock = threading.Lock()
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self.sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        def reply(line, delay=None):
+            time.sleep(self.latency if delay is None else delay)
+            conn.sendall(line.encode() + b'\r\n')
+
+        reader = conn.makefile('rb')
+        reply('220 fake ESMTP', self.handshake_latency)
+        sent = 0
+        try:
+            while True:
+                line = reader.readline()
+                if not line:
+                    return
+                command = line.decode().strip().upper()
+                if command.startswith('EHLO'):
+                    reply('250-fake\r\n250-STARTTLS\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME')
+                elif command == 'STARTTLS':
+                    reply('220 go ahead', self.handshake_latency)
+                    conn = self.context.wrap_socket(conn, server_side=True)
+                    reader = conn.makefile('rb')
+                elif command.startswith('AUTH'):
+                    reply('235 ok', self.handshake_latency)
+                elif command.startswith('MAIL'):
+                    if self.fail_421_after is not None and sent >= self.fail_421_after:
+                        reply('421 too many messages')
+                        return
+                    reply('250 ok')
+                elif command.startswith('RCPT'):
+                    reply('250 ok')
+                elif command == 'DATA':
+                    reply('354 go')
+                    while reader.readline() not in (b'.\r\n', b''):
+                        pass
+                    sent += 1
+                    with self.lock:
+                        self.messages += 1
+                    reply('250 queued')
+                elif command == 'RSET':
+                    with self.lock:
+                        self.rsets += 1
+                    reply('250 ok')
+                elif command == 'NOOP':
+                    reply('250 ok')
+                elif command == 'QUIT':
+                    reply('221 bye')
+                    return
+                else:
+                    reply('500 unknown command')
+        except (OSError, ssl.SSLError):
+            pass
+        finally:
+            conn.close()
@@ -0,0 +1,130 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PyQt6.QtCore import QThread, pyqtSignal
+from outbox import is_temporary_error
+
+
+class BulkReplySender(QThread):
+    """批量回复线程
+
+    在后台线程中为每封邮件填充回复内容并发送，多封邮件同时发送，
+    并发数不超过发送器的SMTP连接数。每封邮件发送完成或失败后立即通过信号通知界面，
+    取消后尚未开始发送的邮件不再发送，正在发送的邮件会发送完毕。
+    遇到暂时性错误（4xx 响应、连接断开）的邮件加入发件箱，由发件箱稍后重试。
+    """
+
+    message_sent = pyqtSignal(int, dict)          # 序号, 邮件
+    message_failed = pyqtSignal(int, dict, str)   # 序号, 邮件, 错误信息
+    message_queued = pyqtSignal(int, dict, str)   # 序号, 邮件, 暂时性错误（已加入发件箱稍后重试）
+    progress = pyqtSignal(int, int)               # 已处理数量, 总数
+    batch_finished = pyqtSignal(dict)             # 汇总结果
+
+    def __init__(self, email_sender, emails, reply_content, template_manager=None,
+                 use_template=False, analytics=None, max_workers=None):
+        """初始化批量回复线程
+
+        Args:
+            email_sender: 邮件发送器
+            emails: 要回复的邮件列表
+            reply_content: 回复内容，使用模板时其中的变量按每封邮件填充
+            template_manager: 模板管理器，用于填充模板变量
+            use_template: 是否填充模板变量
+            analytics: 邮件分析器，发送成功或加入发件箱的邮件会被标记为已回复
+            max_workers: 同时发送的邮件数量，默认为发送器的SMTP连接数上限
+        """
+        super().__init__()
+        self.email_sender = email_sender
+        self.emails = list(emails)
+        self.reply_content = reply_content
+        self.template_manager = template_manager
+        self.use_template = use_template
+        self.analytics = analytics
+        if max_workers is None:
+            pool = getattr(email_sender, 'pool', None)
+            max_workers = pool.max_size if pool else 1
+        self.max_workers = max(1, max_workers)
+        self.stop_event = threading.Event()
+
+    def render(self, email_data):
+        """生成一封邮件的回复内容"""
+        if self.use_template and self.template_manager:
+            return self.template_manager.fill_template(self.reply_content, email_data)
+        return self.reply_content
+
+    def _send_one(self, email_data):
+        """填充并发送一封回复
+
+        Returns:
+            tuple: (回复内容, 加入发件箱的原因)，直接发送成功时原因为 None；取消后返回 None
+        """
+        if self.stop_event.is_set():
+            return None
+        recipient = email_data.get('from', '')
+        if not recipient:
+            raise ValueError("邮件没有发件人地址")
+        content = self.render(email_data)
+        msg = self.email_sender.build_message(recipient, f"Re: {email_data.get('subject', '')}", content)
+        try:
+            if not self.email_sender.send_message(msg, self.stop_event):
+                return None
+        except Exception as e:
+            if not (getattr(self.email_sender, 'outbox', None) and is_temporary_error(e)):
+                raise
+            self.email_sender.queue_message(msg)
+            return content, str(e)
+        return content, None
+
+    def run(self):
+        """发送所有回复"""
+        total = len(self.emails)
+        start = time.time()
+        replied = []
+        failed = 0
+        queued = 0
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, total or 1)) as executor:
+            futures = {executor.submit(self._send_one, email_data): index
+                       for index, email_data in enumerate(self.emails)}
+            for future in as_completed(futures):
+                index = futures[future]
+                email_data = self.emails[index]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"回复邮件失败: {e}")
+                    failed += 1
+                    self.message_failed.emit(index, email_data, str(e))
+                else:
+                    if result is None:
+                        continue
+                    content, error = result
+                    replied.append((email_data.get('folder', ''), email_data.get('id', ''), content))
+                    if error:
+                        queued += 1
+                        self.message_queued.emit(index, email_data, error)
+                    else:
+                        self.message_sent.emit(index, email_data)
+                done += 1
+                self.progress.emit(done, total)
+
+        if replied and self.analytics:
+            self.analytics.mark_emails_replied(replied)
+
+        seconds = time.time() - start
+        summary = {
+            'total': total,
+            'sent': len(replied) - queued,
+            'queued': queued,
+            'failed': failed,
+            'cancelled': total - len(replied) - failed,
+            'seconds': seconds,
+        }
+        print(f"批量回复完成：成功 {summary['sent']} 封，加入发件箱 {queued} 封，失败 {failed} 封，"
+              f"取消 {summary['cancelled']} 封，耗时 {seconds:.2f} 秒")
+        self.batch_finished.emit(summary)
+
+    def cancel(self):
+        """取消尚未开始发送的回复"""
+        self.stop_event.set()
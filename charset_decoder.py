@@ -0,0 +1,216 @@
+import codecs
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# 邮件中常见的字符集别名：GB2312 声明的邮件经常包含超出其范围的 GBK 字符，统一按 GBK 解码
+_CHARSET_ALIASES = {
+    'gb2312': 'gbk',
+    'x-gbk': 'gbk',
+    'cp936': 'gbk',
+    'euc-cn': 'gbk',
+    'big5': 'cp950',
+    'x-big5': 'cp950',
+    'utf8': 'utf-8',
+    'us-ascii': 'ascii',
+    'unicode-1-1-utf-7': 'utf-7',
+}
+
+# 可以直接按 UTF-8 解码的声明字符集（纯ASCII也是合法的UTF-8），不需要规范化名称
+_UTF8_CHARSETS = frozenset(['utf-8', 'utf8', 'us-ascii', 'ascii'])
+
+# 解码失败时改用的超集编码：GBK 解码器比 GB18030 快约三到五成（见 benchmarks/bench_charset.py），
+# 只有遇到四字节字符时才需要 GB18030
+_SUPERSETS = {'gbk': 'gb18030'}
+
+# 检测失败时依次尝试的编码
+_FALLBACK_CODECS = ['utf-8', 'gbk', 'cp950']
+
+# 字符集检测只看从第一个非ASCII字节开始的一段数据，约120个双字节字符已足够区分；
+# 按 GB2312 替换解码统计无法识别的字符时每个错误都要调用一次错误处理，样本越大越慢
+_SAMPLE_SIZE = 256
+_NON_ASCII_RE = re.compile(rb'[\x80-\xff]')
+
+# 双字节字符少于该数量（如很短的主题）时统计结果不可靠，优先使用发件人域名的缓存
+_MIN_CONFIDENT_PAIRS = 16
+
+# 用于 bytes.translate(None, ...) 统计字节分布的字节集合
+_HIGH_BYTES = bytes(range(0x80, 0x100))
+_GBK_ONLY_LEAD = bytes(range(0x81, 0xA1))
+
+
+def normalize_charset(charset):
+    """规范化声明的字符集名称，未知的字符集返回 None"""
+    if not charset:
+        return None
+    return _normalize_name(str(charset))
+
+
+@lru_cache(maxsize=256)
+def _normalize_name(charset):
+    name = charset.strip().strip('"\'').lower()
+    name = _CHARSET_ALIASES.get(name, name)
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def _count(data, byte_set):
+    """统计 data 中属于 byte_set 的字节数"""
+    return len(data) - len(data.translate(None, byte_set))
+
+
+def _guess_double_byte(sample):
+    """区分 GB18030（GB2312/GBK）和 Big5（cp950）
+
+    Returns:
+        tuple: (编码名称, 是否有足够的依据)，没有非ASCII字节时编码为 None
+    """
+    chars = _count(sample, _HIGH_BYTES) // 2
+    if not chars:
+        return None, False
+
+    # 0x81-0xA0 不会出现在 Big5 中，只可能是 GBK
+    if _count(sample, _GBK_ONLY_LEAD):
+        return 'gbk', True
+
+    # GB2312 的字节都大于 0xA0，而 Big5 常用字约四成尾字节落在 0x40-0x7E，
+    # 按 GB2312 解码时无法识别的字符比例即可区分两者（用C实现的解码器统计，比逐字节遍历快得多）
+    # 样本末尾截断的字符不计入
+    invalid = sample.decode('gb2312', 'replace').rstrip('\ufffd').count('\ufffd')
+    confident = chars >= _MIN_CONFIDENT_PAIRS
+    if invalid * 10 > chars:
+        return 'cp950', confident
+    return 'gbk', confident
+
+
+def _sender_domain(sender):
+    """从发件人地址中取出域名"""
+    if not sender or '@' not in sender:
+        return None
+    return sender.rsplit('@', 1)[1].strip(' >').lower() or None
+
+
+class CharsetDecoder:
+    """邮件文本解码器
+
+    依次使用声明的字符集、UTF-8、字节统计区分的 GB18030/Big5，最后才逐个尝试常见编码。
+    统计依据充分时检测结果按发件人域名缓存，供同一域名的短文本（如主题）使用。
+    """
+
+    def __init__(self, max_domains=1000):
+        """初始化解码器
+
+        Args:
+            max_domains: 缓存编码的发件人域名数量上限
+        """
+        self.max_domains = max_domains
+        self.domain_codecs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def decode(self, data, charset=None, sender=None, errors='strict'):
+        """把字节解码为文本
+
+        Args:
+            data: 原始字节
+            charset: 邮件声明的字符集
+            sender: 发件人地址，用于按域名缓存编码
+            errors: 为 'replace' 时允许数据末尾有被截断的多字节字符
+
+        Returns:
+            str: 解码后的文本，所有编码都失败时用 UTF-8 替换无法解码的字节
+        """
+        if not data:
+            return ''
+        if isinstance(data, str):
+            return data
+
+        tried = set()
+        if charset and str(charset).lower() not in _UTF8_CHARSETS:
+            declared = normalize_charset(charset)
+            if declared and declared != 'ascii':
+                tried.add(declared)
+                text = self._try_decode(data, declared, errors)
+                if text is not None:
+                    return text
+
+        # 未声明字符集和声明为 UTF-8/ASCII 的邮件最常见，直接按 UTF-8 解码，不做规范化和检测；
+        # 非UTF-8的文本通常在前几个字节就会解码失败，直接验证比统计字节分布更快也更准确。
+        # 必须先于 GB18030/Big5 尝试，因为它们几乎能“成功”解码任何字节
+        if 'utf-8' not in tried:
+            tried.add('utf-8')
+            text = self._try_decode(data, 'utf-8', errors)
+            if text is not None:
+                return text
+
+        match = _NON_ASCII_RE.search(data)
+        start = match.start() if match else 0
+        sample = data[start:start + _SAMPLE_SIZE]
+        # 文本太短、统计不可靠时，使用该发件人域名上次检测到的编码
+        guess, confident = _guess_double_byte(sample)
+        domain = _sender_domain(sender)
+        candidates = [guess] + _FALLBACK_CODECS
+        if not confident:
+            cached = self._get_domain_codec(domain)
+            if cached:
+                candidates.insert(0, cached)
+
+        for codec in candidates:
+            if not codec or codec in tried:
+                continue
+            tried.add(codec)
+            text = self._try_decode(data, codec, errors)
+            if text is not None:
+                if confident and codec == guess:
+                    self._set_domain_codec(domain, codec)
+                return text
+
+        return data.decode('utf-8', 'replace')
+
+    def clear_cache(self):
+        """清空按发件人域名缓存的编码"""
+        with self.lock:
+            self.domain_codecs.clear()
+
+    def _try_decode(self, data, codec, errors):
+        try:
+            return data.decode(codec)
+        except UnicodeDecodeError as e:
+            superset = _SUPERSETS.get(codec)
+            if superset:
+                return self._try_decode(data, superset, errors)
+            # 截断的数据只允许末尾不完整的字符
+            if errors == 'replace' and e.end == len(data) and e.start >= len(data) - 3:
+                return data.decode(codec, 'replace')
+            return None
+        except LookupError:
+            return None
+
+    def _get_domain_codec(self, domain):
+        if not domain:
+            return None
+        with self.lock:
+            codec = self.domain_codecs.get(domain)
+            if codec:
+                self.domain_codecs.move_to_end(domain)
+            return codec
+
+    def _set_domain_codec(self, domain, codec):
+        if not domain:
+            return
+        with self.lock:
+            self.domain_codecs[domain] = codec
+            self.domain_codecs.move_to_end(domain)
+            while len(self.domain_codecs) > self.max_domains:
+                self.domain_codecs.popitem(last=False)
+
+
+# 模块级共享的解码器（解析进程池中每个进程各有一份）
+_default_decoder = CharsetDecoder()
+
+
+def decode_text(data, charset=None, sender=None, errors='strict'):
+    """使用共享的解码器把字节解码为文本，参数见 CharsetDecoder.decode"""
+    return _default_decoder.decode(data, charset, sender, errors)
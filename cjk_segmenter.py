@@ -0,0 +1,159 @@
+import hashlib
+import mmap
+import os
+import re
+import threading
+
+# 需要分词的汉字；假名、谚文等其他没有空格的文字仍按单个字符处理
+HAN_RANGES = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_HAN_RUN_RE = re.compile(f'[{HAN_RANGES}]+')
+
+
+def build_dictionary(source_path, target_path):
+    """把词典整理为 CJKSegmenter 使用的格式：每行一个词，按 UTF-8 字节排序并去重
+
+    源文件每行的第一列为词语，其余列（如 jieba 词典中的词频和词性）会被忽略。
+
+    Args:
+        source_path: 源词典路径
+        target_path: 输出路径
+
+    Returns:
+        int: 写入的词数
+    """
+    words = set()
+    with open(source_path, encoding='utf-8') as source:
+        for line in source:
+            parts = line.split()
+            if parts:
+                words.add(parts[0].encode('utf-8'))
+    with open(target_path, 'wb') as target:
+        target.write(b'\n'.join(sorted(words)))
+        target.write(b'\n')
+    return len(words)
+
+
+class CJKSegmenter:
+    """基于词典的中文分词器（正向最大匹配）
+
+    词典文件按字节排序、每行一个词，通过 mmap 映射到内存，启动时不需要读取和解析整个词典，
+    多个分类进程也共享同一份页缓存。每个汉字第一次作为词首出现时，用二分查找取出以它开头的词，
+    之后的查找都在内存中完成。
+    """
+
+    def __init__(self, dict_path=None, user_words=()):
+        """初始化分词器
+
+        Args:
+            dict_path: 词典路径，不存在时只使用 user_words
+            user_words: 额外的词语（如分类关键词），保证它们能被切分为完整的词
+        """
+        self.dict_path = dict_path
+        self.file = None
+        self.mm = None
+        self.buckets = {}      # 首字 -> (词语集合, 从长到短的词长列表)
+        self.user_words = {}   # 首字 -> 词语集合
+        self.lock = threading.Lock()
+
+        if dict_path and os.path.exists(dict_path) and os.path.getsize(dict_path) > 0:
+            try:
+                self.file = open(dict_path, 'rb')
+                self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as e:
+                print(f"打开分词词典失败: {e}")
+                self.close()
+        elif dict_path:
+            print(f"未找到分词词典 {dict_path}，只按分类关键词切分中文")
+
+        self.add_words(user_words)
+
+    @property
+    def signature(self):
+        """词典文件和额外词语的标识，任何一个变化后切分结果都会改变，分类结果需要重新计算"""
+        with self.lock:
+            words = sorted(word for bucket in self.user_words.values() for word in bucket)
+        user_words = hashlib.sha1('\n'.join(words).encode('utf-8')).hexdigest()[:12]
+        if self.mm is None:
+            return f"none:{user_words}"
+        stat = os.stat(self.dict_path)
+        return f"{os.path.basename(self.dict_path)}:{stat.st_size}:{int(stat.st_mtime)}:{user_words}"
+
+    def add_words(self, words):
+        """加入额外的词语"""
+        with self.lock:
+            for word in words:
+                if word and _HAN_RUN_RE.fullmatch(word):
+                    self.user_words.setdefault(word[0], set()).add(word)
+                    self.buckets.pop(word[0], None)
+
+    def segment(self, text):
+        """把一段连续的汉字切分为词语列表
+
+        每次从当前位置取词典中最长的词，没有匹配的词时切出单个汉字。
+        """
+        buckets = self.buckets
+        tokens = []
+        position = 0
+        end = len(text)
+        while position < end:
+            char = text[position]
+            bucket = buckets.get(char)
+            if bucket is None:
+                bucket = self._load_bucket(char)
+            words, lengths = bucket
+            size = 1
+            remaining = end - position
+            for length in lengths:
+                if length <= remaining and text[position:position + length] in words:
+                    size = length
+                    break
+            tokens.append(text[position:position + size])
+            position += size
+        return tokens
+
+    def close(self):
+        """关闭词典文件"""
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _load_bucket(self, char):
+        """取出以 char 开头的所有词语"""
+        with self.lock:
+            bucket = self.buckets.get(char)
+            if bucket is not None:
+                return bucket
+            words = set(self.user_words.get(char, ()))
+            if self.mm is not None:
+                prefix = char.encode('utf-8')
+                start = self._bisect(prefix)
+                # 以 char 开头的词都排在 char 和下一个字符之间
+                stop = self._bisect(chr(ord(char) + 1).encode('utf-8', 'surrogatepass'))
+                if stop > start:
+                    words.update(self.mm[start:stop].decode('utf-8', 'ignore').split('\n'))
+                    words.discard('')
+            # 单字不需要查找，只保留多字词的长度
+            lengths = sorted({len(word) for word in words if len(word) > 1}, reverse=True)
+            bucket = (words, lengths)
+            self.buckets[char] = bucket
+            return bucket
+
+    def _bisect(self, key):
+        """二分查找第一个不小于 key 的行，返回该行的起始偏移"""
+        mm = self.mm
+        low, high = 0, len(mm)
+        while low < high:
+            middle = (low + high) // 2
+            # 比较 middle 所在的整行
+            line_start = mm.rfind(b'\n', 0, middle) + 1
+            line_end = mm.find(b'\n', line_start)
+            if line_end < 0:
+                line_end = len(mm)
+            if mm[line_start:line_end] < key:
+                low = line_end + 1
+            else:
+                high = line_start
+        return low
@@ -0,0 +1,316 @@
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from array import array
+
+# 单条 SQL 中 IN (...) 参数的最大数量，低于 SQLite 的默认上限 999
+_MAX_SQL_PARAMS = 500
+
+# 单词指纹的位数：每封邮件几百个不同单词时，把不存在的单词误判为存在的概率约为0.3%
+_FINGERPRINT_MASK = 0xFFFF
+
+
+def content_hash(text):
+    """计算邮件文本（主题和正文）的哈希值，作为缓存键"""
+    return hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def rules_snapshot(category_keywords, default_category, whole_word, tokenizer='char'):
+    """把分类规则整理为可以比较和保存的结构
+
+    Args:
+        category_keywords: 分类关键词配置
+        default_category: 默认分类
+        whole_word: 是否只匹配完整的单词
+        tokenizer: 中文切分方式的标识（包括分词词典的版本）
+
+    Returns:
+        dict: 包含默认分类、匹配方式和按配置顺序排列的 [分类, {关键词: 权重}]
+    """
+    categories = []
+    for category, keywords in category_keywords.items():
+        if not isinstance(keywords, dict):
+            keywords = {keyword: 1 for keyword in keywords}
+        categories.append([category, dict(keywords)])
+    return {
+        'default_category': default_category,
+        'whole_word': whole_word,
+        'tokenizer': tokenizer,
+        'categories': categories,
+    }
+
+
+def rules_version(snapshot):
+    """根据规则内容计算版本号，规则不变时版本号不变"""
+    data = json.dumps(snapshot, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+def _word_codes(words):
+    """计算单词的 CRC32，整个过程都在 map() 中完成，避免逐个单词执行 Python 代码"""
+    data = '\n'.join(words).encode('utf-8', 'surrogatepass')
+    return map(zlib.crc32, data.split(b'\n'))
+
+
+def build_word_filter(words):
+    """记录邮件中出现的单词，每个单词保存 CRC32 的低16位
+
+    规则新增关键词时，用它判断哪些已缓存的邮件可能包含新关键词（可能误判为包含，不会漏判）。
+    """
+    if not words:
+        return b''
+    fingerprints = array('H', sorted(set(map(_FINGERPRINT_MASK.__and__, _word_codes(words)))))
+    if sys.byteorder == 'big':
+        fingerprints.byteswap()
+    return fingerprints.tobytes()
+
+
+def _load_word_filter(data):
+    """把 build_word_filter() 的结果还原为指纹集合"""
+    fingerprints = array('H')
+    fingerprints.frombytes(data)
+    if sys.byteorder == 'big':
+        fingerprints.byteswap()
+    return set(fingerprints)
+
+
+def _filter_contains(fingerprints, words):
+    """指纹集合是否可能包含所有单词"""
+    return all((code & _FINGERPRINT_MASK) in fingerprints for code in _word_codes(words))
+
+
+class ClassificationCache:
+    """邮件分类结果缓存
+
+    以邮件文本的哈希值为键，保存在 SQLite 中，同时记录每条结果对应的规则版本、
+    命中的关键词和邮件单词的指纹。规则修改后只删除可能受影响的结果：
+    命中了被删除或改了权重的关键词、可能包含新增关键词、依赖被修改的默认分类或分类顺序的邮件，
+    其余结果直接升级到新版本。按子串匹配（whole_word 为 False）时无法判断哪些邮件包含新增关键词，
+    新增关键词会清空全部结果。
+    """
+
+    def __init__(self, db_path="classification_cache.db", max_entries=200000):
+        """初始化分类缓存
+
+        Args:
+            db_path: 数据库路径
+            max_entries: 最多保存的结果数量，0 表示不限制
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.version = None
+        self.initialize_db()
+
+    def initialize_db(self):
+        """初始化数据库"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS classifications (
+                content_hash TEXT PRIMARY KEY,
+                rules_version TEXT,
+                category TEXT,
+                scores TEXT,
+                hits TEXT,
+                word_filter BLOB,
+                last_used REAL
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_classifications_last_used ON classifications (last_used)")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS classification_rules (
+                version TEXT PRIMARY KEY,
+                rules TEXT,
+                updated_at REAL
+            )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def sync_rules(self, snapshot, tokenize):
+        """切换到当前的分类规则，规则有变化时使受影响的结果失效
+
+        Args:
+            snapshot: rules_snapshot() 的结果
+            tokenize: 把关键词切分为单词列表的函数，与分类时的切分方式一致
+
+        Returns:
+            str: 当前规则版本号
+        """
+        version = rules_version(snapshot)
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                row = conn.execute(
+                    "SELECT version, rules FROM classification_rules ORDER BY updated_at DESC LIMIT 1"
+                ).fetchone()
+                if row is None or row[0] != version:
+                    if row is not None:
+                        self._invalidate(conn, row[0], json.loads(row[1]), snapshot, tokenize, version)
+                    conn.execute("DELETE FROM classification_rules")
+                    conn.execute(
+                        "INSERT INTO classification_rules (version, rules, updated_at) VALUES (?, ?, ?)",
+                        (version, json.dumps(snapshot, ensure_ascii=False), time.time())
+                    )
+                    conn.commit()
+            finally:
+                conn.close()
+            self.version = version
+        return version
+
+    def get_many(self, hashes, version=None):
+        """批量读取指定规则版本下的分类结果
+
+        Args:
+            hashes: content_hash() 的结果列表
+            version: 规则版本号，默认为 sync_rules() 切换到的版本
+
+        Returns:
+            dict: {哈希值: (分类, {分类: 得分})}，只包含已缓存的邮件
+        """
+        hashes = list(hashes)
+        version = version or self.version
+        if not hashes or version is None:
+            return {}
+
+        found = {}
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                for start in range(0, len(hashes), _MAX_SQL_PARAMS):
+                    chunk = hashes[start:start + _MAX_SQL_PARAMS]
+                    placeholders = ','.join('?' * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT content_hash, category, scores FROM classifications "
+                        f"WHERE rules_version = ? AND content_hash IN ({placeholders})",
+                        [version] + chunk
+                    ).fetchall()
+                    for key, category, scores in rows:
+                        found[key] = (category, json.loads(scores))
+
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE classifications SET last_used = ? WHERE content_hash = ?",
+                        [(now, key) for key in found]
+                    )
+                    conn.commit()
+            finally:
+                conn.close()
+        return found
+
+    def put_many(self, entries, version=None):
+        """批量保存分类结果
+
+        Args:
+            entries: [(哈希值, 分类, {分类: 得分}, 命中的关键词列表, build_word_filter() 的结果)]
+            version: 得出这些结果的规则版本号，默认为 sync_rules() 切换到的版本
+        """
+        version = version or self.version
+        if not entries or version is None:
+            return
+
+        now = time.time()
+        rows = [
+            (key, version, category, json.dumps(scores, ensure_ascii=False),
+             json.dumps(hits, ensure_ascii=False), word_filter, now)
+            for key, category, scores, hits, word_filter in entries
+        ]
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.executemany('''
+                INSERT OR REPLACE INTO classifications
+                (content_hash, rules_version, category, scores, hits, word_filter, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                self._evict(conn)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def clear(self):
+        """清空所有分类结果"""
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute("DELETE FROM classifications")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _invalidate(self, conn, old_version, old, new, tokenize, version):
+        """删除受规则修改影响的结果，其余结果升级到新版本"""
+        # 规则切换期间仍在用更早的规则分类的结果无法判断是否受影响，直接删除
+        conn.execute("DELETE FROM classifications WHERE rules_version != ?", (old_version,))
+        if old.get('whole_word') != new.get('whole_word') or old.get('tokenizer') != new.get('tokenizer'):
+            conn.execute("DELETE FROM classifications")
+            print("关键词匹配方式、分词词典或中文关键词已修改，清空分类缓存")
+            return
+
+        old_keywords = {(category, keyword): weight
+                        for category, keywords in old.get('categories', []) for keyword, weight in keywords.items()}
+        new_keywords = {(category, keyword): weight
+                        for category, keywords in new['categories'] for keyword, weight in keywords.items()}
+        # 删除或修改了权重的关键词：命中过它们的邮件得分会变化
+        changed = {keyword for (category, keyword), weight in old_keywords.items()
+                   if new_keywords.get((category, keyword)) != weight}
+        # 新增的关键词：可能包含它们的邮件需要重新分类
+        added = [symbols for symbols in (tokenize(key[1]) for key in new_keywords if key not in old_keywords)
+                 if symbols]
+        if added and not new.get('whole_word'):
+            # 按子串匹配时新关键词可能出现在任何单词内部或跨越单词，无法用单词指纹判断
+            conn.execute("DELETE FROM classifications")
+            print("按子串匹配的规则新增了关键词，清空分类缓存")
+            return
+        default_changed = old.get('default_category') != new['default_category']
+        order_changed = [category for category, _ in old.get('categories', [])] != \
+                        [category for category, _ in new['categories']]
+
+        affected = []
+        kept = 0
+        for key, hits, scores, word_filter in conn.execute(
+                "SELECT content_hash, hits, scores, word_filter FROM classifications"):
+            hits = json.loads(hits)
+            if changed.intersection(hits):
+                affected.append((key,))
+                continue
+            if not hits:
+                if default_changed:
+                    affected.append((key,))
+                    continue
+            elif order_changed:
+                # 得分相同的分类按配置顺序取舍
+                values = list(json.loads(scores).values())
+                if values.count(max(values)) > 1:
+                    affected.append((key,))
+                    continue
+            if added:
+                fingerprints = _load_word_filter(word_filter)
+                if any(_filter_contains(fingerprints, symbols) for symbols in added):
+                    affected.append((key,))
+                    continue
+            kept += 1
+
+        conn.executemany("DELETE FROM classifications WHERE content_hash = ?", affected)
+        conn.execute("UPDATE classifications SET rules_version = ?", (version,))
+        print(f"分类规则已修改，{len(affected)} 条分类缓存失效，保留 {kept} 条")
+
+    def _evict(self, conn):
+        """结果数量超过上限时删除最久未使用的结果"""
+        if not self.max_entries:
+            return
+        count = conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        conn.execute('''
+        DELETE FROM classifications WHERE content_hash IN (
+            SELECT content_hash FROM classifications ORDER BY last_used LIMIT ?
+        )
+        ''', (count - self.max_entries,))
@@ -6,8 +6,68 @@ IMAP_PORT = 993
 SMTP_SERVER = "smtp.example.com"
 SMTP_PORT = 25
 
+# 发送配置
+SMTP_POOL_ENABLED = True  # 复用已登录的SMTP连接，批量回复时不必为每封邮件重新建立TLS连接和登录
+SMTP_POOL_SIZE = 4  # SMTP连接数上限
+SMTP_POOL_IDLE_TIMEOUT = 60  # 空闲SMTP连接保留时间（秒），服务器通常会在几分钟内关闭空闲连接
+SMTP_POOL_HEALTH_CHECK_INTERVAL = 15  # 空闲超过该时间的连接在复用前先发送NOOP检查（秒）
+SMTP_RATE_LIMIT = 60  # 每分钟最多发送的邮件数量，0 表示不限速
+SMTP_RATE_BURST = 20  # 最多连续发送的邮件数量，之后按 SMTP_RATE_LIMIT 的速度发送
+SMTP_PROVIDER_RATE_LIMITS = {}  # 按SMTP服务器单独设置的限速，如 {"smtp.example.com": (每分钟数量, 连续发送数量)}
+OUTBOX_ENABLED = True  # 待发送的邮件先保存到发件箱，由后台线程发送，失败后自动重试，重启后继续发送
+OUTBOX_DB_PATH = "outbox.db"  # 发件箱的存储位置
+OUTBOX_MAX_ATTEMPTS = 8  # 每封邮件最多尝试发送的次数，之后标记为无法发送
+OUTBOX_RETRY_BASE_DELAY = 30  # 遇到 4xx 响应或连接错误后第一次重试前的等待时间（秒），之后每次加倍
+OUTBOX_RETRY_MAX_DELAY = 3600  # 重试等待时间的上限（秒）
+OUTBOX_KEEP_SENT_DAYS = 7  # 已发送记录的保留天数
+
+# 同步配置
+INCREMENTAL_SYNC = True  # 刷新时只获取上次同步之后的新邮件
+SYNC_STATE_DB = "email_data.db"  # 文件夹同步状态（UIDVALIDITY/最大UID）的存储位置
+FETCH_FOLDERS = ["INBOX"]  # 每次刷新获取的文件夹，多个文件夹时并行获取
+FETCH_BATCH_SIZE = 200  # 每个FETCH命令请求的邮件数量
+STREAM_FIRST_BATCH_SIZE = 50  # 第一批只请求的邮件数量，让列表尽快显示第一批邮件
+# 邮件列表获取方式: "full" 获取完整邮件, "headers" 只获取头部，
+# "text" 获取头部并按 BODYSTRUCTURE 只下载文本正文（供分类使用）；后两种在打开邮件时再加载正文和附件
+FETCH_MODE = "text"
+TEXT_PREVIEW_BYTES = 16384  # "text" 模式下每封邮件最多下载的正文字节数，0 表示不截断
+PARSE_WORKERS = 0  # 解析完整邮件（MIME和字符集解码）的子进程数，0 表示在获取邮件的线程中解析
+BODY_CACHE_SIZE = 50  # 缓存最近打开的邮件正文数量
+MESSAGE_STORE_ENABLED = True  # 在本地保存下载过的邮件（原始邮件，或 headers/text 模式获取的列表数据），重启后无需重新下载
+MESSAGE_STORE_DB = "message_store.db"  # 本地原始邮件的存储位置
+MESSAGE_STORE_MAX_MB = 500  # 本地邮件存储（压缩后）的大小上限，超出时淘汰最久未访问的邮件
+IMAP_COMPRESS = True  # 服务器支持时启用 COMPRESS=DEFLATE 压缩IMAP传输
+IMAP_POOL_SIZE = 4  # 后台任务共用的IMAP连接数上限
+IMAP_POOL_IDLE_TIMEOUT = 300  # 空闲连接保留时间（秒）
+IMAP_POOL_HEALTH_CHECK_INTERVAL = 60  # 空闲超过该时间的连接在复用前先发送NOOP检查（秒）
+
+# 新邮件推送（IMAP IDLE）
+IDLE_ENABLED = True  # 连接后在后台监听新邮件
+IDLE_FOLDER = "INBOX"  # 监听的文件夹
+IDLE_TIMEOUT = 29 * 60  # 每隔多少秒重新发送IDLE（RFC 2177 建议不超过29分钟）
+IDLE_POLL_INTERVAL = 60  # 服务器不支持IDLE时的轮询间隔（秒）
+IDLE_MAX_RECONNECT_DELAY = 300  # 断线重连的最大等待时间（秒）
+
 # 分类配置
 DEFAULT_CATEGORY = "其他"
+KEYWORD_WHOLE_WORD = True  # 关键词只匹配完整的单词（"fee" 不匹配 "feedback"），中文按 CJK_SEGMENTATION 切分后匹配完整的词
+CJK_SEGMENTATION = "dict"  # 中文切分方式: "dict" 按词典分词（关键词需作为完整的词出现）, "char" 按单个汉字匹配
+# 分词词典（每行一个词，按字节排序），可用 cjk_segmenter.build_dictionary() 从 jieba 等词典转换。
+# 项目中不包含该文件，不存在时只按分类关键词切分（"开发票据" 仍会匹配 "发票"）
+CJK_DICT_PATH = "cjk_dict.txt"
+NLTK_DATA_DIR = "nltk_data"  # 本地NLTK数据目录（停用词、分词器），启动时不会联网下载
+CLASSIFY_WORKERS = 0  # 批量分类的子进程数，0 表示在调用线程中分类
+CLASSIFY_POOL_MIN_BATCH = 2000  # 一批邮件达到该数量时才使用分类进程池，批次较小时进程间传输的开销大于收益
+CLASSIFICATION_CACHE_ENABLED = True  # 按邮件内容缓存分类结果，规则修改后只重新分类受影响的邮件
+CLASSIFICATION_CACHE_DB = "classification_cache.db"  # 分类结果缓存的存储位置
+CLASSIFICATION_CACHE_MAX_ENTRIES = 200000  # 最多缓存的分类结果数量，超出时删除最久未使用的结果
+CLASSIFIER_BACKEND = "rules"  # 分类方式: "rules" 按关键词规则, "bayes" 使用从已分类邮件训练的朴素贝叶斯模型（训练数据不足时仍按规则）
+CLASSIFIER_MODEL_PATH = "classifier_model.npz"  # 统计模型的保存位置，不存在时从 CLASSIFIER_TRAINING_DB 训练
+CLASSIFIER_TRAINING_DB = "email_data.db"  # 训练数据所在的数据库（emails 表中已分类的邮件）
+CLASSIFIER_HASH_FEATURES = 2 ** 18  # 单词哈希桶的数量（2的幂），越大冲突越少，模型文件也越大
+CLASSIFIER_MIN_TRAINING_EMAILS = 20  # 已分类邮件少于该数量时统计模型不可靠，仍按关键词规则分类
+CLASSIFICATION_RULES_FILE = "classification_rules.json"  # 分类规则文件，存在时代替下面的 CATEGORY_KEYWORDS 和 DEFAULT_CATEGORY
+RULES_RELOAD_INTERVAL = 5  # 检查规则文件是否修改的间隔（秒），修改后在后台重新加载，0 表示不检查
 CATEGORY_KEYWORDS = {
     "账单": ["invoice", "payment", "fee"],
     "支付": ["payment", "refund", "charge"],
@@ -0,0 +1,149 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """等待空闲连接超时，其他线程归还连接后可以重试"""
+
+
+class ConnectionPool(ABC):
+    """有上限的连接池
+
+    每个连接只在创建时登录一次，归还后可被其他线程复用。
+    借出前对空闲较久的连接执行健康检查，空闲超时的连接会被注销。
+    子类实现 _is_healthy() 和 _logout() 以管理具体协议的连接。
+    """
+
+    # 错误信息中的协议名称
+    protocol = ""
+
+    def __init__(self, connection_factory, max_size=4, idle_timeout=300, health_check_interval=60):
+        """初始化连接池
+
+        Args:
+            connection_factory: 创建已登录连接的函数
+            max_size: 最大连接数
+            idle_timeout: 空闲连接的保留时间（秒）
+            health_check_interval: 空闲超过该时间（秒）的连接在借出前先检查是否可用
+        """
+        self.connection_factory = connection_factory
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.idle = deque()  # (连接, 归还时间)
+        self.size = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """借出一个可用连接，连接数已达上限时等待其他线程归还
+
+        Args:
+            timeout: 最长等待时间（秒），None 表示一直等待
+
+        Returns:
+            已登录的连接
+
+        Raises:
+            PoolTimeout: 超过 timeout 仍没有可用连接
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            expired = []
+            conn = None
+            with self.condition:
+                if self.closed:
+                    raise Exception(f"{self.protocol}连接池已关闭")
+
+                # 清理空闲超时的连接（最早归还的在队首）
+                now = time.monotonic()
+                while self.idle and now - self.idle[0][1] > self.idle_timeout:
+                    expired.append(self.idle.popleft()[0])
+                    self.size -= 1
+
+                if self.idle:
+                    # 优先复用最近归还的连接
+                    conn, released_at = self.idle.pop()
+                    needs_check = now - released_at > self.health_check_interval
+                elif self.size < self.max_size:
+                    self.size += 1
+                    needs_check = None
+                else:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolTimeout(f"等待{self.protocol}连接超时")
+                    self.condition.wait(remaining)
+                    continue
+
+            for expired_conn in expired:
+                self._logout(expired_conn)
+
+            if needs_check is None:
+                # 在锁外创建新连接，登录可能较慢
+                try:
+                    return self.connection_factory()
+                except Exception:
+                    self._discard_slot()
+                    raise
+
+            if not needs_check or self._is_healthy(conn):
+                return conn
+
+            # 健康检查失败，丢弃后重新获取
+            self._logout(conn)
+            self._discard_slot()
+
+    def release(self, conn):
+        """归还连接"""
+        with self.condition:
+            if not self.closed:
+                self.idle.append((conn, time.monotonic()))
+                self.condition.notify()
+                return
+            self.size -= 1
+        self._logout(conn)
+
+    def discard(self, conn=None):
+        """丢弃一个已失效的借出连接，释放其占用的名额"""
+        if conn is not None:
+            self._logout(conn)
+        self._discard_slot()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """以上下文管理器的方式借用连接，出错时丢弃该连接"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except Exception:
+            self.discard(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """关闭连接池并注销所有空闲连接"""
+        with self.condition:
+            self.closed = True
+            idle = [conn for conn, _ in self.idle]
+            self.idle.clear()
+            self.size -= len(idle)
+            self.condition.notify_all()
+        for conn in idle:
+            self._logout(conn)
+
+    def _discard_slot(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    @abstractmethod
+    def _is_healthy(self, conn):
+        """检查空闲连接是否仍然可用"""
+
+    @abstractmethod
+    def _logout(self, conn):
+        """注销并关闭连接，忽略错误"""
@@ -69,7 +69,8 @@ class EmailAnalytics:
         # 创建邮件表
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS emails (
-            id TEXT PRIMARY KEY,
+            id TEXT,
+            folder TEXT DEFAULT '',
             sender TEXT,
             subject TEXT,
             body TEXT,
@@ -79,10 +80,23 @@ class EmailAnalytics:
             reply_content TEXT,
             reply_date TEXT,
             response_time REAL,
-            created_at TEXT
+            created_at TEXT,
+            flags TEXT,
+            rules_version TEXT,
+            PRIMARY KEY (folder, id)
         )
         ''')
         
+        # 兼容没有 flags、rules_version 列的旧数据库
+        cursor.execute("PRAGMA table_info(emails)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'flags' not in columns:
+            cursor.execute("ALTER TABLE emails ADD COLUMN flags TEXT")
+        if 'rules_version' not in columns:
+            cursor.execute("ALTER TABLE emails ADD COLUMN rules_version TEXT")
+        if 'folder' not in columns:
+            self._add_folder_column(cursor)
+        
         # 创建统计表
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS statistics (
@@ -98,6 +112,24 @@ class EmailAnalytics:
         conn.commit()
         conn.close()
         
+    def _add_folder_column(self, cursor):
+        """把旧数据库的主键从 id 改为 (folder, id)
+        
+        UID 只在同一个文件夹内唯一，不同文件夹的邮件可能有相同的 id。
+        旧记录的文件夹未知，folder 记为空字符串，不会被按文件夹同步的标记和删除修改。
+        """
+        cursor.execute("PRAGMA table_info(emails)")
+        # (列名, 类型, 默认值)，保留旧表中的所有列
+        columns = [(row[1], row[2], row[4]) for row in cursor.fetchall()]
+        definitions = [f"{name} {type_}" + (f" DEFAULT {default}" if default is not None else "")
+                       for name, type_, default in columns]
+        names = ', '.join(name for name, _, _ in columns)
+        cursor.execute("ALTER TABLE emails RENAME TO emails_old")
+        cursor.execute(f"CREATE TABLE emails ({', '.join(definitions)}, folder TEXT DEFAULT '', "
+                       f"PRIMARY KEY (folder, id))")
+        cursor.execute(f"INSERT INTO emails ({names}) SELECT {names} FROM emails_old")
+        cursor.execute("DROP TABLE emails_old")
+    
     def save_email(self, email_data):
         """保存邮件数据到数据库
         
@@ -113,14 +145,17 @@ class EmailAnalytics:
             
             # 提取必要字段
             email_id = email_data.get('id', '')
+            folder = email_data.get('folder', '')
             sender = email_data.get('from', '')
             subject = email_data.get('subject', '')
             body = email_data.get('body', '')
             date = email_data.get('date', '')
             category = email_data.get('category', '未分类')
+            # 自动分类时使用的规则版本，用户手动指定分类时为空
+            rules_version = email_data.get('rules_version')
             
             # 检查是否已存在
-            cursor.execute("SELECT id FROM emails WHERE id = ?", (email_id,))
+            cursor.execute("SELECT id FROM emails WHERE folder = ? AND id = ?", (folder, email_id))
             if cursor.fetchone():
                 # 更新现有记录
                 cursor.execute('''
@@ -130,27 +165,28 @@ class EmailAnalytics:
                 body = ?,
                 date = ?,
                 category = ?,
+                rules_version = ?,
                 is_replied = ?,
                 reply_content = ?,
                 reply_date = ?,
                 response_time = ?
-                WHERE id = ?
+                WHERE folder = ? AND id = ?
                 ''', (
-                    sender, subject, body, date, category, 
+                    sender, subject, body, date, category, rules_version,
                     email_data.get('is_replied', 0),
                     email_data.get('reply_content', ''),
                     email_data.get('reply_date', ''),
                     email_data.get('response_time', 0),
-                    email_id
+                    folder, email_id
                 ))
             else:
                 # 插入新记录
                 cursor.execute('''
-                INSERT INTO emails (id, sender, subject, body, date, category, is_replied, 
+                INSERT INTO emails (id, folder, sender, subject, body, date, category, rules_version, is_replied, 
                                   reply_content, reply_date, response_time, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
-                    email_id, sender, subject, body, date, category,
+                    email_id, folder, sender, subject, body, date, category, rules_version,
                     email_data.get('is_replied', 0),
                     email_data.get('reply_content', ''),
                     email_data.get('reply_date', ''),
@@ -170,6 +206,150 @@ class EmailAnalytics:
         finally:
             conn.close()
     
+    def update_email_flags(self, flag_updates, folder):
+        """按服务器上的标记更新邮件记录
+        
+        Args:
+            flag_updates: {邮件ID: 标记列表}
+            folder: 邮件所在的文件夹（UID 只在文件夹内唯一）
+            
+        Returns:
+            bool: 是否成功
+        """
+        if not flag_updates:
+            return True
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            for email_id, flags in flag_updates.items():
+                cursor.execute("UPDATE emails SET flags = ? WHERE folder = ? AND id = ?",
+                               (' '.join(flags), folder, email_id))
+                # 在其他客户端回复过的邮件也计为已回复
+                if '\\Answered' in flags:
+                    cursor.execute("UPDATE emails SET is_replied = 1 WHERE folder = ? AND id = ?", (folder, email_id))
+            
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"更新邮件标记失败: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def get_stale_emails(self, rules_version):
+        """读取按其他版本规则自动分类的邮件（用户手动指定分类的邮件不包括在内）
+        
+        Args:
+            rules_version: 当前规则版本号
+            
+        Returns:
+            list: 邮件字典列表，包含 id、folder、from、subject、body、category 和 rules_version
+        """
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, folder, sender, subject, body, category, rules_version FROM emails "
+                "WHERE rules_version IS NOT NULL AND rules_version != ?",
+                (rules_version,)
+            )
+            return [
+                {'id': row[0], 'folder': row[1], 'from': row[2], 'subject': row[3], 'body': row[4],
+                 'category': row[5], 'rules_version': row[6]}
+                for row in cursor.fetchall()
+            ]
+        except Exception as e:
+            print(f"读取待重新分类的邮件失败: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def update_email_categories(self, emails):
+        """批量更新邮件的分类和规则版本，完成后重新计算统计数据
+        
+        Args:
+            emails: 邮件字典列表
+            
+        Returns:
+            bool: 是否成功
+        """
+        if not emails:
+            return True
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE emails SET category = ?, rules_version = ? WHERE folder = ? AND id = ?",
+                [(email_data.get('category'), email_data.get('rules_version'),
+                  email_data.get('folder', ''), email_data.get('id'))
+                 for email_data in emails]
+            )
+            conn.commit()
+        except Exception as e:
+            print(f"更新邮件分类失败: {e}")
+            return False
+        finally:
+            conn.close()
+        self.update_statistics()
+        return True
+    
+    def mark_emails_replied(self, replies):
+        """批量标记邮件为已回复，完成后重新计算统计数据
+        
+        Args:
+            replies: [(文件夹, 邮件ID, 回复内容)]
+            
+        Returns:
+            bool: 是否成功
+        """
+        if not replies:
+            return True
+        reply_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE emails SET is_replied = 1, reply_content = ?, reply_date = ? WHERE folder = ? AND id = ?",
+                [(content, reply_date, folder, email_id) for folder, email_id, content in replies]
+            )
+            conn.commit()
+        except Exception as e:
+            print(f"标记已回复邮件失败: {e}")
+            return False
+        finally:
+            conn.close()
+        self.update_statistics()
+        return True
+    
+    def delete_emails(self, email_ids, folder):
+        """删除已在服务器上删除的邮件记录
+        
+        Args:
+            email_ids: 邮件ID列表
+            folder: 邮件所在的文件夹（UID 只在文件夹内唯一）
+            
+        Returns:
+            bool: 是否成功
+        """
+        if not email_ids:
+            return True
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.executemany("DELETE FROM emails WHERE folder = ? AND id = ?",
+                               [(folder, email_id) for email_id in email_ids])
+            conn.commit()
+            
+            # 更新统计数据
+            self.update_statistics()
+            return True
+        except Exception as e:
+            print(f"删除邮件记录失败: {e}")
+            return False
+        finally:
+            conn.close()
+    
     def update_statistics(self):
         """更新统计数据表"""
         conn = sqlite3.connect(self.db_path)
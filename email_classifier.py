@@ -1,10 +1,115 @@
+import os
 import re
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-import nltk
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from classification_cache import ClassificationCache, build_word_filter, content_hash
+from rule_set import RuleSet, RulesWatcher, file_signature, load_rules_file, save_rules_file
+
+# 预处理时去掉的标点符号
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+# 纯ASCII文本用 str.translate 删除同样的字符，比正则替换快得多
+_ASCII_PUNCTUATION_TABLE = str.maketrans('', '', ''.join(
+    chr(code) for code in range(128) if _PUNCTUATION_RE.match(chr(code))
+))
+
+
+def _strip_punctuation(text):
+    """删除标点符号"""
+    if text.isascii():
+        return text.translate(_ASCII_PUNCTUATION_TABLE)
+    return _PUNCTUATION_RE.sub('', text)
+
+# NLTK 的英文停用词表，本地没有 NLTK 数据时使用这份内置副本
+_BUILTIN_STOP_WORDS = frozenset("""
+a about above after again against ain all am an and any are aren aren't as at be because been before being
+below between both but by can couldn couldn't d did didn didn't do does doesn doesn't doing don don't down
+during each few for from further had hadn hadn't has hasn hasn't have haven haven't having he her here hers
+herself him himself his how i if in into is isn isn't it it's its itself just ll m ma me mightn mightn't more
+most mustn mustn't my myself needn needn't no nor not now o of off on once only or other our ours ourselves
+out over own re s same shan shan't she she's should should've shouldn shouldn't so some such t than that
+that'll the their theirs them themselves then there these they this those through to too under until up ve
+very was wasn wasn't we were weren weren't what when where which while who whom why will with won won't
+wouldn wouldn't y you you'd you'll you're you've your yours yourself yourselves
+""".split())
+
+_resource_lock = threading.Lock()
+_stop_words = None
+_tokenizer = None
+
+
+def _add_nltk_data_dir(data_dir):
+    """把本地 NLTK 数据目录加入搜索路径（不会访问网络）"""
+    import nltk
+    if data_dir and os.path.isdir(data_dir) and data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+
+
+def load_stop_words(data_dir=None):
+    """首次使用时加载英文停用词
+
+    只从本地读取 NLTK 的 stopwords 语料，不存在或未安装 NLTK 时使用内置词表。
+
+    Args:
+        data_dir: 项目自带的 NLTK 数据目录
+
+    Returns:
+        frozenset: 停用词集合
+    """
+    global _stop_words
+    with _resource_lock:
+        if _stop_words is None:
+            try:
+                _add_nltk_data_dir(data_dir)
+                from nltk.corpus import stopwords
+                _stop_words = frozenset(stopwords.words('english'))
+            except (ImportError, LookupError, OSError):
+                print("未找到本地NLTK停用词数据，使用内置停用词表")
+                _stop_words = _BUILTIN_STOP_WORDS
+        return _stop_words
+
+
+def load_tokenizer(data_dir=None):
+    """首次使用时加载分词器
+
+    本地有 NLTK 的 punkt 数据时使用 word_tokenize，否则按空白切分
+    （预处理已去掉标点，两者的结果基本一致）。
+
+    Args:
+        data_dir: 项目自带的 NLTK 数据目录
+
+    Returns:
+        callable: 把文本切分为单词列表的函数
+    """
+    global _tokenizer
+    with _resource_lock:
+        if _tokenizer is None:
+            try:
+                _add_nltk_data_dir(data_dir)
+                from nltk.tokenize import word_tokenize
+                # punkt 数据缺失时要到第一次分词才会报错
+                word_tokenize("test")
+                _tokenizer = word_tokenize
+            except (ImportError, LookupError, OSError):
+                print("未找到本地NLTK分词数据，使用空白分词")
+                _tokenizer = str.split
+        return _tokenizer
+
+
+# 分类进程池中每个子进程各自的分类器，由 _init_classify_worker 创建
+_worker_classifier = None
+
+
+def _init_classify_worker(settings):
+    """分类子进程的初始化函数"""
+    global _worker_classifier
+    _worker_classifier = EmailClassifier(SimpleNamespace(**settings))
+
+
+def _classify_texts_in_worker(texts, details=False):
+    """在分类子进程中分类一组文本"""
+    return _worker_classifier.classify_texts(texts, details)
 
-nltk.download('punkt')
-nltk.download('stopwords')
 
 class EmailClassifier:
     def __init__(self, config=None):
@@ -13,20 +118,290 @@ class EmailClassifier:
             from config import load_config
             config = load_config()
             
-        self.stop_words = set(stopwords.words('english'))
-        self.category_keywords = config.CATEGORY_KEYWORDS
-        self.default_category = config.DEFAULT_CATEGORY
+        # 停用词和分词器在第一次预处理时才加载，启动时不导入 NLTK，也不访问网络
+        self.nltk_data_dir = getattr(config, 'NLTK_DATA_DIR', None)
+        self._stop_words = None
+        self._tokenize = None
+        # 关键词自动机只在规则变化时构建
+        self.whole_word = getattr(config, 'KEYWORD_WHOLE_WORD', True)
+
+        # 中文分词："dict" 按词典分词（分类关键词总会被切分为完整的词），"char" 按单个汉字匹配
+        self.cjk_segmentation = getattr(config, 'CJK_SEGMENTATION', 'dict')
+        self.cjk_dict_path = getattr(config, 'CJK_DICT_PATH', 'cjk_dict.txt')
+
+        # 规则文件存在时使用其中的规则，否则使用配置中的 CATEGORY_KEYWORDS；
+        # 规则文件修改后在后台编译新规则并整体替换，不需要重启
+        self.config_keywords = config.CATEGORY_KEYWORDS
+        self.config_default_category = config.DEFAULT_CATEGORY
+        self.rules_file = getattr(config, 'CLASSIFICATION_RULES_FILE', None)
+        self.rules_lock = threading.Lock()
+        self.rules_listeners = []
+        try:
+            self.rules = self._compile_rules()
+        except Exception as e:
+            # 规则文件格式错误时不影响启动，修正后由监听线程重新加载
+            print(f"读取分类规则失败: {e}，使用配置中的分类关键词")
+            self.rules = self._config_rules()
+
+        # 分类方式："rules" 按关键词规则，"bayes" 使用从已分类邮件训练的朴素贝叶斯模型，
+        # 模型的训练数据不足时仍按关键词规则分类
+        self.backend = getattr(config, 'CLASSIFIER_BACKEND', 'rules')
+        self.model_path = getattr(config, 'CLASSIFIER_MODEL_PATH', 'classifier_model.npz')
+        self.training_db = getattr(config, 'CLASSIFIER_TRAINING_DB', 'email_data.db')
+        self.model = None
+        if self.backend == 'bayes':
+            self._load_model(getattr(config, 'CLASSIFIER_HASH_FEATURES', 2 ** 18),
+                             getattr(config, 'CLASSIFIER_MIN_TRAINING_EMAILS', 20))
+
+        # 按邮件内容缓存分类结果，重新分类时只处理新邮件和内容变化的邮件；
+        # 统计模型会随用户的修正不断更新，而且整批预测本身就很快，模型可用时不使用缓存
+        self.cache = None
+        if getattr(config, 'CLASSIFICATION_CACHE_ENABLED', True):
+            try:
+                self.cache = ClassificationCache(
+                    getattr(config, 'CLASSIFICATION_CACHE_DB', 'classification_cache.db'),
+                    getattr(config, 'CLASSIFICATION_CACHE_MAX_ENTRIES', 200000)
+                )
+                self.cache.sync_rules(self.rules.snapshot, self.rules.keyword_matcher.keyword_symbols)
+            except Exception as e:
+                print(f"初始化分类缓存失败: {e}")
+                self.cache = None
+
+        # 批量分类的进程池，CLASSIFY_WORKERS 为 0 时在调用线程中分类
+        self.classify_workers = getattr(config, 'CLASSIFY_WORKERS', 0)
+        self.classify_pool_min_batch = getattr(config, 'CLASSIFY_POOL_MIN_BATCH', 2000)
+        # (规则版本, 进程池)：子进程中的规则在创建时确定，规则变化后换用新的进程池
+        self.classify_pool = None
+        if self.classify_workers > 0:
+            self.classify_pool = (self.rules.version, self._start_pool(self.rules))
+
+        self.rules_watcher = None
+        reload_interval = getattr(config, 'RULES_RELOAD_INTERVAL', 5)
+        if self.rules_file and reload_interval > 0:
+            self.rules_watcher = RulesWatcher(self.rules_file, self.reload_rules, reload_interval)
+            self.rules_watcher.start()
+
+    @property
+    def keyword_matcher(self):
+        return self.rules.keyword_matcher
+
+    @property
+    def segmenter(self):
+        return self.rules.segmenter
+
+    @property
+    def category_keywords(self):
+        return self.rules.category_keywords
+
+    @property
+    def default_category(self):
+        return self.rules.default_category
+
+    @property
+    def rules_version(self):
+        """当前分类规则的版本号"""
+        return self.rules.version
+
+    @property
+    def categories(self):
+        """当前规则中的所有分类（包括默认分类）"""
+        return self.rules.categories
+
+    def _compile_rules(self):
+        """读取规则文件（不存在时使用配置）并编译"""
+        loaded = load_rules_file(self.rules_file)
+        if loaded is None:
+            return self._config_rules()
+        category_keywords, default_category = loaded
+        return RuleSet(category_keywords, default_category or self.config_default_category, self.whole_word,
+                       self.cjk_segmentation, self.cjk_dict_path, source=self.rules_file)
+
+    def _config_rules(self):
+        """编译配置中的 CATEGORY_KEYWORDS"""
+        return RuleSet(self.config_keywords, self.config_default_category, self.whole_word,
+                       self.cjk_segmentation, self.cjk_dict_path)
+
+    def _start_pool(self, rules, warm_up=False):
+        """创建使用指定规则的分类进程池
+
+        warm_up 为 True 时等所有子进程启动并完成初始化后再返回，替换进程池后的第一批分类不用等待子进程启动。
+        """
+        # 子进程只需要分类相关的配置，不传递整个配置模块，也不读取和监听规则文件
+        settings = {
+            'CATEGORY_KEYWORDS': rules.category_keywords,
+            'DEFAULT_CATEGORY': rules.default_category,
+            'KEYWORD_WHOLE_WORD': self.whole_word,
+            'CJK_SEGMENTATION': self.cjk_segmentation,
+            'CJK_DICT_PATH': self.cjk_dict_path,
+            'NLTK_DATA_DIR': self.nltk_data_dir,
+            'CLASSIFICATION_CACHE_ENABLED': False,
+        }
+        executor = ProcessPoolExecutor(
+            max_workers=self.classify_workers,
+            initializer=_init_classify_worker,
+            initargs=(settings,)
+        )
+        if warm_up:
+            # 同时提交的任务数等于进程数时，进程池会启动全部子进程
+            futures = [executor.submit(_classify_texts_in_worker, ['']) for _ in range(self.classify_workers)]
+            for future in futures:
+                future.result()
+        return executor
+
+    def reload_rules(self):
+        """重新读取并编译分类规则，规则有变化时替换当前规则
+
+        新规则在调用线程中编译，分类缓存和进程池也在替换前准备好；正在进行的分类继续使用旧规则，
+        替换后的分类使用新规则。替换后依次调用 add_rules_listener() 注册的函数。
+
+        Returns:
+            bool: 规则是否发生变化
+        """
+        with self.rules_lock:
+            try:
+                rules = self._compile_rules()
+            except Exception as e:
+                print(f"读取分类规则失败: {e}，继续使用当前规则")
+                return False
+            old_rules = self.rules
+            if rules.version == old_rules.version:
+                rules.close()
+                return False
+
+            if self.cache:
+                try:
+                    self.cache.sync_rules(rules.snapshot, rules.keyword_matcher.keyword_symbols)
+                except Exception as e:
+                    print(f"更新分类缓存失败: {e}")
+            old_pool = self.classify_pool
+            if old_pool:
+                self.classify_pool = (rules.version, self._start_pool(rules, warm_up=True))
+            self.rules = rules
+            # 旧进程池中已提交的任务仍会完成；旧规则的分词词典不主动关闭，
+            # 由仍在使用它的分类调用结束后回收
+            if old_pool:
+                threading.Thread(target=old_pool[1].shutdown, name="ClassifyPoolShutdown", daemon=True).start()
+            print(f"分类规则已更新，版本 {old_rules.version} -> {rules.version}")
+
+        for listener in list(self.rules_listeners):
+            try:
+                listener(rules.version)
+            except Exception as e:
+                print(f"通知分类规则更新失败: {e}")
+        return True
+
+    def update_rules(self, category_keywords, default_category=None):
+        """修改分类规则：写入规则文件并立即生效
+
+        Args:
+            category_keywords: {分类: 关键词列表} 或 {分类: {关键词: 权重}}
+            default_category: 默认分类，默认保持不变
+
+        Returns:
+            bool: 是否成功
+        """
+        if not self.rules_file:
+            print("未配置 CLASSIFICATION_RULES_FILE，无法保存分类规则")
+            return False
+        try:
+            save_rules_file(self.rules_file, category_keywords, default_category or self.default_category)
+        except Exception as e:
+            print(f"保存分类规则失败: {e}")
+            return False
+        if self.rules_watcher:
+            # 监听线程不必再次加载同一份文件
+            self.rules_watcher.signature = file_signature(self.rules_file)
+        self.reload_rules()
+        return True
+
+    def add_rules_listener(self, callback):
+        """注册规则更新后的回调函数，参数为新的规则版本号（在更新规则的线程中调用）"""
+        self.rules_listeners.append(callback)
+
+    def _load_model(self, n_features, min_samples):
+        """读取统计模型，模型文件不存在时用 emails 表中已分类的邮件训练"""
+        # 只有使用统计模型时才导入 numpy
+        from statistical_classifier import NaiveBayesClassifier
+        # 停用词在模型第一次训练或预测时才加载，启动时不导入 NLTK
+        stop_words = lambda: self.stop_words
+        try:
+            self.model = NaiveBayesClassifier.load(self.model_path, min_samples, stop_words)
+            if self.model is None:
+                self.model = NaiveBayesClassifier(n_features, min_samples=min_samples, stop_words=stop_words)
+                self.train_model()
+        except Exception as e:
+            print(f"初始化分类模型失败: {e}，使用关键词规则分类")
+            self.model = None
+
+    def train_model(self, db_path=None):
+        """用邮件分析数据库中已分类的邮件重新训练统计模型
+
+        Args:
+            db_path: 数据库路径，默认为 CLASSIFIER_TRAINING_DB
+
+        Returns:
+            int: 训练使用的邮件数量，未启用统计模型或训练失败时返回 0
+        """
+        if self.model is None:
+            return 0
+        from statistical_classifier import load_training_data
+        try:
+            samples = load_training_data(db_path or self.training_db)
+            self.model.fit(self._model_documents([text for text, _ in samples]),
+                           [category for _, category in samples])
+            self.model.save(self.model_path)
+            print(f"分类模型训练完成，共 {self.model.sample_count} 封邮件")
+            return self.model.sample_count
+        except Exception as e:
+            print(f"训练分类模型失败: {e}")
+            return 0
+
+    def learn(self, emails, category):
+        """用户把邮件改为 category 时增量更新统计模型
+
+        Args:
+            emails: 邮件字典列表
+            category: 用户指定的分类
+
+        Returns:
+            bool: 是否成功
+        """
+        if self.model is None or not emails:
+            return False
+        try:
+            texts = [f"{email_data.get('subject') or ''}\n{email_data.get('body') or ''}" for email_data in emails]
+            self.model.partial_fit(self._model_documents(texts), [category] * len(texts))
+            self.model.save(self.model_path)
+            return True
+        except Exception as e:
+            print(f"更新分类模型失败: {e}")
+            return False
+
+    @property
+    def stop_words(self):
+        """英文停用词集合，首次访问时加载"""
+        if self._stop_words is None:
+            self._stop_words = load_stop_words(self.nltk_data_dir)
+        return self._stop_words
+
+    def _get_tokenizer(self):
+        if self._tokenize is None:
+            self._tokenize = load_tokenizer(self.nltk_data_dir)
+        return self._tokenize
 
     def preprocess_text(self, text):
         """文本预处理"""
-        text = text.lower()
-        text = re.sub(r'[^\w\s]', '', text)
-        tokens = word_tokenize(text)
-        filtered_tokens = [word for word in tokens if word not in self.stop_words]
+        text = _strip_punctuation(text.lower())
+        tokens = self._get_tokenizer()(text)
+        stop_words = self.stop_words
+        filtered_tokens = [word for word in tokens if word not in stop_words]
         return ' '.join(filtered_tokens)
 
     def classify_email(self, email_data):
         """对邮件进行分类"""
+        if self.model is not None and self.model.ready:
+            return self.classify_texts([f"{email_data['subject']}\n{email_data['body']}"])[0][0]
+
         processed_subject = self.preprocess_text(email_data['subject'])
         processed_body = self.preprocess_text(email_data['body'])
 
@@ -37,15 +412,189 @@ class EmailClassifier:
         category = self._rule_based_classification(combined_text)
         return category
 
+    def classify_batch(self, emails):
+        """批量分类邮件
+
+        主题和正文合并后只预处理一次，分词器、停用词和关键词自动机在整批邮件间共享。
+        启用分类缓存时只分类内容不在缓存中的邮件；启用分类进程池且需要分类的邮件数量达到
+        CLASSIFY_POOL_MIN_BATCH 时，按进程数拆分后在子进程中分类。
+
+        Args:
+            emails: 邮件字典列表
+
+        Returns:
+            list: [(分类, {分类: 得分})]，顺序与 emails 相同
+        """
+        return self._classify_batch(emails, self.rules)
+
+    def tag_batch(self, emails):
+        """批量分类邮件并打上标签，同时记录得出分类的规则版本（email_data['rules_version']）
+
+        Args:
+            emails: 邮件字典列表，原地修改
+
+        Returns:
+            list: emails
+        """
+        # 整批使用同一份规则，分类期间规则被替换也不会混用新旧规则
+        rules = self.rules
+        for email_data, (category, _) in zip(emails, self._classify_batch(emails, rules)):
+            self.tag_email(email_data, category, rules.version)
+        return emails
+
+    def stale_emails(self, emails):
+        """找出按旧版本规则自动分类的邮件（用户手动指定分类的邮件不计入）"""
+        version = self.rules.version
+        return [email_data for email_data in emails
+                if email_data.get('rules_version') and email_data['rules_version'] != version]
+
+    def _classify_batch(self, emails, rules):
+        texts = [f"{email_data.get('subject') or ''}\n{email_data.get('body') or ''}" for email_data in emails]
+        if not self.cache or (self.model is not None and self.model.ready):
+            return self._classify_texts_parallel(texts, rules)
+
+        keys = [content_hash(text) for text in texts]
+        try:
+            cached = self.cache.get_many(set(keys), rules.version)
+        except Exception as e:
+            print(f"读取分类缓存失败: {e}")
+            cached = {}
+
+        # 同一批中内容相同的邮件只分类一次
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            details = self._classify_texts_parallel(list(missing.values()), rules, details=True)
+            entries = []
+            for key, (category, scores, hits, word_filter) in zip(missing, details):
+                cached[key] = (category, scores)
+                entries.append((key, category, scores, hits, word_filter))
+            try:
+                self.cache.put_many(entries, rules.version)
+            except Exception as e:
+                print(f"保存分类缓存失败: {e}")
+
+        return [cached[key] for key in keys]
+
+    def _classify_texts_parallel(self, texts, rules, details=False):
+        """分类一组文本，数量足够时拆分到分类进程池中"""
+        pool = self.classify_pool
+        # 统计模型整批向量化预测，不需要进程池；规则刚被替换时进程池可能与 rules 不一致，在当前线程中分类
+        if pool and pool[0] == rules.version and len(texts) >= self.classify_pool_min_batch and \
+                not (self.model is not None and self.model.ready):
+            try:
+                chunk_size = -(-len(texts) // self.classify_workers)
+                chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+                results = []
+                for chunk_results in pool[1].map(
+                        _classify_texts_in_worker, chunks, [details] * len(chunks)):
+                    results.extend(chunk_results)
+                return results
+            except Exception as e:
+                print(f"分类进程池出错: {e}，改为在当前线程中分类")
+        return self.classify_texts(texts, details, rules)
+
+    def classify_texts(self, texts, details=False, rules=None):
+        """对已合并主题和正文的文本逐个分类
+
+        Args:
+            texts: 文本列表
+            details: 为 True 时额外返回分类缓存需要的命中关键词和单词过滤器
+            rules: 使用的 RuleSet，默认为当前规则
+
+        Returns:
+            list: [(分类, {分类: 得分})]，details 为 True 时为
+                [(分类, {分类: 得分}, 命中的关键词列表, 单词过滤器)]
+        """
+        rules = rules or self.rules
+        if self.model is not None and self.model.ready:
+            return self._classify_with_model(texts, details, rules)
+
+        tokenize = self._get_tokenizer()
+        stop_words = self.stop_words
+        matcher = rules.keyword_matcher
+        default_category = rules.default_category
+
+        results = []
+        for text in texts:
+            text = text.lower()
+            tokens = tokenize(_strip_punctuation(text))
+            if not text.isascii():
+                tokens = matcher.split_words(tokens)
+            # 分词结果已经是小写、无标点的单词，直接交给关键词自动机，停用词在计分时跳过
+            hits = set() if details else None
+            scores = matcher.scores_words(tokens, split_cjk=False, ignore=stop_words, hits=hits)
+            category = matcher.top_category(scores, default_category)
+            if not details:
+                results.append((category, scores))
+                continue
+            # 单词指纹只用于按完整单词匹配时判断新增关键词，按子串匹配时不需要
+            word_filter = b''
+            if matcher.whole_word:
+                words = set(tokens)
+                words -= stop_words
+                word_filter = build_word_filter(words)
+            results.append((category, scores, sorted(hits), word_filter))
+        return results
+
+    def _classify_with_model(self, texts, details=False, rules=None):
+        """用统计模型分类，得分为预测分类的后验概率"""
+        results = []
+        for category, probability in self.model.predict(self._model_documents(texts, rules)):
+            scores = {category: round(probability, 4)}
+            results.append((category, scores, [], b'') if details else (category, scores))
+        return results
+
+    def _model_documents(self, texts, rules=None):
+        """把文本转换为统计模型的输入：小写、去掉标点后以空格分隔单词的 UTF-8 字节
+
+        中文按关键词匹配的方式切分；使用空白分词的纯ASCII文本空白本身就是单词边界，
+        直接编码，由模型在字节上切分单词，不再创建单词列表。停用词由模型忽略。
+        """
+        tokenize = self._get_tokenizer()
+        split_on_whitespace = tokenize is str.split
+        matcher = (rules or self.rules).keyword_matcher
+        documents = []
+        for text in texts:
+            text = _strip_punctuation(text.lower())
+            if text.isascii():
+                if split_on_whitespace:
+                    documents.append(text.encode('ascii'))
+                    continue
+                tokens = tokenize(text)
+            else:
+                tokens = matcher.split_words(tokenize(text))
+            documents.append(' '.join(tokens).encode('utf-8', 'surrogatepass'))
+        return documents
+
+    def close(self):
+        """停止规则监听，关闭分类进程池和分词词典"""
+        if self.rules_watcher:
+            self.rules_watcher.stop()
+            self.rules_watcher = None
+        if self.classify_pool:
+            self.classify_pool[1].shutdown(wait=False, cancel_futures=True)
+            self.classify_pool = None
+        self.rules.close()
+
     def _rule_based_classification(self, text):
-        """基于规则的分类"""
-        for category, keywords in self.category_keywords.items():
-            for keyword in keywords:
-                if keyword in text:
-                    return category
-        return self.default_category
-
-    def tag_email(self, email_data, category):
-        """为邮件添加标签"""
+        """基于规则的分类：取关键词得分最高的分类"""
+        return self.keyword_matcher.best_category(text, self.default_category)
+
+    def tag_email(self, email_data, category, rules_version=None):
+        """为邮件添加标签
+
+        Args:
+            email_data: 邮件字典
+            category: 分类
+            rules_version: 自动分类时为得出该分类的规则版本；用户手动指定分类时为 None，
+                之后规则更新也不会重新分类这封邮件
+        """
         email_data['category'] = category
+        if rules_version:
+            email_data['rules_version'] = rules_version
+        else:
+            email_data.pop('rules_version', None)
         return email_data
\ No newline at end of file
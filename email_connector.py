@@ -1,7 +1,67 @@
 import imaplib
 import email
-from email.header import decode_header
+import json
 import re
+import base64
+import quopri
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from sync_state import SyncStateStore
+from message_store import MessageStore
+from imap_pool import IMAPConnectionPool
+from imap_compress import TransferStats, enable_compression
+from imap_bodystructure import extract_bodystructure, parse_bodystructure, find_text_part
+from email_parser import parse_email, parse_email_batch, parse_headers
+from search_query import uid_search
+from charset_decoder import decode_text
+
+# FETCH响应解析用的正则
+_FETCH_START_RE = re.compile(rb'^\d+ \(')
+_UID_RE = re.compile(rb'\bUID (\d+)')
+# 作为数据项返回的字面量（邮件内容），其他字面量出现在 BODYSTRUCTURE 等括号表达式中
+_LITERAL_RE = re.compile(rb'(?:^|(?<=[ (]))(BODY\[[^\]]*\](?:<\d+>)?|RFC822(?:\.HEADER|\.TEXT)?) \{\d+\}$',
+                         re.IGNORECASE)
+_LITERAL_SIZE_RE = re.compile(rb'\{\d+\}$')
+_SIZE_RE = re.compile(rb'\bRFC822\.SIZE (\d+)')
+_FLAGS_RE = re.compile(rb'\bFLAGS \(([^)]*)\)')
+
+# 邮件列表只需要的数据项
+_HEADER_FETCH_ITEMS = '(UID FLAGS RFC822.SIZE BODY.PEEK[HEADER.FIELDS (FROM TO SUBJECT DATE)])'
+_TEXT_FETCH_ITEMS = '(UID FLAGS RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (FROM TO SUBJECT DATE)])'
+
+
+class LRUCache:
+    """线程安全的最近最少使用缓存"""
+
+    def __init__(self, max_size=50):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """获取缓存项，不存在时返回 None"""
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        """添加缓存项，超出容量时移除最久未使用的项"""
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.items.clear()
+
 
 class EmailConnector:
     def __init__(self, config=None):
@@ -15,193 +75,930 @@ class EmailConnector:
         self.imap_server = config.IMAP_SERVER
         self.imap_port = config.IMAP_PORT
         self.mail = None
+        self.fetch_batch_size = getattr(config, 'FETCH_BATCH_SIZE', 200)
+        self.stream_first_batch_size = getattr(config, 'STREAM_FIRST_BATCH_SIZE', 0)
+        self.fetch_mode = getattr(config, 'FETCH_MODE', 'full')
+        self.text_preview_bytes = getattr(config, 'TEXT_PREVIEW_BYTES', 0)
+        self.selected_folder = None
+        # 各文件夹最近一次SELECT得到的 UIDVALIDITY，本地邮件存储以此区分新旧邮件
+        self.folder_uidvalidity = {}
+        # 各文件夹最近一次SELECT得到的 HIGHESTMODSEQ（服务器支持 CONDSTORE 时）
+        self.folder_modseq = {}
+        # 同一个IMAP连接不能被多个线程同时使用
+        self.lock = threading.RLock()
+
+        # 最近打开的邮件正文缓存
+        self.body_cache = LRUCache(getattr(config, 'BODY_CACHE_SIZE', 50))
+
+        # 本地原始邮件存储，访问服务器前先查询
+        self.message_store = None
+        if getattr(config, 'MESSAGE_STORE_ENABLED', False):
+            self.message_store = MessageStore(
+                getattr(config, 'MESSAGE_STORE_DB', 'message_store.db'),
+                int(getattr(config, 'MESSAGE_STORE_MAX_MB', 500) * 1024 * 1024)
+            )
+
+        # 服务器支持时使用 COMPRESS=DEFLATE 压缩传输，所有连接共用一份字节统计
+        self.compress = getattr(config, 'IMAP_COMPRESS', False)
+        self.transfer_stats = TransferStats()
+
+        # 邮件解析进程池，PARSE_WORKERS 为 0 时在获取邮件的线程中解析
+        self.parse_workers = getattr(config, 'PARSE_WORKERS', 0)
+        self.parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers) if self.parse_workers > 0 else None
+
+        # 供后台任务并行使用的连接池
+        self.pool = IMAPConnectionPool(
+            self.open_connection,
+            max_size=getattr(config, 'IMAP_POOL_SIZE', 4),
+            idle_timeout=getattr(config, 'IMAP_POOL_IDLE_TIMEOUT', 300),
+            health_check_interval=getattr(config, 'IMAP_POOL_HEALTH_CHECK_INTERVAL', 60)
+        )
+
+        # 增量同步状态（与邮件数据库保存在一起）
+        self.incremental_sync = getattr(config, 'INCREMENTAL_SYNC', False)
+        self.sync_store = SyncStateStore(getattr(config, 'SYNC_STATE_DB', 'email_data.db'))
 
     def connect(self):
         """连接到邮箱服务器"""
         try:
-            # 创建IMAP4_SSL对象
-            self.mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+            self.mail = self.open_connection()
+            self.selected_folder = None
+
+            print("邮箱连接成功")
+            return True
+        except Exception as e:
+            print(f"邮箱连接失败: {e}")
+            return False
 
+    def open_connection(self, compress=None):
+        """创建一个新的已登录IMAP连接
+
+        供需要独立连接的组件（如IDLE监听）使用，调用者负责注销连接。
+
+        Args:
+            compress: 服务器支持时是否启用 COMPRESS=DEFLATE，None 时使用 IMAP_COMPRESS 配置；
+                      直接读取套接字的调用者（如IDLE监听）需要传入 False
+
+        Returns:
+            imaplib.IMAP4_SSL: 已登录的IMAP连接
+        """
+        if compress is None:
+            compress = self.compress
+        # 创建IMAP4_SSL对象
+        mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+
+        try:
             # 登录邮箱
-            self.mail.login(self.email_address, self.password)
+            mail.login(self.email_address, self.password)
 
             # 添加ID字段参数以满足网易邮箱的安全要求
             imaplib.Commands['ID'] = ('AUTH')
             args = ("name", "EmailAssistant", "contact", self.email_address, "version", "1.0.0", "vendor", "myclient")
-            self.mail._simple_command('ID', '("' + '" "'.join(args) + '")')
+            mail._simple_command('ID', '("' + '" "'.join(args) + '")')
 
-            print("邮箱连接成功")
-            return True
-        except Exception as e:
-            print(f"邮箱连接失败: {e}")
-            return False
+            # 登录后服务器可能公布更多能力（如 COMPRESS=DEFLATE、QRESYNC）
+            typ, data = mail.capability()
+            if typ == 'OK' and data and data[0]:
+                mail.capabilities = tuple(data[-1].decode().upper().split())
+
+            # 压缩在登录之后协商，之后的命令和响应都经过压缩
+            if compress:
+                enable_compression(mail, self.transfer_stats)
+
+            # 启用 QRESYNC 后标记同步可以直接返回被删除邮件的UID（VANISHED）
+            if 'QRESYNC' in mail.capabilities and 'ENABLE' in mail.capabilities:
+                try:
+                    mail.enable('QRESYNC')
+                except Exception as e:
+                    print(f"启用QRESYNC失败: {e}")
+        except Exception:
+            try:
+                mail.shutdown()
+            except Exception:
+                pass
+            raise
+
+        return mail
+
+    def get_transfer_stats(self):
+        """获取启用压缩的连接的传输统计
+
+        Returns:
+            dict: received_raw/received_wire 为解压后/网络上收到的字节数，
+                  sent_raw/sent_wire 为压缩前/网络上发送的字节数，receive_ratio 为接收压缩比
+        """
+        return self.transfer_stats.snapshot()
+
+    @contextmanager
+    def session(self):
+        """从连接池借出一个连接，返回绑定该连接的连接器副本
+
+        副本拥有独立的连接、锁和已选文件夹状态，与其他线程的副本可以并行工作；
+        同步状态和正文缓存与原连接器共享。
+
+        Example:
+            with email_connector.session() as connector:
+                emails = connector.fetch_emails('INBOX')
+        """
+        mail = self.pool.acquire()
+        worker = copy.copy(self)
+        worker.mail = mail
+        worker.selected_folder = None
+        worker.lock = threading.RLock()
+        try:
+            yield worker
+        except Exception:
+            # 出错后连接可能处于未知状态，不再放回连接池
+            if worker.mail is mail:
+                self.pool.discard(mail)
+            else:
+                self.pool.discard()
+                worker.close()
+            raise
+        else:
+            if worker.mail is mail:
+                self.pool.release(mail)
+            else:
+                # 副本在出错后重新连接过，原连接已注销
+                self.pool.discard()
+                worker.close()
+
+    def close_pool(self):
+        """关闭连接池中的所有连接和邮件解析进程池"""
+        self.pool.close()
+        if self.parse_executor:
+            self.parse_executor.shutdown(wait=False, cancel_futures=True)
+            self.parse_executor = None
 
     def fetch_emails(self, folder='INBOX', search_criteria='ALL'):
-        """获取邮件"""
+        """获取邮件
+
+        Args:
+            folder: 文件夹名称
+            search_criteria: IMAP搜索条件字符串或 SearchQuery，由服务器筛选后只下载匹配的邮件
+        """
+        with self.lock:
+            try:
+                uids = self._search_uids(folder, search_criteria)
+                if uids is None:
+                    return []
+
+                emails = self._fetch_messages(uids, folder)
+                print(f"成功获取 {len(emails)} 封邮件")
+                return emails
+
+            except Exception as e:
+                print(f"获取邮件时出错: {e}")
+                # 出现异常，重置连接状态
+                self.close()
+                return []
+
+    def iter_emails(self, folder='INBOX', search_criteria='ALL'):
+        """流式获取邮件
+
+        与 fetch_emails 相同的搜索和获取逻辑，但每收到一批邮件就逐封生成，
+        调用者不必等整个文件夹下载完成。迭代期间占用该连接。
+
+        Yields:
+            dict: 邮件字典
+        """
+        with self.lock:
+            uids = self._search_uids(folder, search_criteria)
+            if uids is None:
+                return
+
+            count = 0
+            for batch_emails in self._iter_message_batches(uids, folder):
+                count += len(batch_emails)
+                yield from batch_emails
+            print(f"成功获取 {count} 封邮件")
+
+    def sync_emails(self, folder='INBOX', full=False, on_batch=None, on_reset=None, known_uids=None):
+        """增量同步邮件
+
+        根据保存的 UIDVALIDITY 和最大 UID，只获取 UID 大于上次同步位置的新邮件。
+        文件夹的 UIDVALIDITY 发生变化或没有同步记录时执行全量同步。
+
+        Args:
+            folder: 文件夹名称
+            full: 是否强制全量同步
+            on_batch: 每获取完一批新邮件时调用的函数，参数为该批的邮件列表
+            on_reset: 开始全量同步前调用的函数，之前获取的邮件列表已失效，需要由本次同步的结果替换
+            known_uids: 调用者已有的邮件UID集合。邮件列表从本地存储恢复时可能缺少被淘汰的邮件，
+                传入后增量同步会搜索全部UID，同时获取其中缺少的、已同步过的邮件
+
+        Returns:
+            tuple: (邮件列表, 是否为全量同步)，失败时邮件列表为 None
+        """
+        with self.lock:
+            try:
+                known_validity, last_uid = self.sync_store.get_state(self.email_address, folder)
+                highest_modseq = self.sync_store.get_highest_modseq(self.email_address, folder)
+
+                # 先选择文件夹以获得当前的 UIDVALIDITY
+                if not self._select_folder(folder):
+                    return None, full
+                uidvalidity = self.folder_uidvalidity.get(folder)
+
+                if full or known_validity is None or uidvalidity is None or known_validity != uidvalidity:
+                    if known_validity is not None and uidvalidity != known_validity:
+                        print(f"文件夹 {folder} 的 UIDVALIDITY 已变化 ({known_validity} -> {uidvalidity})，执行全量同步")
+                        if self.message_store and uidvalidity is not None:
+                            self.message_store.purge_folder(self.email_address, folder, uidvalidity)
+                    full = True
+                    last_uid = 0
+                    if on_reset:
+                        on_reset()
+                    search_criteria = 'ALL'
+                    # 全量同步获取的是当前的标记，之后的标记同步从SELECT时的 HIGHESTMODSEQ 开始
+                    highest_modseq = self.folder_modseq.get(folder)
+                else:
+                    search_criteria = 'ALL' if known_uids is not None else f'UID {last_uid + 1}:*'
+
+                uids = self._search_uids(folder, search_criteria, selected=True)
+                if uids is None:
+                    return None, full
+
+                # "n:*" 在没有新邮件时仍会返回最后一封邮件，需要过滤
+                if known_uids is not None and not full:
+                    uids = [uid for uid in uids if int(uid) > last_uid or uid.decode() not in known_uids]
+                else:
+                    uids = [uid for uid in uids if int(uid) > last_uid]
+
+                emails = self._fetch_messages(uids, folder, on_batch)
+
+                # 只推进到连续获取成功的最大 UID，失败的邮件下次同步时重试
+                fetched = set(email_data['id'] for email_data in emails)
+                new_last_uid = last_uid
+                for uid in sorted(uids, key=int):
+                    if int(uid) <= last_uid:
+                        continue
+                    if uid.decode() not in fetched:
+                        break
+                    new_last_uid = int(uid)
+
+                if uidvalidity is not None:
+                    self.sync_store.save_state(self.email_address, folder, uidvalidity, new_last_uid, highest_modseq)
+
+                print(f"{'全量' if full else '增量'}同步完成，获取 {len(emails)} 封邮件")
+                return emails, full
+
+            except Exception as e:
+                print(f"同步邮件时出错: {e}")
+                self.close()
+                return None, full
+
+    def _select_folder(self, folder):
+        """选择邮件文件夹，失败时重新连接后再试一次"""
         # 检查邮箱连接是否存在
         if not self.mail:
             print("邮箱未连接，尝试重新连接")
             if not self.connect():
                 print("重新连接失败")
-                return []
-            
+                return False
+
+        # 尝试选择邮件文件夹
         try:
-            # 尝试选择邮件文件夹
+            status, messages = self.mail.select(folder)
+            if status != "OK":
+                raise Exception(f"选择邮件文件夹失败: {messages}")
+        except Exception as e:
+            # SELECT命令失败，尝试重新连接并再次选择
+            print(f"选择文件夹时出错: {e}，尝试重新连接...")
+            self.close()  # 关闭旧连接
+            if not self.connect():  # 重新连接
+                return False
+
+            # 重新选择文件夹
+            status, messages = self.mail.select(folder)
+            if status != "OK":
+                print(f"重新选择邮件文件夹失败: {messages}")
+                return False
+
+        self.selected_folder = folder
+        self.folder_uidvalidity[folder] = self._get_uidvalidity()
+        self.folder_modseq[folder] = self._get_highest_modseq()
+        return True
+
+    def _get_uidvalidity(self):
+        """读取最近一次SELECT返回的UIDVALIDITY"""
+        typ, data = self.mail.response('UIDVALIDITY')
+        if data and data[0]:
             try:
-                status, messages = self.mail.select(folder)
-                if status != "OK":
-                    raise Exception(f"选择邮件文件夹失败: {messages}")
-            except Exception as e:
-                # SELECT命令失败，尝试重新连接并再次选择
-                print(f"选择文件夹时出错: {e}，尝试重新连接...")
-                self.close()  # 关闭旧连接
-                if not self.connect():  # 重新连接
-                    return []
-                
-                # 重新选择文件夹
-                status, messages = self.mail.select(folder)
-                if status != "OK":
-                    print(f"重新选择邮件文件夹失败: {messages}")
-                    return []
+                return int(data[0])
+            except (TypeError, ValueError):
+                return None
+        return None
 
-            # 搜索邮件
+    def _get_highest_modseq(self):
+        """读取最近一次SELECT返回的HIGHESTMODSEQ，服务器不支持 CONDSTORE 时返回 None"""
+        typ, data = self.mail.response('HIGHESTMODSEQ')
+        if data and data[0]:
             try:
-                status, email_ids = self.mail.search(None, search_criteria)
-                if status != "OK":
-                    raise Exception(f"搜索邮件失败: {email_ids}")
+                return int(data[0])
+            except (TypeError, ValueError):
+                return None
+        return None
+
+    def resync_flags(self, folder='INBOX', known_uids=None):
+        """通过 CONDSTORE/QRESYNC 同步其他客户端对标记的修改
+
+        只获取 MODSEQ 大于上次记录的邮件标记；启用了 QRESYNC 时服务器同时返回
+        被删除邮件的UID（VANISHED），否则用 known_uids 与服务器现有UID对比得出。
+        只处理已同步过的邮件（UID 不超过上次同步的最大 UID），新邮件由 sync_emails 获取。
+
+        Args:
+            folder: 文件夹名称
+            known_uids: 本地已有的邮件UID，仅在服务器不支持 QRESYNC 时用于判断删除
+
+        Returns:
+            dict: {'changed': {UID: 标记列表}, 'vanished': [UID]}；服务器不支持 CONDSTORE、
+                  没有同步记录或 UIDVALIDITY 已变化（需要全量同步）时返回 None
+        """
+        with self.lock:
+            try:
+                known_validity, last_uid = self.sync_store.get_state(self.email_address, folder)
+                since_modseq = self.sync_store.get_highest_modseq(self.email_address, folder)
+                if known_validity is None or not since_modseq or not last_uid:
+                    return None
+
+                # 丢弃之前残留的 VANISHED 响应
+                if self.mail:
+                    self.mail.response('VANISHED')
+                if not self._select_folder(folder):
+                    return None
+                if self.folder_uidvalidity.get(folder) != known_validity:
+                    return None
+                current_modseq = self.folder_modseq.get(folder)
+                if current_modseq is None:
+                    return None
+
+                result = {'changed': {}, 'vanished': []}
+                if current_modseq > since_modseq:
+                    qresync = 'QRESYNC' in self.mail.capabilities
+                    modifier = f"(CHANGEDSINCE {since_modseq}{' VANISHED' if qresync else ''})"
+                    status, msg_data = self.mail.uid('FETCH', f'1:{last_uid}', f'(UID FLAGS) {modifier}')
+                    if status != "OK":
+                        raise Exception(f"FETCH命令失败: {msg_data}")
+
+                    for uid, response in self._parse_fetch_response(msg_data).items():
+                        flags_match = _FLAGS_RE.search(response['meta'])
+                        if flags_match and int(uid) <= last_uid:
+                            result['changed'][uid] = flags_match.group(1).decode().split()
+
+                    if qresync:
+                        typ, vanished = self.mail.response('VANISHED')
+                        for data in vanished or []:
+                            if data:
+                                data = data.decode() if isinstance(data, bytes) else str(data)
+                                uid_set = data.split()[-1]
+                                result['vanished'].extend(
+                                    uid for uid in self._expand_uid_set(uid_set) if int(uid) <= last_uid)
+
+                if known_uids is not None and 'QRESYNC' not in self.mail.capabilities:
+                    status, data = self.mail.uid('SEARCH', None, f'UID 1:{last_uid}')
+                    if status != "OK":
+                        raise Exception(f"搜索邮件失败: {data}")
+                    current = set(data[0].decode().split()) if data and data[0] else set()
+                    result['vanished'] = [uid for uid in map(str, known_uids)
+                                          if int(uid) <= last_uid and uid not in current]
+
+                self.sync_store.save_highest_modseq(self.email_address, folder, current_modseq)
+                print(f"{folder} 标记同步完成: {len(result['changed'])} 封邮件标记变化，"
+                      f"{len(result['vanished'])} 封邮件已删除")
+                return result
+
             except Exception as e:
-                # SEARCH命令失败，尝试重新连接
-                print(f"搜索邮件时出错: {e}，尝试重新连接...")
+                print(f"同步邮件标记时出错: {e}")
                 self.close()
-                if not self.connect():
-                    return []
-                
-                # 重新选择文件夹和搜索
-                status, messages = self.mail.select(folder)
-                if status != "OK":
-                    return []
-                    
-                status, email_ids = self.mail.search(None, search_criteria)
-                if status != "OK":
-                    print(f"重新搜索邮件失败: {email_ids}")
-                    return []
+                return None
+
+    def _expand_uid_set(self, uid_set):
+        """把 "3,5:7" 形式的UID集合展开为UID字符串列表"""
+        uids = []
+        for part in uid_set.split(','):
+            if ':' in part:
+                start, end = sorted(int(x) for x in part.split(':'))
+                uids.extend(str(uid) for uid in range(start, end + 1))
+            elif part.isdigit():
+                uids.append(part)
+        return uids
+
+    def _search_uids(self, folder, search_criteria, selected=False):
+        """在文件夹中按条件搜索邮件UID
 
-            emails = []
-            for mail_id in email_ids[0].split():
+        Args:
+            folder: 文件夹名称
+            search_criteria: IMAP搜索条件字符串或 SearchQuery
+            selected: 文件夹是否已经选中
+
+        Returns:
+            list: UID列表（bytes），失败时返回 None
+        """
+        if not selected and not self._select_folder(folder):
+            return None
+
+        # 搜索邮件
+        try:
+            status, email_ids = uid_search(self.mail, search_criteria)
+            if status != "OK":
+                raise Exception(f"搜索邮件失败: {email_ids}")
+        except Exception as e:
+            # SEARCH命令失败，尝试重新连接
+            print(f"搜索邮件时出错: {e}，尝试重新连接...")
+            self.close()
+            if not self.connect():
+                return None
+
+            # 重新选择文件夹和搜索
+            status, messages = self.mail.select(folder)
+            if status != "OK":
+                return None
+
+            status, email_ids = uid_search(self.mail, search_criteria)
+            if status != "OK":
+                print(f"重新搜索邮件失败: {email_ids}")
+                return None
+
+        return email_ids[0].split() if email_ids and email_ids[0] else []
+
+    def _fetch_messages(self, uids, folder, on_batch=None):
+        """按UID分批获取并解析邮件
+
+        Args:
+            uids: UID列表
+            folder: 文件夹名称
+            on_batch: 每获取完一批时调用的函数，参数为该批的邮件列表
+        """
+        emails = []
+        for batch_emails in self._iter_message_batches(uids, folder):
+            emails.extend(batch_emails)
+            if on_batch and batch_emails:
+                on_batch(batch_emails)
+        return emails
+
+    def _iter_message_batches(self, uids, folder):
+        """按批获取邮件，每获取一批就生成该批解析后的邮件列表
+
+        每个FETCH命令请求一批UID（数量由 FETCH_BATCH_SIZE 配置），
+        避免逐封获取时每封邮件都要等待一次网络往返；第一批使用
+        STREAM_FIRST_BATCH_SIZE，使界面能尽快显示第一批邮件。
+        """
+        batch_size = max(1, self.fetch_batch_size)
+        size = min(batch_size, self.stream_first_batch_size) if self.stream_first_batch_size else batch_size
+
+        # 启用解析进程池时，上一批在子进程中解析的同时获取下一批
+        pending = None
+        start = 0
+        while start < len(uids):
+            batch = uids[start:start + size]
+            start += size
+            size = batch_size
+            batch_uids = [uid.decode() if isinstance(uid, bytes) else str(uid) for uid in batch]
+
+            # 本地已保存的邮件直接解析，只向服务器请求其余的邮件
+            raw_messages = self._load_stored_messages(folder, batch)
+            missing = [uid for uid in batch_uids if uid not in raw_messages]
+
+            header_emails = {}
+            if missing and self.fetch_mode in ('headers', 'text'):
+                # 本地保存的列表数据（头部和文本预览）同样不需要再向服务器请求
+                header_emails = self._load_stored_headers(folder, missing)
+                missing = [uid for uid in missing if uid not in header_emails]
+                if missing:
+                    fetched = self._fetch_header_batch(missing, folder, with_text=self.fetch_mode == 'text')
+                    self._store_headers(folder, fetched)
+                    header_emails.update((email_dict['id'], email_dict) for email_dict in fetched)
+            elif missing:
                 try:
-                    status, msg_data = self.mail.fetch(mail_id, '(RFC822)')
-                    if status != "OK":
-                        print(f"获取邮件 {mail_id} 失败")
-                        continue
+                    fetched = self._fetch_raw_batch(missing)
+                    self._store_messages(folder, fetched)
+                    raw_messages.update(fetched)
+                except Exception as e:
+                    print(f"批量获取邮件 {missing[0]}-{missing[-1]} 时出错: {e}")
+
+            parsing = self._submit_parse(raw_messages, folder)
+            if not self.parse_executor:
+                yield self._collect_batch(folder, batch_uids, header_emails, parsing)
+                continue
+
+            if pending is not None:
+                yield self._collect_batch(folder, *pending)
+            pending = (batch_uids, header_emails, parsing)
+
+        if pending is not None:
+            yield self._collect_batch(folder, *pending)
+
+    def _submit_parse(self, raw_messages, folder):
+        """解析一批原始邮件
+
+        启用解析进程池时按进程数拆分后提交到子进程，否则在当前线程中解析。
+
+        Returns:
+            list: [(Future, 该部分的原始邮件列表)]
+        """
+        items = list(raw_messages.items())
+        if not items:
+            return []
 
-                    raw_email = msg_data[0][1]
-                    email_message = email.message_from_bytes(raw_email)
-
-                    # 解析邮件头部信息
-                    subject, encoding = decode_header(email_message["Subject"])[0]
-                    if isinstance(subject, bytes):
-                        subject = subject.decode(encoding or 'utf-8')
-
-                    # 解析发件人信息
-                    from_ = email_message["From"]
-                    if from_:
-                        from_parts = decode_header(from_)
-                        decoded_from = []
-                        for part, enc in from_parts:
-                            if isinstance(part, bytes):
-                                part = part.decode(enc or 'utf-8')
-                            decoded_from.append(part)
-                        from_ = ''.join(decoded_from)
-                        # 提取邮箱地址
-                        match = re.search(r'<([^>]+)>', from_)
-                        if match:
-                            from_ = match.group(1)
-                    else:
-                        from_ = "unknown@example.com"  # 如果无法获取发件人信息，使用默认值
-
-                    # 提取邮件正文
-                    body = ""
-                    if email_message.is_multipart():
-                        for part in email_message.walk():
-                            content_type = part.get_content_type()
-                            content_disposition = str(part.get("Content-Disposition"))
-                            charset = part.get_content_charset()
-                            try:
-                                payload = part.get_payload(decode=True)
-                                if payload:
-                                    if charset:
-                                        body = payload.decode(charset)
-                                    else:
-                                        # 尝试多种编码
-                                        encodings = ['utf-8', 'gbk', 'gb2312', 'big5']
-                                        for encoding in encodings:
-                                            try:
-                                                body = payload.decode(encoding)
-                                                break
-                                            except UnicodeDecodeError:
-                                                continue
-                            except:
-                                pass
-                            if content_type == "text/plain" and "attachment" not in content_disposition:
-                                break
-                    else:
-                        payload = email_message.get_payload(decode=True)
-                        charset = email_message.get_content_charset()
-                        if payload:
-                            if charset:
-                                body = payload.decode(charset)
-                            else:
-                                # 尝试多种编码
-                                encodings = ['utf-8', 'gbk', 'gb2312', 'big5']
-                                for encoding in encodings:
-                                    try:
-                                        body = payload.decode(encoding)
-                                        break
-                                    except UnicodeDecodeError:
-                                        continue
-
-                    # 创建邮件字典
-                    email_dict = {
-                        'id': mail_id.decode(),
-                        'from': from_,
-                        'to': email_message["To"],
-                        'subject': subject,
-                        'date': email_message["Date"],
-                        'body': body,
-                        'attachments': self._extract_attachments(email_message)
-                    }
-
-                    emails.append(email_dict)
-                
+        if self.parse_executor:
+            chunk_size = -(-len(items) // self.parse_workers)
+            parsing = []
+            for i in range(0, len(items), chunk_size):
+                chunk = items[i:i + chunk_size]
+                try:
+                    parsing.append((self.parse_executor.submit(parse_email_batch, chunk, folder), chunk))
                 except Exception as e:
-                    print(f"处理邮件 {mail_id} 时出错: {e}")
-                    continue
-                
-            print(f"成功获取 {len(emails)} 封邮件")
-            return emails
+                    print(f"提交邮件解析任务失败: {e}，改为在当前线程中解析")
+                    parsing.append((self._completed_future(parse_email_batch(chunk, folder)), chunk))
+            return parsing
+
+        return [(self._completed_future(parse_email_batch(items, folder)), items)]
+
+    def _completed_future(self, result):
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def _collect_batch(self, folder, batch_uids, header_emails, parsing):
+        """等待一批邮件解析完成，按UID顺序返回邮件列表"""
+        parsed = {}
+        failed = set()
+        for future, chunk in parsing:
+            try:
+                results = future.result()
+            except Exception as e:
+                # 子进程异常退出时在当前线程中重新解析
+                print(f"解析进程出错: {e}，改为在当前线程中解析")
+                results = parse_email_batch(chunk, folder)
+            for uid, email_dict, error in results:
+                if error:
+                    print(f"处理邮件 {uid} 时出错: {error}")
+                    failed.add(uid)
+                else:
+                    parsed[uid] = email_dict
+
+        batch_emails = []
+        for uid in batch_uids:
+            email_dict = header_emails.get(uid) or parsed.get(uid)
+            if email_dict is None:
+                if uid not in failed:
+                    print(f"获取邮件 {uid} 失败")
+                continue
+            batch_emails.append(email_dict)
+        return batch_emails
+
+    def _fetch_header_batch(self, uids, folder, with_text=False):
+        """只获取一批邮件的列表所需头部和大小，正文在打开邮件时再加载
 
+        Args:
+            uids: UID列表
+            folder: 文件夹名称
+            with_text: 是否同时获取 BODYSTRUCTURE 并只下载其中的文本部分（用于分类）
+        """
+        message_set = ','.join(uid.decode() if isinstance(uid, bytes) else str(uid) for uid in uids)
+        items = _TEXT_FETCH_ITEMS if with_text else _HEADER_FETCH_ITEMS
+        try:
+            status, msg_data = self.mail.uid('FETCH', message_set, items)
+            if status != "OK":
+                raise Exception(f"FETCH命令失败: {msg_data}")
         except Exception as e:
-            print(f"获取邮件时出错: {e}")
-            # 出现异常，重置连接状态
-            self.close()
+            print(f"批量获取邮件头部 {message_set} 时出错: {e}")
             return []
 
-    def _extract_attachments(self, email_message):
-        """提取邮件附件"""
-        attachments = []
-        for part in email_message.walk():
-            if part.get_content_maintype() == 'multipart':
+        responses = self._parse_fetch_response(msg_data)
+        emails = []
+        text_parts = {}
+        for mail_id in uids:
+            uid = mail_id.decode() if isinstance(mail_id, bytes) else str(mail_id)
+            response = responses.get(uid)
+            if response is None:
+                print(f"获取邮件 {uid} 头部失败")
+                continue
+            try:
+                header_bytes = b''
+                for name, data in response['literals'].items():
+                    if name.startswith('BODY[HEADER'):
+                        header_bytes = data
+                email_dict = parse_headers(uid, email.message_from_bytes(header_bytes))
+                size_match = _SIZE_RE.search(response['meta'])
+                flags_match = _FLAGS_RE.search(response['meta'])
+                email_dict.update({
+                    'body': '',
+                    'attachments': [],
+                    'size': int(size_match.group(1)) if size_match else 0,
+                    'body_loaded': False,
+                    'folder': folder,
+                })
+                if flags_match:
+                    email_dict['flags'] = flags_match.group(1).decode().split()
+                emails.append(email_dict)
+
+                if with_text:
+                    structure = extract_bodystructure(response['meta'])
+                    if structure:
+                        text_part = find_text_part(parse_bodystructure(structure))
+                        if text_part:
+                            text_parts[uid] = text_part
+            except Exception as e:
+                print(f"处理邮件 {uid} 头部时出错: {e}")
+                continue
+
+        if text_parts:
+            self._fill_text_parts(emails, text_parts)
+
+        return emails
+
+    def _fill_text_parts(self, emails, text_parts):
+        """按 BODYSTRUCTURE 中找到的段落号只下载文本部分，填入邮件正文
+
+        相同段落号的邮件合并为一个FETCH命令；设置了 TEXT_PREVIEW_BYTES 时
+        使用 <0.N> 部分获取，只下载正文的前 N 个字节。
+        """
+        by_section = {}
+        for uid, text_part in text_parts.items():
+            by_section.setdefault(text_part['section'], []).append(uid)
+
+        texts = {}
+        for section, section_uids in by_section.items():
+            partial = f"<0.{self.text_preview_bytes}>" if self.text_preview_bytes else ""
+            try:
+                status, msg_data = self.mail.uid('FETCH', ','.join(section_uids),
+                                                 f'(UID BODY.PEEK[{section}]{partial})')
+                if status != "OK":
+                    raise Exception(f"FETCH命令失败: {msg_data}")
+            except Exception as e:
+                print(f"获取邮件正文段落 {section} 时出错: {e}")
+                continue
+
+            for uid, response in self._parse_fetch_response(msg_data).items():
+                for name, data in response['literals'].items():
+                    if name.startswith('BODY['):
+                        texts[uid] = data
+
+        for email_dict in emails:
+            uid = email_dict['id']
+            if uid not in texts:
                 continue
-            if part.get('Content-Disposition') is None:
+            text_part = text_parts[uid]
+            truncated = bool(self.text_preview_bytes) and text_part['size'] > self.text_preview_bytes
+            try:
+                email_dict['body'] = self._decode_text_part(texts[uid], text_part, truncated, email_dict.get('from'))
+                email_dict['body_truncated'] = truncated
+            except Exception as e:
+                print(f"解码邮件 {uid} 正文时出错: {e}")
+
+    def _decode_text_part(self, data, text_part, truncated=False, sender=None):
+        """对单独下载的文本段落做传输编码和字符集解码"""
+        encoding = text_part['encoding']
+        if encoding == 'base64':
+            data = re.sub(rb'\s+', b'', data)
+            # 截断的 base64 只保留完整的4字节分组
+            data = base64.b64decode(data[:len(data) - len(data) % 4])
+        elif encoding == 'quoted-printable':
+            data = quopri.decodestring(data)
+
+        # 截断可能切断多字节字符，解码时替换掉不完整的字符
+        text = decode_text(data, text_part['charset'], sender, 'replace' if truncated else 'strict')
+
+        if text_part['subtype'] == 'html':
+            text = re.sub(r'<[^>]+>', ' ', text)
+        return text
+
+    def fetch_uids(self, folder, uids):
+        """获取指定UID的邮件（用于IDLE监听到的新邮件）
+
+        Args:
+            folder: 文件夹名称
+            uids: UID列表
+
+        Returns:
+            list: 邮件列表
+        """
+        uids = [uid if isinstance(uid, bytes) else str(uid).encode() for uid in uids]
+        with self.lock:
+            try:
+                if not self._select_folder(folder):
+                    return []
+                return self._fetch_messages(uids, folder)
+            except Exception as e:
+                print(f"获取新邮件时出错: {e}")
+                self.close()
+                return []
+
+    def advance_sync_state(self, folder, uids, emails):
+        """获取IDLE通知的新邮件后推进文件夹的同步位置，下次增量同步不再重复获取这些邮件
+
+        与 sync_emails() 一样只推进到连续获取成功的最大 UID，并且只在保存的 UIDVALIDITY
+        与本次获取时文件夹的 UIDVALIDITY 相同时更新。
+
+        Args:
+            folder: 文件夹名称
+            uids: 请求获取的UID列表
+            emails: fetch_uids() 返回的邮件列表
+        """
+        uidvalidity = self.folder_uidvalidity.get(folder)
+        if uidvalidity is None:
+            return
+        fetched = set(email_data['id'] for email_data in emails)
+        new_last_uid = 0
+        for uid in sorted((int(uid) for uid in uids)):
+            if str(uid) not in fetched:
+                break
+            new_last_uid = uid
+        if not new_last_uid:
+            return
+        try:
+            self.sync_store.advance_last_uid(self.email_address, folder, uidvalidity, new_last_uid)
+        except Exception as e:
+            print(f"更新同步状态时出错: {e}")
+
+    def load_email_body(self, email_data):
+        """按需加载邮件正文和附件
+
+        用于只获取了头部的邮件，结果保存在最近打开邮件的LRU缓存中。
+
+        Args:
+            email_data: 邮件字典（会被原地更新）
+
+        Returns:
+            dict: 补全正文和附件后的邮件字典
+        """
+        if email_data.get('body_loaded', True):
+            return email_data
+
+        folder = email_data.get('folder', 'INBOX')
+        uid = email_data.get('id', '')
+        cache_key = (folder, uid)
+
+        loaded = self.body_cache.get(cache_key)
+        if loaded is None:
+            raw_messages = self._load_stored_messages(folder, [uid])
+            if uid not in raw_messages:
+                with self.session() as connector:
+                    if not connector._select_folder(folder):
+                        raise Exception(f"选择邮件文件夹 {folder} 失败")
+                    raw_messages = connector._fetch_raw_batch([uid])
+                    connector._store_messages(folder, raw_messages)
+            if uid not in raw_messages:
+                raise Exception(f"获取邮件 {uid} 内容失败")
+            full_email = parse_email(uid, raw_messages[uid])
+            loaded = {'body': full_email['body'], 'attachments': full_email['attachments']}
+            self.body_cache.put(cache_key, loaded)
+
+        email_data.update(loaded)
+        email_data['body_loaded'] = True
+        return email_data
+
+    def _load_stored_messages(self, folder, uids, kind='rfc822', uidvalidity=None):
+        """从本地邮件存储读取原始邮件
+
+        Args:
+            kind: 数据类型，见 MessageStore.get_many()
+            uidvalidity: 使用的 UIDVALIDITY，默认为最近一次SELECT得到的值
+
+        Returns:
+            dict: {UID字符串: 原始字节}，未启用存储或不知道文件夹的 UIDVALIDITY 时为空
+        """
+        if uidvalidity is None:
+            uidvalidity = self.folder_uidvalidity.get(folder)
+        if not self.message_store or uidvalidity is None:
+            return {}
+        try:
+            return self.message_store.get_many(self.email_address, folder, uidvalidity, uids, kind)
+        except Exception as e:
+            print(f"读取本地邮件存储时出错: {e}")
+            return {}
+
+    def _store_messages(self, folder, raw_messages, kind='rfc822'):
+        """把从服务器下载的原始邮件保存到本地邮件存储"""
+        uidvalidity = self.folder_uidvalidity.get(folder)
+        if not self.message_store or uidvalidity is None or not raw_messages:
+            return
+        try:
+            self.message_store.put_many(self.email_address, folder, uidvalidity, raw_messages, kind)
+        except Exception as e:
+            print(f"保存邮件到本地存储时出错: {e}")
+
+    def _load_stored_headers(self, folder, uids, uidvalidity=None):
+        """读取本地保存的列表数据（FETCH_MODE 为 headers/text 时获取的头部和文本预览）
+
+        Returns:
+            dict: {UID字符串: 邮件字典}
+        """
+        emails = {}
+        for uid, data in self._load_stored_messages(folder, uids, self.fetch_mode, uidvalidity).items():
+            try:
+                emails[uid] = json.loads(data)
+            except ValueError as e:
+                print(f"本地邮件 {folder}/{uid} 的列表数据已损坏: {e}")
+        return emails
+
+    def load_stored_emails(self, folder):
+        """从本地邮件存储恢复上次同步到的邮件列表，不访问服务器
+
+        启动后的第一次刷新用它代替全量同步，之后的 sync_emails() 只需获取新邮件。
+        读取时使用保存的 UIDVALIDITY，服务器上已经变化时 sync_emails() 会执行全量同步。
+
+        Returns:
+            list: 按UID排序的邮件列表；未启用存储、没有同步记录或存储中没有该文件夹的邮件时返回 None
+        """
+        if not self.message_store:
+            return None
+        try:
+            uidvalidity, last_uid = self.sync_store.get_state(self.email_address, folder)
+            if uidvalidity is None or not last_uid:
+                return None
+            list_mode = self.fetch_mode in ('headers', 'text')
+            kinds = ['rfc822', self.fetch_mode] if list_mode else ['rfc822']
+            uids = [str(uid) for uid in
+                    self.message_store.get_uids(self.email_address, folder, uidvalidity, kinds, last_uid)]
+            if not uids:
+                return None
+
+            raw_messages = self._load_stored_messages(folder, uids, uidvalidity=uidvalidity)
+            header_emails = {}
+            if list_mode:
+                header_emails = self._load_stored_headers(
+                    folder, [uid for uid in uids if uid not in raw_messages], uidvalidity)
+            return self._collect_batch(folder, uids, header_emails, self._submit_parse(raw_messages, folder))
+        except Exception as e:
+            print(f"从本地存储读取邮件列表时出错: {e}")
+            return None
+
+    def _store_headers(self, folder, emails):
+        """把列表数据保存为不完整的记录，类型为当前的 FETCH_MODE，打开邮件下载原始邮件后被替换"""
+        self._store_messages(folder, {
+            email_dict['id']: json.dumps(email_dict, default=str).encode('ascii') for email_dict in emails
+        }, self.fetch_mode)
+
+    def _fetch_raw_batch(self, uids, items='(UID RFC822)', literal='RFC822'):
+        """用一个UID FETCH命令获取一批邮件的原始数据
+
+        Returns:
+            dict: {UID字符串: 原始字节}
+        """
+        message_set = b','.join(uid if isinstance(uid, bytes) else str(uid).encode() for uid in uids)
+        status, msg_data = self.mail.uid('FETCH', message_set.decode(), items)
+        if status != "OK":
+            raise Exception(f"FETCH命令失败: {msg_data}")
+
+        raw_messages = {}
+        for uid, response in self._parse_fetch_response(msg_data).items():
+            if literal in response['literals']:
+                raw_messages[uid] = response['literals'][literal]
+        return raw_messages
+
+    def _parse_fetch_response(self, msg_data):
+        """解析包含多封邮件的FETCH响应
+
+        imaplib 把每个字面量（literal）拆成 (前缀, 数据) 元组，
+        其余部分为普通字节串，这里把它们重新按邮件分组。
+        BODYSTRUCTURE 中的字面量（如非ASCII或含引号的文件名）改写为带引号的字符串放回原处，
+        使 'meta' 中的括号表达式保持完整。
+
+        Returns:
+            dict: {UID字符串: {'meta': 非字面量部分, 'literals': {数据项名称: 字节}}}
+        """
+        responses = {}
+        current = None
+
+        def finish(response):
+            if response is None:
+                return
+            match = _UID_RE.search(response['meta'])
+            if match:
+                responses[match.group(1).decode()] = response
+
+        for item in msg_data:
+            if isinstance(item, tuple):
+                prefix, data = item
+            else:
+                prefix, data = item, None
+            if not prefix:
+                continue
+
+            # "<序号> (" 开头表示新邮件的响应
+            if _FETCH_START_RE.match(prefix):
+                finish(current)
+                current = {'meta': b'', 'literals': {}}
+            if current is None:
                 continue
 
-            filename = part.get_filename()
-            if filename:
-                attachment_data = part.get_payload(decode=True)
-                attachments.append({'filename': filename, 'data': attachment_data})
+            if data is not None:
+                match = _LITERAL_RE.search(prefix)
+                if match:
+                    current['literals'][match.group(1).decode().upper()] = data
+                    prefix = prefix[:match.start()]
+                else:
+                    size = _LITERAL_SIZE_RE.search(prefix)
+                    if size:
+                        quoted = data.replace(b'\\', b'\\\\').replace(b'"', b'\\"')
+                        prefix = prefix[:size.start()] + b'"' + quoted + b'"'
+            current['meta'] += prefix + b' '
 
-        print(f"提取到 {len(attachments)} 个附件")
-        return attachments
+        finish(current)
+        return responses
 
     def close(self):
         """关闭邮箱连接"""
@@ -213,4 +1010,5 @@ class EmailConnector:
             except Exception as e:
                 print(f"关闭邮箱连接时出错: {e}")
             finally:
-                self.mail = None
\ No newline at end of file
+                self.mail = None
+                self.selected_folder = None
\ No newline at end of file
@@ -0,0 +1,122 @@
+import email
+from email.header import decode_header
+import re
+from charset_decoder import decode_text
+
+# 本模块只依赖标准库和 charset_decoder，可以在解析进程池的子进程中导入
+
+
+def parse_email(mail_id, raw_email):
+    """解析原始邮件数据
+
+    Args:
+        mail_id: 邮件UID
+        raw_email: RFC822原始字节
+
+    Returns:
+        dict: 邮件字典
+    """
+    email_message = email.message_from_bytes(raw_email)
+
+    # 创建邮件字典
+    email_dict = parse_headers(mail_id, email_message)
+    email_dict['body'] = extract_body(email_message, email_dict['from'])
+    email_dict['attachments'] = extract_attachments(email_message)
+    email_dict['size'] = len(raw_email)
+    email_dict['body_loaded'] = True
+
+    return email_dict
+
+
+def parse_email_batch(raw_messages, folder):
+    """解析一批原始邮件，供解析进程池调用
+
+    Args:
+        raw_messages: [(UID字符串, 原始字节)] 列表
+        folder: 文件夹名称
+
+    Returns:
+        list: [(UID字符串, 邮件字典, 错误信息)]，解析失败时邮件字典为 None
+    """
+    results = []
+    for uid, raw_email in raw_messages:
+        try:
+            email_dict = parse_email(uid, raw_email)
+            email_dict['folder'] = folder
+            results.append((uid, email_dict, None))
+        except Exception as e:
+            results.append((uid, None, str(e)))
+    return results
+
+
+def parse_headers(mail_id, email_message):
+    """解析邮件头部，返回不含正文的邮件字典"""
+    # 解析邮件头部信息
+    subject, encoding = decode_header(email_message["Subject"])[0]
+    if isinstance(subject, bytes):
+        subject = decode_text(subject, encoding)
+
+    # 解析发件人信息
+    from_ = email_message["From"]
+    if from_:
+        from_parts = decode_header(from_)
+        decoded_from = []
+        for part, enc in from_parts:
+            if isinstance(part, bytes):
+                part = decode_text(part, enc)
+            decoded_from.append(part)
+        from_ = ''.join(decoded_from)
+        # 提取邮箱地址
+        match = re.search(r'<([^>]+)>', from_)
+        if match:
+            from_ = match.group(1)
+    else:
+        from_ = "unknown@example.com"  # 如果无法获取发件人信息，使用默认值
+
+    return {
+        'id': mail_id.decode() if isinstance(mail_id, bytes) else str(mail_id),
+        'from': from_,
+        'to': email_message["To"],
+        'subject': subject,
+        'date': email_message["Date"],
+    }
+
+
+def extract_body(email_message, sender=None):
+    """提取邮件正文
+
+    多部分邮件优先使用第一个非附件的 text/plain 部分，没有时使用最后一个文本部分。
+    """
+    body = ""
+    for part in email_message.walk():
+        if part.get_content_maintype() != 'text':
+            continue
+        content_disposition = str(part.get("Content-Disposition"))
+        try:
+            payload = part.get_payload(decode=True)
+            if payload:
+                body = decode_text(payload, part.get_content_charset(), sender)
+        except Exception:
+            pass
+        if part.get_content_type() == "text/plain" and "attachment" not in content_disposition:
+            break
+
+    return body
+
+
+def extract_attachments(email_message):
+    """提取邮件附件"""
+    attachments = []
+    for part in email_message.walk():
+        if part.get_content_maintype() == 'multipart':
+            continue
+        if part.get('Content-Disposition') is None:
+            continue
+
+        filename = part.get_filename()
+        if filename:
+            attachment_data = part.get_payload(decode=True)
+            attachments.append({'filename': filename, 'data': attachment_data})
+
+    print(f"提取到 {len(attachments)} 个附件")
+    return attachments
@@ -1,7 +1,16 @@
+import io
 import smtplib
+from email.generator import BytesGenerator
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
+from email.utils import getaddresses
+from smtp_pool import SMTPConnectionPool
+from outbox import Outbox, OutboxSender, get_rate_limiter
+from mime_stream import StreamingMessage, send_streaming
+
+# 服务器返回 421 或连接已断开时，换新连接重新发送的次数
+_MAX_SEND_RETRIES = 2
 
 class EmailSender:
     def __init__(self, config=None):
@@ -9,49 +18,210 @@ class EmailSender:
         if config is None:
             from config import load_config
             config = load_config()
-            
+
         self.config = config
 
-    def send_email(self, recipient, subject, body, attachments=None):
-        """发送邮件"""
+        # 复用已登录的SMTP连接，连续发送多封邮件时不必每封都重新握手和登录
+        self.pool = None
+        if getattr(config, 'SMTP_POOL_ENABLED', True):
+            self.pool = SMTPConnectionPool(
+                self._connect,
+                max_size=getattr(config, 'SMTP_POOL_SIZE', 4),
+                idle_timeout=getattr(config, 'SMTP_POOL_IDLE_TIMEOUT', 60),
+                health_check_interval=getattr(config, 'SMTP_POOL_HEALTH_CHECK_INTERVAL', 15)
+            )
+
+        # 按SMTP服务器限速，避免连续发送大量邮件时被服务器限流
+        rate, burst = getattr(config, 'SMTP_PROVIDER_RATE_LIMITS', {}).get(
+            config.SMTP_SERVER,
+            (getattr(config, 'SMTP_RATE_LIMIT', 60), getattr(config, 'SMTP_RATE_BURST', 20))
+        )
+        self.rate_limiter = get_rate_limiter(config.SMTP_SERVER, rate, burst)
+
+        # 发件箱：send_email() 只把邮件保存到发件箱，由后台线程发送，失败后按退避时间重试
+        self.outbox = None
+        self.outbox_sender = None
+        if getattr(config, 'OUTBOX_ENABLED', True):
+            self.outbox = Outbox(getattr(config, 'OUTBOX_DB_PATH', 'outbox.db'))
+            self.outbox_sender = OutboxSender(
+                self.outbox,
+                self.send_raw,
+                provider=config.SMTP_SERVER,
+                max_attempts=getattr(config, 'OUTBOX_MAX_ATTEMPTS', 8),
+                retry_base_delay=getattr(config, 'OUTBOX_RETRY_BASE_DELAY', 30),
+                retry_max_delay=getattr(config, 'OUTBOX_RETRY_MAX_DELAY', 3600),
+                keep_sent_days=getattr(config, 'OUTBOX_KEEP_SENT_DAYS', 7)
+            )
+            self.outbox_sender.start()
+
+    def _connect(self):
+        """建立SMTP连接，完成 EHLO、STARTTLS 并登录"""
+        print(f"尝试连接到 SMTP 服务器: {self.config.SMTP_SERVER}:{self.config.SMTP_PORT}")
+        # 创建 SMTP 对象并设置超时时间
+        server = smtplib.SMTP(self.config.SMTP_SERVER, self.config.SMTP_PORT, timeout=10)
         try:
-            print(f"尝试连接到 SMTP 服务器: {self.config.SMTP_SERVER}:{self.config.SMTP_PORT}")
-            # 创建 SMTP 对象并设置超时时间
-            server = smtplib.SMTP(self.config.SMTP_SERVER, self.config.SMTP_PORT, timeout=10)
-            # 发送 EHLO 命令
             server.ehlo()
-            print("已发送 EHLO 命令")
-            # 启动 TLS 加密
+            # 启动 TLS 加密后需要再次发送 EHLO
             server.starttls()
-            print("已启动 TLS 加密")
-            # 再次发送 EHLO 命令
             server.ehlo()
-            print("再次发送 EHLO 命令")
-            # 登录邮箱
             server.login(self.config.EMAIL_ADDRESS, self.config.EMAIL_PASSWORD)
-            print("已登录到邮箱账号")
-
-            # 创建邮件消息
-            msg = MIMEMultipart()
-            msg['From'] = self.config.EMAIL_ADDRESS
-            msg['To'] = recipient
-            msg['Subject'] = subject
-
-            # 添加邮件正文
-            msg.attach(MIMEText(body, 'plain'))
-
-            # 添加附件
-            if attachments:
-                for attachment in attachments:
-                    part = MIMEApplication(attachment['data'], Name=attachment['filename'])
-                    part['Content-Disposition'] = f'attachment; filename="{attachment["filename"]}"'
-                    msg.attach(part)
-
-            # 发送邮件
-            server.send_message(msg)
-            server.quit()
+        except Exception:
+            server.close()
+            raise
+        print("已登录到邮箱账号")
+        # 已在该连接上发送的邮件数量
+        server.messages_sent = 0
+        return server
+
+    def build_message(self, recipient, subject, body, attachments=None):
+        """创建邮件消息
 
+        附件为 {'filename', 'data'}；包含 {'filename', 'path'} 形式的附件时返回 StreamingMessage，
+        发送时从磁盘逐块读取附件，不把整个文件读入内存。
+        """
+        if attachments and any(attachment.get('path') for attachment in attachments):
+            return StreamingMessage.build(self.config.EMAIL_ADDRESS, recipient, subject, body, attachments)
+
+        msg = MIMEMultipart()
+        msg['From'] = self.config.EMAIL_ADDRESS
+        msg['To'] = recipient
+        msg['Subject'] = subject
+
+        # 添加邮件正文
+        msg.attach(MIMEText(body, 'plain'))
+
+        # 添加附件
+        if attachments:
+            for attachment in attachments:
+                part = MIMEApplication(attachment['data'], Name=attachment['filename'])
+                part['Content-Disposition'] = f'attachment; filename="{attachment["filename"]}"'
+                msg.attach(part)
+        return msg
+
+    def send_email(self, recipient, subject, body, attachments=None):
+        """发送邮件
+
+        启用发件箱时邮件保存到发件箱后即返回 True，由后台线程发送。
+        """
+        try:
+            msg = self.build_message(recipient, subject, body, attachments)
+            if self.outbox:
+                self.queue_message(msg)
+            else:
+                self.send_message(msg)
             return True
         except Exception as e:
             print(f"发送邮件时出错: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def queue_message(self, msg):
+        """把已创建的邮件消息保存到发件箱
+
+        Returns:
+            int: 发件箱中的邮件ID
+        """
+        if isinstance(msg, StreamingMessage):
+            # 发件箱只保存邮件骨架和附件路径，附件在发送时从磁盘读取
+            msg.check_files()
+            sender, recipients = msg.sender, msg.recipients
+            entry_id = self.outbox.enqueue(self.config.SMTP_SERVER, sender, recipients, msg.skeleton, msg.files)
+        else:
+            sender = msg['Sender'] or msg['From']
+            recipients = [address for _, address in getaddresses(msg.get_all('To', []) + msg.get_all('Cc', []) +
+                                                                 msg.get_all('Bcc', [])) if address]
+            # 与 smtplib.send_message() 一样，密送地址不出现在发送的邮件中
+            del msg['Bcc']
+            buffer = io.BytesIO()
+            BytesGenerator(buffer, mangle_from_=False).flatten(msg, linesep='\r\n')
+            entry_id = self.outbox.enqueue(self.config.SMTP_SERVER, sender, recipients, buffer.getvalue())
+        self.outbox_sender.wake()
+        print(f"邮件已加入发件箱: {', '.join(recipients)}")
+        return entry_id
+
+    def send_message(self, msg, stop_event=None):
+        """立即发送已创建的邮件消息，失败时抛出异常
+
+        Args:
+            msg: build_message() 创建的邮件消息
+            stop_event: 等待限速期间被设置时放弃发送
+
+        Returns:
+            bool: 是否已发送（等待限速时被取消返回 False）
+        """
+        if isinstance(msg, StreamingMessage):
+            msg.check_files()
+            return self._send(lambda server: send_streaming(server, msg), stop_event)
+        return self._send(lambda server: server.send_message(msg), stop_event)
+
+    def send_raw(self, sender, recipients, data, stop_event=None, files=None):
+        """立即发送邮件原始字节，失败时抛出异常
+
+        Args:
+            files: StreamingMessage 的附件占位符和文件路径，data 为邮件骨架
+
+        其他参数和返回值与 send_message() 相同
+        """
+        if files:
+            return self.send_message(StreamingMessage(data, files, sender, recipients), stop_event)
+        return self._send(lambda server: server.sendmail(sender, recipients, data), stop_event)
+
+    def _send(self, deliver, stop_event=None):
+        """取得限速令牌后在SMTP连接上执行 deliver(server)
+
+        启用连接池时从池中借用连接：复用的连接先发送 RSET 保证从干净的状态开始新的邮件；
+        服务器返回 421（smtplib 随即关闭连接）或连接已断开时，丢弃该连接并用新连接重试。
+        """
+        if not self.rate_limiter.acquire(stop_event):
+            return False
+
+        if self.pool is None:
+            server = self._connect()
+            try:
+                deliver(server)
+            finally:
+                self._quit(server)
+            return True
+
+        for attempt in range(_MAX_SEND_RETRIES + 1):
+            server = self.pool.acquire(timeout=60)
+            try:
+                if server.messages_sent:
+                    server.rset()
+                deliver(server)
+            except smtplib.SMTPException as e:
+                if server.sock is not None and not isinstance(e, smtplib.SMTPServerDisconnected):
+                    # 收件人被拒绝等错误不影响连接，smtplib 已发送 RSET
+                    self.pool.release(server)
+                    raise
+                self.pool.discard(server)
+                if attempt == _MAX_SEND_RETRIES:
+                    raise
+                print(f"SMTP连接已失效: {e}，使用新连接重试")
+            except OSError as e:
+                # 网络错误（超时、连接被重置）
+                self.pool.discard(server)
+                if attempt == _MAX_SEND_RETRIES:
+                    raise
+                print(f"SMTP连接出错: {e}，使用新连接重试")
+            except Exception:
+                self.pool.discard(server)
+                raise
+            else:
+                server.messages_sent += 1
+                self.pool.release(server)
+                return True
+
+    @staticmethod
+    def _quit(server):
+        """结束不使用连接池时的连接"""
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def close(self):
+        """停止发件箱的发送线程，关闭连接池中的所有连接"""
+        if self.outbox_sender:
+            self.outbox_sender.stop()
+        if self.pool:
+            self.pool.close()
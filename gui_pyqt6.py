@@ -1,10 +1,11 @@
 import sys
+import datetime
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLabel, QLineEdit, QPushButton, QComboBox, QTextEdit, QTreeWidget,
                              QTreeWidgetItem, QScrollArea, QFrame, QGridLayout, QGroupBox,
                              QCheckBox, QSplitter, QTableWidget, QTableWidgetItem, QHeaderView,
                              QTabWidget, QMessageBox, QFileDialog, QListWidget, QListWidgetItem,
-                             QDialog)
+                             QDialog, QProgressDialog)
 from PyQt6.QtCore import Qt, QSize, pyqtSignal, pyqtSlot, QTimer
 from PyQt6.QtGui import QIcon, QFont, QPixmap, QColor, QPalette
 
@@ -17,6 +18,9 @@ from template_manager import TemplateManager
 from email_analytics import EmailAnalytics, StatisticsWidget
 from attachment_handler import AttachmentHandler, AttachmentWidget
 from async_operations import AsyncEmailProcessor, QtThreadWorker
+from idle_listener import IdleListener
+from bulk_sender import BulkReplySender
+from search_query import SearchQuery
 
 
 class ThemeManager:
@@ -242,6 +246,50 @@ class EmailTableWidget(QTableWidget):
         
         # 保存邮件数据
         self.emails_data[row_position] = email_data
+        self._apply_flags_style(row_position, email_data)
+        
+    def refresh_categories(self):
+        """按邮件数据重新显示分类列（邮件被重新分类后调用）"""
+        for row, email_data in self.emails_data.items():
+            item = self.item(row, 4)
+            if item:
+                item.setText(email_data.get('category', '未分类'))
+            
+    def update_email_flags(self, flag_updates, folder=None):
+        """按服务器上的标记原地更新邮件（如未读邮件加粗显示）"""
+        for row, email_data in self.emails_data.items():
+            flags = flag_updates.get(email_data.get('id'))
+            if flags is None or (folder is not None and email_data.get('folder', folder) != folder):
+                continue
+            email_data['flags'] = flags
+            self._apply_flags_style(row, email_data)
+            
+    def _apply_flags_style(self, row, email_data):
+        """未读邮件使用粗体显示；没有标记信息的邮件保持默认样式"""
+        flags = email_data.get('flags')
+        if flags is None:
+            return
+        unread = '\\Seen' not in flags
+        for column in range(self.columnCount()):
+            item = self.item(row, column)
+            if item:
+                font = item.font()
+                font.setBold(unread)
+                item.setFont(font)
+        
+    def remove_emails(self, email_ids, folder=None):
+        """从表格中移除指定ID的邮件"""
+        email_ids = set(email_ids)
+        for row in sorted(self.emails_data.keys(), reverse=True):
+            email_data = self.emails_data[row]
+            if email_data.get('id') in email_ids and (folder is None or email_data.get('folder', folder) == folder):
+                self.removeRow(row)
+        
+        # 行号发生变化，重建行号到邮件数据的映射
+        remaining = [self.emails_data[row] for row in sorted(self.emails_data.keys())
+                     if not (self.emails_data[row].get('id') in email_ids and
+                             (folder is None or self.emails_data[row].get('folder', folder) == folder))]
+        self.emails_data = {row: email_data for row, email_data in enumerate(remaining)}
         
     def clear_emails(self):
         """清空表格内容"""
@@ -308,9 +356,105 @@ class BulkActionsWidget(QWidget):
         layout.setContentsMargins(0, 0, 0, 0)
 
 
+class EmailFilterBar(QWidget):
+    """邮件筛选栏，把筛选条件转换为由服务器执行的IMAP搜索"""
+    
+    DATE_RANGES = [("全部日期", None), ("今天", 0), ("最近3天", 2), ("最近7天", 6), ("最近30天", 29)]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setup_ui()
+        
+    def setup_ui(self):
+        layout = QHBoxLayout(self)
+        
+        # 日期范围
+        self.date_combo = QComboBox()
+        self.date_combo.addItems([label for label, _ in self.DATE_RANGES])
+        layout.addWidget(self.date_combo)
+        
+        # 发件人
+        self.sender_input = QLineEdit()
+        self.sender_input.setPlaceholderText("发件人")
+        layout.addWidget(self.sender_input)
+        
+        # 主题关键词
+        self.subject_input = QLineEdit()
+        self.subject_input.setPlaceholderText("主题包含")
+        layout.addWidget(self.subject_input)
+        
+        # 邮件大小
+        self.size_combo = QComboBox()
+        self.size_combo.addItems(["任意大小", "大于100KB", "大于1MB", "大于10MB"])
+        layout.addWidget(self.size_combo)
+        
+        self.unseen_check = QCheckBox("仅未读")
+        layout.addWidget(self.unseen_check)
+        
+        self.flagged_check = QCheckBox("仅重要")
+        layout.addWidget(self.flagged_check)
+        
+        self.apply_btn = QPushButton("筛选")
+        self.clear_btn = QPushButton("清除")
+        layout.addWidget(self.apply_btn)
+        layout.addWidget(self.clear_btn)
+        
+        # 回车直接筛选
+        self.sender_input.returnPressed.connect(self.apply_btn.click)
+        self.subject_input.returnPressed.connect(self.apply_btn.click)
+        self.clear_btn.clicked.connect(self.clear_filters)
+        
+        layout.setContentsMargins(0, 0, 0, 0)
+        
+    def build_query(self):
+        """根据当前筛选条件生成搜索条件，没有筛选条件时返回 'ALL'"""
+        query = SearchQuery()
+        
+        days = self.DATE_RANGES[self.date_combo.currentIndex()][1]
+        if days is not None:
+            query.since(datetime.date.today() - datetime.timedelta(days=days))
+        
+        sender = self.sender_input.text().strip()
+        if sender:
+            query.from_(sender)
+        
+        subject = self.subject_input.text().strip()
+        if subject:
+            query.subject(subject)
+        
+        min_size = [0, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024][self.size_combo.currentIndex()]
+        if min_size:
+            query.larger(min_size)
+        
+        if self.unseen_check.isChecked():
+            query.unseen()
+        if self.flagged_check.isChecked():
+            query.flagged()
+        
+        return 'ALL' if query.is_empty() else query
+    
+    def clear_filters(self):
+        """清除所有筛选条件"""
+        self.date_combo.setCurrentIndex(0)
+        self.sender_input.clear()
+        self.subject_input.clear()
+        self.size_combo.setCurrentIndex(0)
+        self.unseen_check.setChecked(False)
+        self.flagged_check.setChecked(False)
+
+
 class EmailAssistantGUI(QMainWindow):
     """基于PyQt6的邮件助手主窗口"""
     
+    # 后台线程获取到新邮件后通过信号交给主线程显示
+    new_emails_ready = pyqtSignal(list)
+    emails_reset = pyqtSignal()
+    status_message = pyqtSignal(str)
+    fetch_error = pyqtSignal(str)
+    flags_synced = pyqtSignal(dict)
+    rules_changed = pyqtSignal(str)
+    emails_reclassified = pyqtSignal(list)
+    
     def __init__(self, email_connector=None, email_classifier=None, email_sender=None, 
                  attachment_handler=None, template_manager=None, email_analytics=None,
                  async_processor=None):
@@ -337,6 +481,25 @@ class EmailAssistantGUI(QMainWindow):
         # 邮件数据
         self.current_email = None
         
+        # 新邮件推送监听
+        self.idle_listener = None
+        
+        # 后台批量回复
+        self.bulk_reply_thread = None
+        self.bulk_reply_progress = None
+        self.bulk_reply_failures = []
+        self.new_emails_ready.connect(self.display_new_emails)
+        self.emails_reset.connect(lambda: self.email_table.clear_emails())
+        self.status_message.connect(lambda message: self.statusBar().showMessage(message))
+        self.fetch_error.connect(self.handle_fetch_error)
+        self.flags_synced.connect(self.on_flags_synced)
+        
+        # 分类规则文件修改后由后台线程通知，在主线程中更新界面
+        self.rules_changed.connect(self.on_rules_changed)
+        self.emails_reclassified.connect(self.on_emails_reclassified)
+        if hasattr(self.email_classifier, 'add_rules_listener'):
+            self.email_classifier.add_rules_listener(self.rules_changed.emit)
+        
         # 获取当前应用实例并初始化主题管理器
         app = QApplication.instance()
         if app:
@@ -473,6 +636,12 @@ class EmailAssistantGUI(QMainWindow):
         self.bulk_actions.mark_read_btn.clicked.connect(self.mark_as_read)
         self.bulk_actions.selection_dropdown.currentIndexChanged.connect(self.handle_selection_change)
         
+        # 筛选栏（由服务器执行搜索，只下载匹配的邮件）
+        self.filter_bar = EmailFilterBar()
+        self.filter_bar.apply_btn.clicked.connect(self.fetch_and_display_emails)
+        self.filter_bar.clear_btn.clicked.connect(self.fetch_and_display_emails)
+        mail_list_layout.addWidget(self.filter_bar)
+        
         # 邮件表格
         self.email_table = EmailTableWidget()
         self.email_table.email_selected.connect(self.show_email_content)
@@ -553,7 +722,7 @@ class EmailAssistantGUI(QMainWindow):
         bulk_layout.addWidget(QLabel("目标分类:"), 0, 0)
         
         self.bulk_category_combo = QComboBox()
-        self.bulk_category_combo.addItems(list(self.config.CATEGORY_KEYWORDS.keys()) + [self.config.DEFAULT_CATEGORY])
+        self.bulk_category_combo.addItems(self.email_classifier.categories)
         bulk_layout.addWidget(self.bulk_category_combo, 0, 1)
         
         self.bulk_classify_btn = QPushButton("批量分类")
@@ -566,7 +735,7 @@ class EmailAssistantGUI(QMainWindow):
         bulk_layout.addWidget(self.bulk_reply_text, 1, 1, 1, 2)
         
         self.bulk_reply_btn = QPushButton("批量回复")
-        self.bulk_reply_btn.clicked.connect(self.bulk_reply_emails)
+        self.bulk_reply_btn.clicked.connect(lambda: self.bulk_reply_emails())
         bulk_layout.addWidget(self.bulk_reply_btn, 2, 0, 1, 3)
         
         lower_splitter.addWidget(bulk_container)
@@ -602,8 +771,14 @@ class EmailAssistantGUI(QMainWindow):
             # 保存当前异步处理器引用
             old_async_processor = self.async_processor
             
+            # 旧连接器的新邮件监听不再有效
+            self.stop_idle_listener()
+            
             # 重新初始化连接器
             self.email_connector = EmailConnector(self.config)
+            if self.email_sender:
+                # 旧的SMTP连接使用的是修改前的服务器和账号
+                self.email_sender.close()
             self.email_sender = EmailSender(self.config)
             
             # 重新初始化异步处理器，使其使用新的连接器
@@ -623,6 +798,8 @@ class EmailAssistantGUI(QMainWindow):
                 QMessageBox.information(self, "成功", "邮箱连接成功")
                 # 立即获取邮件列表
                 self.fetch_and_display_emails()
+                # 在后台监听新邮件
+                self.start_idle_listener()
                 return True
             else:
                 QMessageBox.critical(self, "错误", "邮箱连接失败")
@@ -647,45 +824,36 @@ class EmailAssistantGUI(QMainWindow):
                 return
             self.statusBar().showMessage("已重新连接邮箱，正在获取邮件...")
         
-        if self.async_processor:
-            # 使用异步处理器
+        folders = getattr(self.config, 'FETCH_FOLDERS', ['INBOX'])
+        search_criteria = self.filter_bar.build_query()
+        if search_criteria != 'ALL':
+            self.statusBar().showMessage(f"正在搜索邮件: {search_criteria}")
+        
+        if self.async_processor and len(folders) > 1:
+            self.fetch_and_display_folders(folders, search_criteria)
+        elif self.async_processor:
+            # 使用异步处理器流式获取，每批邮件分类后立即显示
             def on_emails_fetched(emails):
                 if not emails:
-                    self.statusBar().showMessage("没有发现邮件")
+                    self.status_message.emit("没有发现邮件")
                     return
                     
-                self.statusBar().showMessage(f"成功获取 {len(emails)} 封邮件")
-                
-                # 分类邮件
-                self.async_processor.classify_emails_async(
-                    emails,
-                    callback=self.display_classified_emails,
-                    error_callback=self.handle_classify_error
-                )
-            
-            def on_fetch_error(error_msg):
-                self.statusBar().showMessage(f"获取邮件失败: {error_msg}")
-                QMessageBox.critical(self, "错误", f"获取邮件失败: {error_msg}")
-                
-                # 提示用户重新连接
-                reply = QMessageBox.question(
-                    self, 
-                    "连接问题", 
-                    "邮箱连接可能已失效，是否重新连接?",
-                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-                )
-                
-                if reply == QMessageBox.StandardButton.Yes:
-                    self.connect_email()
+                self.status_message.emit(f"成功获取 {len(emails)} 封邮件")
+                if search_criteria == 'ALL':
+                    self.resync_flags(folders[0])
             
             # 异步获取邮件
-            self.async_processor.fetch_emails_async(
+            self.async_processor.stream_emails_async(
+                chunk_callback=self.new_emails_ready.emit,
                 callback=on_emails_fetched,
-                error_callback=on_fetch_error
+                error_callback=self.fetch_error.emit,
+                folder=folders[0],
+                search_criteria=search_criteria,
+                reset_callback=self.emails_reset.emit
             )
         else:
             # 使用同步方式获取邮件
-            emails = self.email_connector.fetch_emails()
+            emails = self.email_connector.fetch_emails(search_criteria=search_criteria)
             
             if not emails:
                 self.statusBar().showMessage("没有找到邮件")
@@ -694,13 +862,63 @@ class EmailAssistantGUI(QMainWindow):
             self.statusBar().showMessage(f"成功获取 {len(emails)} 封邮件")
             
             # 分类邮件
+            self.email_classifier.tag_batch(emails)
             for email_data in emails:
-                category = self.email_classifier.classify_email(email_data)
-                self.email_classifier.tag_email(email_data, category)
-                
                 # 添加到邮件列表
                 self.email_table.add_email(email_data)
     
+    def handle_fetch_error(self, error_msg):
+        """处理获取邮件错误"""
+        self.statusBar().showMessage(f"获取邮件失败: {error_msg}")
+        QMessageBox.critical(self, "错误", f"获取邮件失败: {error_msg}")
+        
+        # 提示用户重新连接
+        reply = QMessageBox.question(
+            self, 
+            "连接问题", 
+            "邮箱连接可能已失效，是否重新连接?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        
+        if reply == QMessageBox.StandardButton.Yes:
+            self.connect_email()
+    
+    def fetch_and_display_folders(self, folders, search_criteria='ALL'):
+        """并行获取多个文件夹，每个文件夹完成后立即分类并显示"""
+        self.statusBar().showMessage(f"正在并行获取 {len(folders)} 个文件夹...")
+        
+        def on_folder_fetched(folder, emails, stats):
+            self.status_message.emit(
+                f"{folder}: {stats['count']} 封邮件，耗时 {stats['seconds']:.1f} 秒"
+                f"（{stats['messages_per_second']:.0f} 封/秒）"
+            )
+            if emails:
+                self.async_processor.classify_emails_async(
+                    emails,
+                    callback=self.new_emails_ready.emit,
+                    error_callback=lambda error_msg: self.status_message.emit(f"分类邮件失败: {error_msg}")
+                )
+            if search_criteria == 'ALL':
+                self.resync_flags(folder)
+        
+        def on_folder_error(folder, error_msg):
+            self.status_message.emit(f"获取文件夹 {folder} 失败: {error_msg}")
+        
+        def on_all_fetched(results):
+            slowest = max(results.values(), key=lambda x: x.get('seconds', 0))
+            total = sum(stats.get('count', 0) for stats in results.values())
+            self.status_message.emit(
+                f"已获取 {len(results)} 个文件夹共 {total} 封邮件，最慢: {slowest['folder']} ({slowest['seconds']:.1f} 秒)"
+            )
+        
+        self.async_processor.fetch_folders(
+            folders,
+            folder_callback=on_folder_fetched,
+            callback=on_all_fetched,
+            error_callback=on_folder_error,
+            search_criteria=search_criteria
+        )
+    
     def display_classified_emails(self, emails):
         """显示已分类的邮件"""
         for email_data in emails:
@@ -708,6 +926,113 @@ class EmailAssistantGUI(QMainWindow):
         
         self.statusBar().showMessage(f"已显示 {len(emails)} 封邮件")
     
+    def start_idle_listener(self):
+        """启动IMAP IDLE新邮件监听"""
+        self.stop_idle_listener()
+        
+        if not getattr(self.config, 'IDLE_ENABLED', False):
+            return
+            
+        self.idle_listener = IdleListener(
+            self.email_connector,
+            folder=getattr(self.config, 'IDLE_FOLDER', 'INBOX'),
+            idle_timeout=getattr(self.config, 'IDLE_TIMEOUT', 29 * 60),
+            poll_interval=getattr(self.config, 'IDLE_POLL_INTERVAL', 60),
+            max_reconnect_delay=getattr(self.config, 'IDLE_MAX_RECONNECT_DELAY', 300)
+        )
+        self.idle_listener.new_mail.connect(self.on_new_mail)
+        self.idle_listener.mail_removed.connect(self.on_mail_removed)
+        self.idle_listener.start()
+        
+    def stop_idle_listener(self):
+        """停止IMAP IDLE新邮件监听"""
+        if self.idle_listener:
+            self.idle_listener.stop()
+            self.idle_listener = None
+            
+    def on_new_mail(self, folder, uids):
+        """IDLE监听到新邮件时，只获取、分类并显示这些邮件"""
+        self.statusBar().showMessage(f"收到 {len(uids)} 封新邮件，正在获取...")
+        
+        if self.async_processor:
+            self.async_processor.fetch_new_emails_async(
+                folder,
+                uids,
+                callback=self.new_emails_ready.emit,
+                error_callback=lambda error_msg: print(f"获取新邮件失败: {error_msg}")
+            )
+        else:
+            new_emails = self.email_connector.fetch_uids(folder, uids)
+            self.email_connector.advance_sync_state(folder, uids, new_emails)
+            self.email_classifier.tag_batch(new_emails)
+            self.display_new_emails(new_emails)
+            
+    def on_rules_changed(self, version):
+        """分类规则更新后刷新分类列表，并在后台重新分类按旧规则分类的邮件"""
+        current = self.bulk_category_combo.currentText()
+        self.bulk_category_combo.clear()
+        self.bulk_category_combo.addItems(self.email_classifier.categories)
+        self.bulk_category_combo.setCurrentText(current)
+        
+        emails = list(self.email_table.emails_data.values())
+        self.statusBar().showMessage(f"分类规则已更新（版本 {version}），正在重新分类邮件...")
+        if self.async_processor:
+            self.async_processor.reclassify_stale_async(
+                emails,
+                callback=self.emails_reclassified.emit,
+                error_callback=lambda error_msg: self.status_message.emit(f"重新分类邮件失败: {error_msg}")
+            )
+        else:
+            stale = self.email_classifier.stale_emails(emails)
+            self.email_classifier.tag_batch(stale)
+            self.on_emails_reclassified(stale)
+            
+    def on_emails_reclassified(self, emails):
+        """重新分类完成后更新邮件列表中的分类"""
+        self.email_table.refresh_categories()
+        self.statusBar().showMessage(f"已按新规则重新分类 {len(emails)} 封邮件")
+        if hasattr(self, 'statistics_widget'):
+            self.statistics_widget.refresh()
+            
+    def display_new_emails(self, emails):
+        """在列表末尾追加新邮件"""
+        for email_data in emails:
+            self.email_table.add_email(email_data)
+            
+        if emails:
+            self.statusBar().showMessage(f"已添加 {len(emails)} 封邮件")
+            
+    def resync_flags(self, folder):
+        """在后台同步其他客户端对邮件标记（已读、已回复、删除）的修改"""
+        def on_resynced(result):
+            if result:
+                self.flags_synced.emit(result)
+        
+        self.async_processor.resync_flags_async(
+            folder,
+            callback=on_resynced,
+            error_callback=lambda error_msg: print(f"同步邮件标记失败: {error_msg}")
+        )
+        
+    def on_flags_synced(self, result):
+        """把标记同步结果原地应用到邮件列表和数据库"""
+        folder = result['folder']
+        self.email_table.update_email_flags(result['changed'], folder)
+        if result['vanished']:
+            self.email_table.remove_emails(result['vanished'], folder)
+        if self.email_analytics:
+            self.email_analytics.update_email_flags(result['changed'], folder)
+            self.email_analytics.delete_emails(result['vanished'], folder)
+        if result['changed'] or result['vanished']:
+            self.statusBar().showMessage(
+                f"{folder}: {len(result['changed'])} 封邮件标记已更新，{len(result['vanished'])} 封邮件已删除")
+        
+    def on_mail_removed(self, folder, uids):
+        """IDLE监听到邮件被删除时，从列表和缓存中移除"""
+        self.email_table.remove_emails(uids, folder)
+        if self.async_processor:
+            self.async_processor.remove_cached_emails(folder, uids)
+        
     def handle_classify_error(self, error_msg):
         """处理分类错误"""
         self.statusBar().showMessage(f"分类邮件失败: {error_msg}")
@@ -717,6 +1042,11 @@ class EmailAssistantGUI(QMainWindow):
         """显示选中邮件的内容"""
         self.current_email = email_data
         
+        # 列表中只有邮件头部时，先显示头部，再在后台加载正文和附件
+        if not email_data.get('body_loaded', True):
+            self.load_email_body(email_data)
+            return
+        
         # 设置邮件内容
         content = f"发件人: {email_data.get('from', '')}\n"
         content += f"主题: {email_data.get('subject', '')}\n"
@@ -753,6 +1083,34 @@ class EmailAssistantGUI(QMainWindow):
             if hasattr(self, 'statistics_widget'):
                 self.statistics_widget.refresh()
         
+    def load_email_body(self, email_data):
+        """在后台线程加载邮件正文"""
+        content = f"发件人: {email_data.get('from', '')}\n"
+        content += f"主题: {email_data.get('subject', '')}\n"
+        content += f"日期: {email_data.get('date', '')}\n"
+        content += f"分类: {email_data.get('category', '未分类')}\n\n"
+        content += "正在加载邮件内容..."
+        self.email_body_text.setText(content)
+        
+        def on_body_loaded(loaded_email):
+            # 用户可能已经切换到其他邮件
+            if self.current_email is loaded_email:
+                self.show_email_content(loaded_email)
+        
+        def on_load_error(error_msg):
+            if self.current_email is email_data:
+                self.email_body_text.setText(content.replace("正在加载邮件内容...", f"加载邮件内容失败: {error_msg}"))
+        
+        worker = QtThreadWorker(self.email_connector.load_email_body, email_data)
+        worker.finished.connect(on_body_loaded)
+        worker.error.connect(on_load_error)
+        # 保留引用，避免线程结束前被回收
+        if not hasattr(self, 'body_loaders'):
+            self.body_loaders = []
+        self.body_loaders = [w for w in self.body_loaders if not w.isFinished()]
+        self.body_loaders.append(worker)
+        worker.start()
+        
     def send_reply(self):
         """发送回复邮件"""
         if not self.current_email:
@@ -778,12 +1136,15 @@ class EmailAssistantGUI(QMainWindow):
         )
         
         if success:
-            self.statusBar().showMessage("回复邮件已发送")
-            QMessageBox.information(self, "成功", "回复邮件已发送")
+            # 启用发件箱时由后台线程发送，失败后自动重试
+            message = "回复邮件已加入发件箱" if self.email_sender.outbox else "回复邮件已发送"
+            self.statusBar().showMessage(message)
+            QMessageBox.information(self, "成功", message)
             
             # 更新统计数据
             if self.email_analytics:
-                self.email_analytics.mark_email_replied(self.current_email.get('id', ''))
+                self.email_analytics.mark_emails_replied(
+                    [(self.current_email.get('folder', ''), self.current_email.get('id', ''), reply_content)])
                 
                 # 刷新统计数据
                 if hasattr(self, 'statistics_widget'):
@@ -866,6 +1227,9 @@ class EmailAssistantGUI(QMainWindow):
                     
                     processed_count += 1
                     
+                # 用户手动指定的分类作为统计模型的训练样本
+                self.email_classifier.learn(selected_emails, category)
+                    
                 self.statusBar().showMessage(f"已成功将 {processed_count} 封邮件分类为 {category}")
                 QMessageBox.information(self, "完成", f"已成功将 {processed_count} 封邮件分类为 {category}")
                 
@@ -964,7 +1328,7 @@ class EmailAssistantGUI(QMainWindow):
         Args:
             selected_emails: 选中的邮件列表，如果为None则从表格获取
             reply_content: 回复内容，如果为None则从批量回复文本框获取
-            use_template: 是否使用模板
+            use_template: 是否使用模板，使用时为每封邮件填充回复内容中的模板变量
             template_name: 模板名称
         """
         if selected_emails is None:
@@ -981,42 +1345,71 @@ class EmailAssistantGUI(QMainWindow):
             QMessageBox.warning(self, "警告", "请输入回复内容")
             return
             
-        self.statusBar().showMessage(f"正在回复 {len(selected_emails)} 封邮件...")
+        if self.bulk_reply_thread and self.bulk_reply_thread.isRunning():
+            QMessageBox.warning(self, "警告", "上一批回复仍在发送中")
+            return
         
-        # 执行批量回复
-        success_count = 0
-        for email_data in selected_emails:
-            try:
-                # 如果使用模板，则为每封邮件填充变量
-                actual_content = reply_content
-                if use_template and self.template_manager:
-                    template_content = self.template_manager.get_template_content(template_name)
-                    actual_content = self.template_manager.fill_template(template_content, email_data)
-                
-                # 发送回复
-                recipient = email_data.get('from', '')
-                subject = f"Re: {email_data.get('subject', '')}"
-                
-                if self.email_sender.send_email(recipient, subject, actual_content):
-                    success_count += 1
-                    
-                    # 标记为已回复（如果有分析器）
-                    if self.email_analytics:
-                        self.email_analytics.mark_email_replied(email_data.get('id', ''))
-            except Exception as e:
-                print(f"回复邮件失败: {e}")
-                
-        if success_count > 0:
-            self.statusBar().showMessage(f"已成功回复 {success_count} 封邮件")
-            QMessageBox.information(self, "完成", f"已成功回复 {success_count} 封邮件")
-            
-            # 刷新统计数据
-            if self.email_analytics and hasattr(self, 'statistics_widget'):
-                self.statistics_widget.refresh()
-        else:
-            self.statusBar().showMessage("批量回复失败")
+        # 在后台线程中并行发送，界面通过信号更新进度
+        self.bulk_reply_thread = BulkReplySender(
+            self.email_sender,
+            selected_emails,
+            reply_content,
+            template_manager=self.template_manager,
+            use_template=use_template,
+            analytics=self.email_analytics
+        )
+        total = len(selected_emails)
+        self.bulk_reply_failures = []
+        self.bulk_reply_progress = QProgressDialog(f"正在回复 {total} 封邮件...", "取消", 0, total, self)
+        self.bulk_reply_progress.setWindowTitle("批量回复")
+        self.bulk_reply_progress.setMinimumDuration(0)
+        self.bulk_reply_progress.canceled.connect(self.bulk_reply_thread.cancel)
+        self.bulk_reply_thread.progress.connect(self.on_bulk_reply_progress)
+        self.bulk_reply_thread.message_failed.connect(self.on_bulk_reply_failed)
+        self.bulk_reply_thread.batch_finished.connect(self.on_bulk_reply_finished)
+        self.bulk_reply_btn.setEnabled(False)
+        self.statusBar().showMessage(f"正在回复 {total} 封邮件...")
+        self.bulk_reply_thread.start()
+    
+    def on_bulk_reply_progress(self, done, total):
+        """批量回复进度"""
+        if self.bulk_reply_progress:
+            self.bulk_reply_progress.setValue(done)
+        self.statusBar().showMessage(f"正在回复邮件 {done}/{total}，失败 {len(self.bulk_reply_failures)} 封")
+    
+    def on_bulk_reply_failed(self, index, email_data, error_msg):
+        """记录回复失败的邮件"""
+        self.bulk_reply_failures.append(f"{email_data.get('from', '')}: {error_msg}")
+    
+    def on_bulk_reply_finished(self, summary):
+        """批量回复完成"""
+        if self.bulk_reply_progress:
+            self.bulk_reply_progress.close()
+            self.bulk_reply_progress = None
+        self.bulk_reply_btn.setEnabled(True)
+        
+        message = f"已成功回复 {summary['sent']} 封邮件"
+        if summary['queued']:
+            message += f"，{summary['queued']} 封暂时无法发送，已加入发件箱稍后重试"
+        if summary['failed']:
+            message += f"，{summary['failed']} 封失败"
+        if summary['cancelled']:
+            message += f"，{summary['cancelled']} 封已取消"
+        self.statusBar().showMessage(message)
+        
+        if self.bulk_reply_failures:
+            # 最多列出前10封失败的邮件
+            details = "\n".join(self.bulk_reply_failures[:10])
+            QMessageBox.warning(self, "批量回复", f"{message}\n\n{details}")
+        elif summary['sent'] or summary['queued']:
+            QMessageBox.information(self, "完成", message)
+        elif not summary['cancelled']:
             QMessageBox.warning(self, "警告", "批量回复失败，请检查邮箱连接")
         
+        # 刷新统计数据
+        if (summary['sent'] or summary['queued']) and self.email_analytics and hasattr(self, 'statistics_widget'):
+            self.statistics_widget.refresh()
+        
     def show_bulk_classify_dialog(self):
         """显示批量分类对话框"""
         try:
@@ -1029,9 +1422,9 @@ class EmailAssistantGUI(QMainWindow):
             # 使用对话框让用户选择分类
             categories = ["订单", "投诉", "反馈", "支持", "咨询", "通知", "其他"]
             
-            # 尝试从config中获取分类
-            if hasattr(self, 'config') and hasattr(self.config, 'CATEGORY_KEYWORDS'):
-                categories = list(self.config.CATEGORY_KEYWORDS.keys())
+            # 使用分类器当前的规则中的分类
+            if hasattr(self.email_classifier, 'categories'):
+                categories = list(self.email_classifier.categories)
                 
             # 如果有模板管理器，尝试获取所有模板分类
             if self.template_manager:
@@ -1219,12 +1612,28 @@ class EmailAssistantGUI(QMainWindow):
             
     def closeEvent(self, event):
         """关闭窗口事件"""
+        # 停止新邮件监听
+        try:
+            self.stop_idle_listener()
+        except Exception as e:
+            print(f"停止新邮件监听时出错: {e}")
+            
+        # 取消尚未发送的批量回复，等待正在发送的邮件完成
+        if self.bulk_reply_thread and self.bulk_reply_thread.isRunning():
+            self.bulk_reply_thread.cancel()
+            self.bulk_reply_thread.wait(30000)
+            
         # 关闭邮箱连接
         try:
             if hasattr(self, 'email_connector') and self.email_connector:
                 self.email_connector.close()
         except Exception as e:
             print(f"关闭邮箱连接时出错: {e}")
+        try:
+            if self.email_sender:
+                self.email_sender.close()
+        except Exception as e:
+            print(f"关闭SMTP连接时出错: {e}")
         event.accept()
 
     def create_template_management_tab(self):
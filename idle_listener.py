@@ -0,0 +1,223 @@
+import re
+import select
+import threading
+import time
+from PyQt6.QtCore import QThread, pyqtSignal
+
+# IDLE 期间服务器推送的未标记响应
+_UNTAGGED_RE = re.compile(rb'^\* (\d+) (EXISTS|EXPUNGE)\b', re.IGNORECASE)
+# 启用 QRESYNC 后服务器用 VANISHED 代替 EXPUNGE，直接给出被删除邮件的UID集合
+_VANISHED_RE = re.compile(rb'^\* VANISHED (?:\(EARLIER\) )?([\d:,]+)', re.IGNORECASE)
+
+
+class IdleListener(QThread):
+    """IMAP IDLE 新邮件监听线程
+
+    使用独立于 EmailConnector.mail 的连接，收到 EXISTS/EXPUNGE 通知后
+    只把新增或删除的邮件 UID 通过信号发出。服务器不支持 IDLE 时退化为定时轮询。
+    """
+
+    new_mail = pyqtSignal(str, list)        # 文件夹, 新邮件UID列表
+    mail_removed = pyqtSignal(str, list)    # 文件夹, 被删除的邮件UID列表
+    error = pyqtSignal(str)                 # 错误信号
+
+    def __init__(self, email_connector, folder='INBOX', idle_timeout=29 * 60,
+                 poll_interval=60, max_reconnect_delay=300):
+        """初始化监听线程
+
+        Args:
+            email_connector: 用于创建独立连接的邮箱连接器
+            folder: 监听的文件夹
+            idle_timeout: 重新发送IDLE的间隔（秒），RFC 2177 建议不超过29分钟
+            poll_interval: 服务器不支持IDLE时的轮询间隔（秒）
+            max_reconnect_delay: 断线重连的最大等待时间（秒）
+        """
+        super().__init__()
+        self.email_connector = email_connector
+        self.folder = folder
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.max_reconnect_delay = max_reconnect_delay
+        self.stop_event = threading.Event()
+        self.mail = None
+        self.uids = []
+        self.buffer = b''
+
+    def run(self):
+        """监听循环，断线后按指数退避重连"""
+        delay = 1
+        while not self.stop_event.is_set():
+            try:
+                self._open()
+                delay = 1
+                while not self.stop_event.is_set():
+                    if 'IDLE' in self.mail.capabilities:
+                        self._idle_once()
+                    else:
+                        self._poll_once()
+            except Exception as e:
+                if self.stop_event.is_set():
+                    break
+                print(f"IDLE监听出错: {e}，{delay} 秒后重连")
+                self.error.emit(str(e))
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                self._logout()
+
+    def stop(self):
+        """停止监听"""
+        self.stop_event.set()
+        # 主动关闭套接字，打断正在等待的 select
+        if self.mail is not None:
+            try:
+                self.mail.shutdown()
+            except Exception:
+                pass
+        self.wait(5000)
+
+    def _open(self):
+        """建立独立连接并记录文件夹中现有的UID"""
+        # IDLE期间直接读取套接字，不能使用压缩
+        self.mail = self.email_connector.open_connection(compress=False)
+        self.buffer = b''
+        status, messages = self.mail.select(self.folder, readonly=True)
+        if status != "OK":
+            raise Exception(f"选择邮件文件夹失败: {messages}")
+        self.uids = self._search_all()
+        print(f"IDLE监听已启动: {self.folder}，现有 {len(self.uids)} 封邮件")
+
+    def _logout(self):
+        """注销监听连接"""
+        if self.mail is not None:
+            try:
+                self.mail.logout()
+            except Exception:
+                pass
+            finally:
+                self.mail = None
+
+    def _search_all(self):
+        status, data = self.mail.uid('SEARCH', None, 'ALL')
+        if status != "OK":
+            raise Exception(f"搜索邮件失败: {data}")
+        return [int(uid) for uid in data[0].split()] if data and data[0] else []
+
+    def _idle_once(self):
+        """发送一次IDLE，直到收到通知、超时或被停止"""
+        tag = self.mail._new_tag()
+        self.mail.send(tag + b' IDLE\r\n')
+
+        # 服务器可能在确认IDLE之前先推送积压的通知
+        events = []
+        while True:
+            line = self._read_line(30)
+            if line is None or line.startswith(tag):
+                raise Exception(f"服务器拒绝IDLE: {line}")
+            if line.startswith(b'+'):
+                break
+            self._parse_event(line, events)
+
+        deadline = time.monotonic() + self.idle_timeout
+        while not self.stop_event.is_set() and time.monotonic() < deadline:
+            line = self._read_line(min(1.0, max(0.0, deadline - time.monotonic())))
+            if line is None:
+                if events:
+                    break
+                continue
+            self._parse_event(line, events)
+
+        # 结束IDLE；超时后会重新发送，避免服务器断开空闲连接
+        self.mail.send(b'DONE\r\n')
+        while True:
+            line = self._read_line(30)
+            if line is None:
+                raise Exception("等待IDLE结束响应超时")
+            if line.startswith(tag):
+                break
+            self._parse_event(line, events)
+
+        if events:
+            self._handle_events(events)
+
+    def _parse_event(self, line, events):
+        """把 EXISTS/EXPUNGE/VANISHED 通知加入事件列表"""
+        match = _UNTAGGED_RE.match(line)
+        if match:
+            # 匹配结果是 bytes，转换为 str 后才能与 _handle_events() 中的 'EXPUNGE' 等比较
+            events.append((match.group(2).decode('ascii').upper(), int(match.group(1))))
+            return
+        match = _VANISHED_RE.match(line)
+        if match:
+            events.append(('VANISHED', match.group(1).decode()))
+
+    def _poll_once(self):
+        """不支持IDLE时的轮询"""
+        self.stop_event.wait(self.poll_interval)
+        if self.stop_event.is_set():
+            return
+        self.mail.noop()
+        current = self._search_all()
+        known = set(self.uids)
+        current_set = set(current)
+        removed = [uid for uid in self.uids if uid not in current_set]
+        added = [uid for uid in current if uid not in known]
+        self.uids = current
+        self._emit_changes(added, removed)
+
+    def _handle_events(self, events):
+        """按顺序应用EXPUNGE/VANISHED，并在有EXISTS时查询新邮件的UID"""
+        removed = []
+        exists = None
+        for kind, number in events:
+            if kind == 'EXPUNGE':
+                if 0 < number <= len(self.uids):
+                    removed.append(self.uids.pop(number - 1))
+            elif kind == 'VANISHED':
+                vanished = set(int(uid) for uid in self.email_connector._expand_uid_set(number))
+                removed.extend(uid for uid in self.uids if uid in vanished)
+                self.uids = [uid for uid in self.uids if uid not in vanished]
+            elif kind == 'EXISTS':
+                exists = number
+
+        added = []
+        if exists is not None:
+            last_uid = self.uids[-1] if self.uids else 0
+            status, data = self.mail.uid('SEARCH', None, f'UID {last_uid + 1}:*')
+            if status == "OK" and data and data[0]:
+                added = [int(uid) for uid in data[0].split() if int(uid) > last_uid]
+            self.uids.extend(added)
+
+            # 序号与本地记录不一致时重新同步UID列表
+            if exists != len(self.uids):
+                current = self._search_all()
+                current_set = set(current)
+                removed.extend(uid for uid in self.uids if uid not in current_set)
+                self.uids = current
+
+        self._emit_changes(added, removed)
+
+    def _emit_changes(self, added, removed):
+        if removed:
+            print(f"{self.folder} 中有 {len(removed)} 封邮件被删除")
+            self.mail_removed.emit(self.folder, [str(uid) for uid in removed])
+        if added:
+            print(f"{self.folder} 收到 {len(added)} 封新邮件")
+            self.new_mail.emit(self.folder, [str(uid) for uid in added])
+
+    def _read_line(self, timeout):
+        """在IDLE期间直接从套接字读取一行，超时返回 None"""
+        while b'\r\n' not in self.buffer:
+            sock = self.mail.sock
+            pending = sock.pending() if hasattr(sock, 'pending') else 0
+            if not pending:
+                readable, _, _ = select.select([sock], [], [], timeout)
+                if not readable:
+                    return None
+            data = sock.recv(65536)
+            if not data:
+                raise Exception("服务器关闭了连接")
+            self.buffer += data
+
+        line, self.buffer = self.buffer.split(b'\r\n', 1)
+        return line
@@ -0,0 +1,133 @@
+import re
+
+# BODYSTRUCTURE 词法单元：括号、带引号的字符串、原子（NIL/数字/其他）
+_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+
+def extract_bodystructure(meta):
+    """从FETCH响应的元数据中截取 BODYSTRUCTURE 括号表达式
+
+    Args:
+        meta: FETCH响应中非字面量部分的字节串
+
+    Returns:
+        bytes: BODYSTRUCTURE 的括号表达式，不存在时返回 None
+    """
+    index = meta.upper().find(b'BODYSTRUCTURE (')
+    if index < 0:
+        return None
+
+    start = index + len(b'BODYSTRUCTURE ')
+    depth = 0
+    in_quote = False
+    i = start
+    while i < len(meta):
+        char = meta[i:i + 1]
+        if in_quote:
+            if char == b'\\':
+                i += 1
+            elif char == b'"':
+                in_quote = False
+        elif char == b'"':
+            in_quote = True
+        elif char == b'(':
+            depth += 1
+        elif char == b')':
+            depth -= 1
+            if depth == 0:
+                return meta[start:i + 1]
+        i += 1
+    return None
+
+
+def parse_bodystructure(data):
+    """把 BODYSTRUCTURE 表达式解析为嵌套列表
+
+    字符串解码为 str，NIL 解析为 None，其余原子保持为 str。
+    """
+    stack = [[]]
+    pos = 0
+    while pos < len(data):
+        match = _TOKEN_RE.match(data, pos)
+        if not match or match.end() == pos:
+            break
+        pos = match.end()
+        open_paren, close_paren, quoted, atom = match.groups()
+        if open_paren:
+            stack.append([])
+        elif close_paren:
+            if len(stack) < 2:
+                raise ValueError("BODYSTRUCTURE 括号不匹配")
+            item = stack.pop()
+            stack[-1].append(item)
+        elif quoted is not None:
+            stack[-1].append(re.sub(rb'\\(.)', rb'\1', quoted).decode('utf-8', 'replace'))
+        else:
+            stack[-1].append(None if atom.upper() == b'NIL' else atom.decode('ascii', 'replace'))
+
+    if len(stack) != 1 or not stack[0]:
+        raise ValueError("无法解析 BODYSTRUCTURE")
+    return stack[0][0]
+
+
+def _is_attachment(part):
+    """判断单个正文部分是否标记为附件"""
+    # 文本类型的扩展数据中处置信息位于第10个字段，其他类型位于第9个字段
+    for index in (9, 8):
+        if len(part) > index and isinstance(part[index], list) and part[index]:
+            disposition = part[index][0]
+            if isinstance(disposition, str) and disposition.lower() == 'attachment':
+                return True
+    return False
+
+
+def _iter_parts(structure, prefix=''):
+    """深度优先遍历所有非multipart部分，生成 (section, part)"""
+    if structure and isinstance(structure[0], list):
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            section = f"{prefix}.{index}" if prefix else str(index)
+            yield from _iter_parts(child, section)
+    else:
+        # 非multipart邮件的正文在 IMAP 中编号为 1
+        yield (prefix or '1'), structure
+
+
+def find_text_part(structure):
+    """在 BODYSTRUCTURE 中查找用于分类的正文部分
+
+    优先选择非附件的 text/plain，其次 text/html。
+
+    Returns:
+        dict: {'section', 'subtype', 'charset', 'encoding', 'size'}，找不到时返回 None
+    """
+    html_part = None
+    for section, part in _iter_parts(structure):
+        if len(part) < 7 or not isinstance(part[0], str) or not isinstance(part[1], str):
+            continue
+        if part[0].lower() != 'text' or _is_attachment(part):
+            continue
+
+        charset = None
+        if isinstance(part[2], list):
+            params = part[2]
+            for i in range(0, len(params) - 1, 2):
+                if isinstance(params[i], str) and params[i].lower() == 'charset':
+                    charset = params[i + 1]
+
+        info = {
+            'section': section,
+            'subtype': part[1].lower(),
+            'charset': charset,
+            'encoding': (part[5] or '7bit').lower(),
+            'size': int(part[6]) if part[6] and str(part[6]).isdigit() else 0,
+        }
+        if info['subtype'] == 'plain':
+            return info
+        if info['subtype'] == 'html' and html_part is None:
+            html_part = info
+
+    return html_part
@@ -0,0 +1,139 @@
+import imaplib
+import threading
+import zlib
+
+# RFC 4978 COMPRESS 命令
+imaplib.Commands.setdefault('COMPRESS', ('AUTH', 'SELECTED'))
+
+
+class TransferStats:
+    """IMAP连接的传输字节统计
+
+    分别记录压缩前（协议数据）和压缩后（实际网络传输）的字节数，
+    可以被多个连接共享，用于计算压缩节省的流量。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.received_raw = 0   # 解压后收到的字节
+        self.received_wire = 0  # 网络上收到的字节
+        self.sent_raw = 0       # 压缩前发送的字节
+        self.sent_wire = 0      # 网络上发送的字节
+
+    def add_received(self, wire, raw):
+        with self.lock:
+            self.received_wire += wire
+            self.received_raw += raw
+
+    def add_sent(self, wire, raw):
+        with self.lock:
+            self.sent_wire += wire
+            self.sent_raw += raw
+
+    def snapshot(self):
+        """返回当前统计
+
+        Returns:
+            dict: 收发的压缩前/压缩后字节数，以及接收方向的压缩比
+        """
+        with self.lock:
+            return {
+                'received_raw': self.received_raw,
+                'received_wire': self.received_wire,
+                'sent_raw': self.sent_raw,
+                'sent_wire': self.sent_wire,
+                'receive_ratio': self.received_raw / self.received_wire if self.received_wire else 0,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.received_raw = self.received_wire = self.sent_raw = self.sent_wire = 0
+
+
+class DeflateStream:
+    """COMPRESS=DEFLATE 生效后替换 imaplib 连接的读写
+
+    imaplib 通过 self.file.read()/readline() 读取、通过 self.send() 发送，
+    这里在原始套接字之上做原始 DEFLATE（无 zlib 头）的压缩和解压。
+    """
+
+    def __init__(self, sock, stats=None):
+        self.sock = sock
+        self.stats = stats
+        self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        self.decompressor = zlib.decompressobj(-15)
+        self.buffer = bytearray()
+
+    def _fill(self):
+        """从套接字读取并解压一块数据，连接关闭时返回 False"""
+        data = self.sock.recv(65536)
+        if not data:
+            return False
+        plain = self.decompressor.decompress(data)
+        self.buffer += plain
+        if self.stats:
+            self.stats.add_received(len(data), len(plain))
+        return True
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            if not self._fill():
+                break
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, limit=-1):
+        start = 0
+        while True:
+            index = self.buffer.find(b'\n', start)
+            if index >= 0:
+                end = index + 1
+                break
+            if 0 <= limit <= len(self.buffer):
+                end = limit
+                break
+            start = len(self.buffer)
+            if not self._fill():
+                end = len(self.buffer)
+                break
+        if 0 <= limit < end:
+            end = limit
+        line = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return line
+
+    def send(self, data):
+        compressed = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.sock.sendall(compressed)
+        if self.stats:
+            self.stats.add_sent(len(compressed), len(data))
+
+    def close(self):
+        # 套接字由 imaplib 的 shutdown() 关闭
+        self.buffer.clear()
+
+
+def enable_compression(mail, stats=None):
+    """在已登录的连接上协商 COMPRESS=DEFLATE
+
+    Args:
+        mail: 已登录的 imaplib 连接
+        stats: 用于累计传输字节数的 TransferStats
+
+    Returns:
+        bool: 是否已启用压缩；服务器不支持时返回 False
+    """
+    if 'COMPRESS=DEFLATE' not in mail.capabilities:
+        return False
+
+    typ, data = mail._simple_command('COMPRESS', 'DEFLATE')
+    if typ != 'OK':
+        print(f"启用COMPRESS=DEFLATE失败: {data}")
+        return False
+
+    # 之后的数据都经过压缩，替换 imaplib 使用的读写方法
+    stream = DeflateStream(mail.sock, stats)
+    mail.file = stream
+    mail.send = stream.send
+    return True
@@ -0,0 +1,24 @@
+from connection_pool import ConnectionPool
+
+
+class IMAPConnectionPool(ConnectionPool):
+    """有上限的IMAP连接池
+
+    每个连接只在创建时登录（并发送ID命令）一次，归还后可被其他线程复用。
+    借出前对空闲较久的连接执行 NOOP 健康检查，空闲超时的连接会被注销。
+    """
+
+    protocol = "IMAP"
+
+    def _is_healthy(self, mail):
+        try:
+            status, _ = mail.noop()
+            return status == "OK"
+        except Exception:
+            return False
+
+    def _logout(self, mail):
+        try:
+            mail.logout()
+        except Exception:
+            pass
@@ -0,0 +1,244 @@
+import re
+import string
+from collections import Counter, deque
+from cjk_segmenter import HAN_RANGES
+
+# 中日韩字符之间没有空格，每个字符单独作为一个符号；其他连续的字母数字作为一个单词
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_WORD_RE = re.compile(f'[{_CJK}]|[^\\W{_CJK}]+')
+# 使用分词器时连续的汉字作为一段交给分词器，其他部分与 _WORD_RE 相同
+_SEGMENT_RE = re.compile(f'([{HAN_RANGES}]+)|([{_CJK}]|[^\\W{_CJK}]+)')
+
+# ASCII 标点替换为空格后用 str.split() 切分单词，比正则快得多；只有非ASCII单词才交给正则
+_PUNCTUATION_TABLE = str.maketrans({char: ' ' for char in string.punctuation if char != '_'})
+
+
+class KeywordMatcher:
+    """基于 Aho-Corasick 自动机的多关键词匹配器
+
+    由 {分类: 关键词列表} 一次性构建自动机，之后每段文本只需扫描一遍，
+    耗时与关键词数量无关。whole_word 为 True 时以单词为符号构建自动机，
+    只匹配完整的单词（"fee" 不会匹配 "feedback"）；中文等没有空格的文字按字符匹配，
+    提供 CJKSegmenter 时汉字按分词结果匹配（"发票" 不会匹配 "开发票据" 中的 "发票"）。
+    为 False 时以字符为符号，按子串匹配。
+    """
+
+    def __init__(self, category_keywords, whole_word=True, case_sensitive=False, segmenter=None):
+        """构建自动机
+
+        Args:
+            category_keywords: {分类: 关键词列表} 或 {分类: {关键词: 权重}}，列表中关键词的权重为1
+            whole_word: 是否只匹配完整的单词
+            case_sensitive: 是否区分大小写
+            segmenter: 中文分词器（CJKSegmenter），只在 whole_word 为 True 时使用
+        """
+        self.whole_word = whole_word
+        self.case_sensitive = case_sensitive
+        self.segmenter = segmenter
+        self.categories = list(category_keywords)
+        self.category_order = {category: index for index, category in enumerate(self.categories)}
+
+        # 状态0为根；goto[state] 为 {符号: 下一状态}，outputs[state] 为 [(分类, 关键词, 权重)]
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        self.keyword_count = 0
+
+        # 单个单词的关键词另外按单词索引，scores_words() 用单词计数代替逐个扫描
+        self.single_words = {}
+        multi_word_keywords = {}
+
+        for category, keywords in category_keywords.items():
+            if not isinstance(keywords, dict):
+                keywords = {keyword: 1 for keyword in keywords}
+            for keyword, weight in keywords.items():
+                symbols = self._add_keyword(category, keyword, weight)
+                if not symbols:
+                    continue
+                if len(symbols) == 1:
+                    self.single_words.setdefault(symbols[0], []).append((category, keyword, weight))
+                else:
+                    multi_word_keywords.setdefault(category, {})[keyword] = weight
+        self._build_fail_links()
+
+        # 多个单词的关键词（如 "new york"）仍需要按顺序匹配，用只包含它们的自动机处理
+        self.multi_word_matcher = None
+        self.multi_word_starts = set()
+        if whole_word and multi_word_keywords:
+            if self.single_words:
+                self.multi_word_matcher = KeywordMatcher(multi_word_keywords, whole_word, case_sensitive, segmenter)
+            else:
+                self.multi_word_matcher = self
+            self.multi_word_starts = set(self.multi_word_matcher.goto[0])
+
+    def _tokenize(self, text):
+        """把文本转换为自动机的符号序列"""
+        if not self.case_sensitive:
+            text = text.lower()
+        if not self.whole_word:
+            return text
+        words = text.translate(_PUNCTUATION_TABLE).split()
+        if text.isascii():
+            return words
+        return self.split_words(words)
+
+    def keyword_symbols(self, keyword):
+        """返回关键词在自动机中的符号序列（whole_word 时为单词列表）"""
+        return list(self._tokenize(keyword))
+
+    def split_words(self, words):
+        """把非ASCII单词中的中日韩文字拆成单个字符或分词，得到自动机使用的符号"""
+        symbols = []
+        if self.segmenter is None:
+            for word in words:
+                if word.isascii():
+                    symbols.append(word)
+                else:
+                    symbols.extend(_WORD_RE.findall(word))
+            return symbols
+
+        segment = self.segmenter.segment
+        for word in words:
+            if word.isascii():
+                symbols.append(word)
+                continue
+            for han, other in _SEGMENT_RE.findall(word):
+                if han:
+                    symbols.extend(segment(han))
+                else:
+                    symbols.append(other)
+        return symbols
+
+    def _add_keyword(self, category, keyword, weight):
+        """把关键词加入字典树，返回关键词的符号序列"""
+        symbols = self._tokenize(keyword)
+        if not symbols:
+            return symbols
+        state = 0
+        for symbol in symbols:
+            next_state = self.goto[state].get(symbol)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][symbol] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            state = next_state
+        self.outputs[state].append((category, keyword, weight))
+        self.keyword_count += 1
+        return symbols
+
+    def _build_fail_links(self):
+        """按广度优先计算失败链接，并把失败状态的输出合并进来"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for symbol, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and symbol not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(symbol, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        """扫描文本，逐个返回匹配结果
+
+        Yields:
+            tuple: (分类, 关键词, 权重)
+        """
+        if not text:
+            return
+        yield from self._scan(self._tokenize(text))
+
+    def _scan(self, symbols):
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        state = 0
+        for symbol in symbols:
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            if outputs[state]:
+                yield from outputs[state]
+
+    def scores(self, text):
+        """计算各分类的得分（匹配到的关键词权重之和，重复出现时重复计分）
+
+        Returns:
+            dict: {分类: 得分}，只包含得分大于0的分类
+        """
+        scores = {}
+        for category, _, weight in self.iter_matches(text):
+            scores[category] = scores.get(category, 0) + weight
+        return scores
+
+    def scores_words(self, words, split_cjk=True, ignore=None, hits=None):
+        """对已经转为小写、去掉标点并切分好的单词列表计分，省去重复的文本处理
+
+        单词关键词的得分由单词计数直接算出，只有文本中出现了多单词关键词的首个单词时才扫描自动机。
+
+        Args:
+            words: 单词列表，例如 EmailClassifier 分词后的结果
+            split_cjk: 是否需要拆分中日韩文字；单词都是ASCII或已经用 split_words() 拆分过时传 False
+            ignore: 视为不存在的单词集合（如停用词），效果与事先从 words 中删除相同
+            hits: 传入集合时，把匹配到的关键词加入其中
+
+        Returns:
+            dict: {分类: 得分}，与 scores(' '.join(保留的单词)) 相同
+        """
+        if not self.whole_word or self.case_sensitive:
+            if ignore:
+                words = [word for word in words if word not in ignore]
+            scores = {}
+            for category, keyword, weight in self.iter_matches(' '.join(words)):
+                scores[category] = scores.get(category, 0) + weight
+                if hits is not None:
+                    hits.add(keyword)
+            return scores
+
+        symbols = self.split_words(words) if split_cjk else words
+        counts = Counter(symbols)
+        matched = self.single_words.keys() & counts.keys()
+        if ignore:
+            matched -= ignore
+        scores = {}
+        for symbol in matched:
+            count = counts[symbol]
+            for category, keyword, weight in self.single_words[symbol]:
+                scores[category] = scores.get(category, 0) + weight * count
+                if hits is not None:
+                    hits.add(keyword)
+
+        if self.multi_word_matcher:
+            starts = self.multi_word_starts.intersection(counts)
+            if ignore:
+                starts -= ignore
+            if starts:
+                if ignore:
+                    symbols = [symbol for symbol in symbols if symbol not in ignore]
+                for category, keyword, weight in self.multi_word_matcher._scan(symbols):
+                    scores[category] = scores.get(category, 0) + weight
+                    if hits is not None:
+                        hits.add(keyword)
+        return scores
+
+    def best_category(self, text, default=None):
+        """返回得分最高的分类，得分相同时取配置中靠前的分类
+
+        Args:
+            text: 待匹配文本
+            default: 没有匹配到任何关键词时返回的分类
+
+        Returns:
+            str: 分类名称
+        """
+        return self.top_category(self.scores(text), default)
+
+    def top_category(self, scores, default=None):
+        """从 scores() 的结果中选出得分最高的分类，得分相同时取配置中靠前的分类"""
+        if not scores:
+            return default
+        order = self.category_order
+        return max(scores, key=lambda category: (scores[category], -order[category]))
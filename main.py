@@ -1,8 +1,13 @@
 import sys
 import os
+import time
+
+# 启动计时从导入依赖之前开始，统计到主窗口第一次显示为止
+_start_time = time.perf_counter()
+
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QFont, QFontDatabase
-from PyQt6.QtCore import QDir, QCoreApplication, Qt, QStandardPaths
+from PyQt6.QtCore import QDir, QCoreApplication, Qt, QStandardPaths, QTimer
 from gui_pyqt6 import EmailAssistantGUI
 from email_connector import EmailConnector
 from email_classifier import EmailClassifier
@@ -53,7 +58,32 @@ def force_chinese_font_support():
     
     return True
 
+class StartupTimer:
+    """记录启动各阶段的耗时，用于跟踪到首个窗口显示的时间"""
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.last_time = start_time
+        self.stages = []
+
+    def mark(self, stage):
+        """记录从上一阶段结束到现在的耗时"""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last_time))
+        self.last_time = now
+
+    def report(self, final_stage="显示窗口"):
+        """记录最后一个阶段，打印各阶段耗时和总耗时"""
+        self.mark(final_stage)
+        total = time.perf_counter() - self.start_time
+        details = ', '.join(f"{stage} {elapsed:.2f}秒" for stage, elapsed in self.stages)
+        print(f"启动耗时: 首个窗口显示用时 {total:.2f}秒 ({details})")
+        return total
+
 def main():
+    startup_timer = StartupTimer(_start_time)
+    startup_timer.mark("导入模块")
+
     # 加载配置
     config = load_config()
     
@@ -68,6 +98,8 @@ def main():
     # 从配置导入默认模板
     template_manager.import_from_config(config)
     
+    startup_timer.mark("初始化组件")
+
     # 初始化异步处理器
     async_processor = AsyncEmailProcessor(
         email_connector=email_connector,
@@ -137,7 +169,11 @@ def main():
         email_analytics=email_analytics,
         async_processor=async_processor
     )
+    startup_timer.mark("创建窗口")
     gui.show()
+
+    # 事件循环开始处理后窗口才真正绘制出来，此时再统计总耗时
+    QTimer.singleShot(0, startup_timer.report)
     
     # 运行应用
     exit_code = app.exec()
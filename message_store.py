@@ -0,0 +1,226 @@
+import sqlite3
+import threading
+import time
+import zlib
+
+# 单条 SQL 中 IN (...) 参数的最大数量，低于 SQLite 的默认上限 999
+_MAX_SQL_PARAMS = 500
+
+
+class MessageStore:
+    """本地原始邮件存储
+
+    以 (账号, 文件夹, UIDVALIDITY, UID) 为键保存 zlib 压缩后的 RFC822 原始字节，
+    EmailConnector 在访问服务器前先查询这里。总大小超过上限时按最近访问时间淘汰。
+    只获取了列表数据（FETCH_MODE 为 headers/text）的邮件以同样的键保存为不完整的记录，
+    kind 记录数据的类型；之后保存的完整原始邮件会替换不完整的记录，反之则不会。
+    """
+
+    def __init__(self, db_path="message_store.db", max_bytes=500 * 1024 * 1024):
+        """初始化邮件存储
+
+        Args:
+            db_path: 数据库路径
+            max_bytes: 压缩后数据的总大小上限（字节），0 表示不限制
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = 0
+        self.initialize_db()
+
+    def initialize_db(self):
+        """初始化数据库"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                account TEXT,
+                folder TEXT,
+                uidvalidity INTEGER,
+                uid INTEGER,
+                data BLOB,
+                size INTEGER,
+                raw_size INTEGER,
+                last_access REAL,
+                kind TEXT DEFAULT 'rfc822',
+                PRIMARY KEY (account, folder, uidvalidity, uid)
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_last_access ON messages (last_access)")
+            # 兼容没有 kind 列的旧数据库，旧记录都是完整的原始邮件
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(messages)")]
+            if 'kind' not in columns:
+                conn.execute("ALTER TABLE messages ADD COLUMN kind TEXT DEFAULT 'rfc822'")
+            conn.commit()
+            self.total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+            # 上限可能比上次运行时调小了
+            self._evict(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_many(self, account, folder, uidvalidity, uids, kind='rfc822'):
+        """批量读取已保存的原始邮件，并更新它们的访问时间
+
+        Args:
+            account: 邮箱账号
+            folder: 文件夹名称
+            uidvalidity: 文件夹的 UIDVALIDITY
+            uids: UID列表
+            kind: 数据类型，'rfc822' 为完整的原始邮件，其他值为保存时指定的不完整记录类型
+
+        Returns:
+            dict: {UID字符串: 原始字节}，只包含已保存的该类型的邮件
+        """
+        uids = [int(uid) for uid in uids]
+        if uidvalidity is None or not uids:
+            return {}
+
+        found = {}
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                for start in range(0, len(uids), _MAX_SQL_PARAMS):
+                    chunk = uids[start:start + _MAX_SQL_PARAMS]
+                    placeholders = ','.join('?' * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT uid, data FROM messages WHERE account = ? AND folder = ? "
+                        f"AND uidvalidity = ? AND kind = ? AND uid IN ({placeholders})",
+                        [account, folder, uidvalidity, kind] + chunk
+                    ).fetchall()
+                    for uid, data in rows:
+                        found[uid] = data
+
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE messages SET last_access = ? WHERE account = ? AND folder = ? "
+                        "AND uidvalidity = ? AND uid = ?",
+                        [(now, account, folder, uidvalidity, uid) for uid in found]
+                    )
+                    conn.commit()
+            finally:
+                conn.close()
+
+        messages = {}
+        for uid, data in found.items():
+            try:
+                messages[str(uid)] = zlib.decompress(data)
+            except zlib.error as e:
+                print(f"本地邮件 {folder}/{uid} 已损坏: {e}")
+        return messages
+
+    def get_uids(self, account, folder, uidvalidity, kinds=('rfc822',), max_uid=None):
+        """列出文件夹中已保存的邮件UID，不更新访问时间
+
+        Args:
+            account: 邮箱账号
+            folder: 文件夹名称
+            uidvalidity: 文件夹的 UIDVALIDITY
+            kinds: 包括的数据类型
+            max_uid: 只列出不大于该值的UID，None 表示不限制
+
+        Returns:
+            list: 从小到大排列的UID（整数）
+        """
+        kinds = list(kinds)
+        if uidvalidity is None or not kinds:
+            return []
+
+        sql = (f"SELECT uid FROM messages WHERE account = ? AND folder = ? AND uidvalidity = ? "
+               f"AND kind IN ({','.join('?' * len(kinds))})")
+        params = [account, folder, uidvalidity] + kinds
+        if max_uid is not None:
+            sql += " AND uid <= ?"
+            params.append(max_uid)
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                return [row[0] for row in conn.execute(sql + " ORDER BY uid", params)]
+            finally:
+                conn.close()
+
+    def put_many(self, account, folder, uidvalidity, messages, kind='rfc822'):
+        """批量保存原始邮件，超出大小上限时淘汰最久未访问的邮件
+
+        Args:
+            account: 邮箱账号
+            folder: 文件夹名称
+            uidvalidity: 文件夹的 UIDVALIDITY
+            messages: {UID: 原始字节}
+            kind: 数据类型，不完整的记录不会替换已保存的完整原始邮件
+        """
+        if uidvalidity is None or not messages:
+            return
+
+        now = time.time()
+        rows = []
+        for uid, raw in messages.items():
+            data = zlib.compress(raw)
+            rows.append((account, folder, uidvalidity, int(uid), data, len(data), len(raw), now, kind))
+
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                # 覆盖已存在的邮件时先扣除旧数据的大小
+                kept = []
+                for row in rows:
+                    old = conn.execute(
+                        "SELECT size, kind FROM messages WHERE account = ? AND folder = ? AND uidvalidity = ? AND uid = ?",
+                        row[:4]
+                    ).fetchone()
+                    if old and kind != 'rfc822' and old[1] == 'rfc822':
+                        continue
+                    if old:
+                        self.total_bytes -= old[0]
+                    kept.append(row)
+                rows = kept
+                conn.executemany('''
+                INSERT OR REPLACE INTO messages (account, folder, uidvalidity, uid, data, size, raw_size, last_access, kind)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                self.total_bytes += sum(row[5] for row in rows)
+                self._evict(conn)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def purge_folder(self, account, folder, keep_uidvalidity=None):
+        """删除文件夹中 UIDVALIDITY 已失效的邮件
+
+        Args:
+            account: 邮箱账号
+            folder: 文件夹名称
+            keep_uidvalidity: 需要保留的 UIDVALIDITY，为 None 时删除该文件夹的所有邮件
+        """
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                if keep_uidvalidity is None:
+                    conn.execute("DELETE FROM messages WHERE account = ? AND folder = ?", (account, folder))
+                else:
+                    conn.execute("DELETE FROM messages WHERE account = ? AND folder = ? AND uidvalidity != ?",
+                                 (account, folder, keep_uidvalidity))
+                self.total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _evict(self, conn):
+        """按最近访问时间淘汰邮件，直到总大小不超过上限"""
+        if not self.max_bytes or self.total_bytes <= self.max_bytes:
+            return
+
+        excess = self.total_bytes - self.max_bytes
+        victims = []
+        freed = 0
+        for rowid, size in conn.execute("SELECT rowid, size FROM messages ORDER BY last_access"):
+            victims.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+
+        conn.executemany("DELETE FROM messages WHERE rowid = ?", victims)
+        self.total_bytes -= freed
+        print(f"本地邮件存储超过上限，已淘汰 {len(victims)} 封邮件")
@@ -0,0 +1,186 @@
+import base64
+import io
+import os
+import re
+import smtplib
+import uuid
+from email import encoders
+from email.generator import BytesGenerator
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# 每次从附件文件读取的字节数：57字节编码后正好是一行76个字符，读取量取57的倍数保证每块都是完整的行
+_READ_SIZE = 57 * 4096
+
+# DATA 中以 "." 开头的行需要再加一个 "."（RFC 5321 4.5.2）
+_LEADING_DOT = re.compile(rb'(?m)^\.')
+
+
+class StreamingMessage:
+    """附件从磁盘流式读取的邮件
+
+    邮件头、正文和内存中的附件预先生成为"骨架"，磁盘上的附件在骨架中只占一个占位符。
+    发送时逐块读取附件文件并进行 base64 编码，直接写入SMTP连接，
+    无论附件多大，内存中只有一块数据。
+    """
+
+    def __init__(self, skeleton, files, sender, recipients):
+        """初始化邮件
+
+        Args:
+            skeleton: 以 CRLF 换行的邮件字节，磁盘附件的内容以占位符代替
+            files: [(占位符, 文件路径)]，按在邮件中出现的顺序排列
+            sender: 发件人地址
+            recipients: 收件人地址列表
+        """
+        self.skeleton = skeleton
+        self.files = [(marker, path) for marker, path in files]
+        self.sender = sender
+        self.recipients = list(recipients)
+
+    @classmethod
+    def build(cls, sender, recipient, subject, body, attachments):
+        """创建邮件
+
+        Args:
+            sender: 发件人地址
+            recipient: 收件人地址
+            subject: 主题
+            body: 正文
+            attachments: 附件列表，每项为 {'filename', 'path'}（从磁盘读取）或 {'filename', 'data'}
+        """
+        msg = MIMEMultipart()
+        msg['From'] = sender
+        msg['To'] = recipient
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+
+        token = uuid.uuid4().hex
+        files = []
+        for attachment in attachments:
+            filename = attachment['filename']
+            if attachment.get('path'):
+                part = MIMEApplication(b'', _encoder=encoders.encode_noop)
+                marker = f"@@ATTACHMENT-{token}-{len(files)}@@"
+                part.set_payload(marker)
+                part['Content-Transfer-Encoding'] = 'base64'
+                files.append((marker, attachment['path']))
+            else:
+                part = MIMEApplication(attachment['data'])
+            # 非ASCII文件名按 RFC 2231 编码
+            name = filename if filename.isascii() else ('utf-8', '', filename)
+            part.set_param('name', name)
+            part.add_header('Content-Disposition', 'attachment', filename=name)
+            msg.attach(part)
+
+        buffer = io.BytesIO()
+        BytesGenerator(buffer, mangle_from_=False).flatten(msg, linesep='\r\n')
+        return cls(buffer.getvalue(), files, sender, [recipient])
+
+    @property
+    def size(self):
+        """发送的字节数（不计加点）"""
+        size = len(self.skeleton)
+        for marker, path in self.files:
+            length = os.path.getsize(path)
+            # base64 每57字节编码为76个字符加 CRLF，最后一行不带 CRLF（骨架中占位符后已有换行）
+            lines = (length + 56) // 57
+            size += (length + 2) // 3 * 4 + max(lines - 1, 0) * 2 - len(marker)
+        return size
+
+    def check_files(self):
+        """检查附件文件是否都存在，在开始发送前发现错误
+
+        Raises:
+            FileNotFoundError: 附件文件不存在
+        """
+        for _, path in self.files:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"附件文件不存在: {path}")
+
+    def chunks(self):
+        """按顺序生成 DATA 命令发送的数据（已加点，不含结尾的 "."），以 CRLF 结尾"""
+        position = 0
+        for marker, path in self.files:
+            index = self.skeleton.index(marker.encode('ascii'), position)
+            yield _LEADING_DOT.sub(b'..', self.skeleton[position:index])
+            yield from _encode_file(path)
+            position = index + len(marker)
+        tail = _LEADING_DOT.sub(b'..', self.skeleton[position:])
+        if not tail.endswith(b'\r\n'):
+            tail += b'\r\n'
+        yield tail
+
+
+def _encode_file(path):
+    """逐块读取文件并编码为 base64 行，最后一行不带 CRLF"""
+    with open(path, 'rb') as f:
+        previous = None
+        while True:
+            data = f.read(_READ_SIZE)
+            if not data:
+                break
+            if previous is not None:
+                yield previous + b'\r\n'
+            previous = base64.encodebytes(data).replace(b'\n', b'\r\n')[:-2]
+        if previous is not None:
+            yield previous
+
+
+def send_streaming(server, message):
+    """在已登录的SMTP连接上发送 StreamingMessage，错误处理与 smtplib.SMTP.sendmail() 相同
+
+    Args:
+        server: smtplib.SMTP 连接
+        message: StreamingMessage
+
+    Returns:
+        dict: 被拒绝的收件人 {地址: (响应码, 响应)}，部分收件人被拒绝时不为空
+    """
+    server.ehlo_or_helo_if_needed()
+    options = []
+    if server.does_esmtp and server.has_extn('size'):
+        options.append(f"SIZE={message.size}")
+
+    code, response = server.mail(message.sender, options)
+    if code != 250:
+        _abort(server, code)
+        raise smtplib.SMTPSenderRefused(code, response, message.sender)
+
+    refused = {}
+    for recipient in message.recipients:
+        code, response = server.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, response)
+        if code == 421:
+            server.close()
+            raise smtplib.SMTPRecipientsRefused(refused)
+    if len(refused) == len(message.recipients):
+        _abort(server, code)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    server.putcmd("data")
+    code, response = server.getreply()
+    if code != 354:
+        _abort(server, code)
+        raise smtplib.SMTPDataError(code, response)
+    for chunk in message.chunks():
+        server.send(chunk)
+    server.send(b".\r\n")
+    code, response = server.getreply()
+    if code != 250:
+        _abort(server, code)
+        raise smtplib.SMTPDataError(code, response)
+    return refused
+
+
+def _abort(server, code):
+    """命令被拒绝后结束本次邮件事务，421 表示服务器即将关闭连接"""
+    if code == 421:
+        server.close()
+        return
+    try:
+        server.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
@@ -0,0 +1,422 @@
+import json
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from connection_pool import PoolTimeout
+
+# 单条 SQL 中 IN (...) 参数的最大数量，低于 SQLite 的默认上限 999
+_MAX_SQL_PARAMS = 500
+
+# 本进程中已恢复过的发件箱数据库。修改设置后会创建新的发送线程，此时 sending 状态的邮件
+# 可能仍在由之前的线程发送，不能再次恢复，否则会重复发送
+_recovered_paths = set()
+_recovered_lock = threading.Lock()
+
+
+def is_temporary_error(error):
+    """发送失败是否是暂时性的（稍后重试可能成功）
+
+    SMTP 4xx 响应（包括 421 服务不可用、450/451/452 限流）、连接断开和网络错误是暂时性的，
+    5xx 响应（收件人不存在、邮件被拒收）重试也不会成功。
+    等待SMTP连接池的空闲连接超时也是暂时性的。
+    """
+    if isinstance(error, PoolTimeout):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, (FileNotFoundError, IsADirectoryError, PermissionError)):
+        # 附件文件已被删除或无法读取
+        return False
+    return isinstance(error, (smtplib.SMTPServerDisconnected, OSError))
+
+
+class TokenBucket:
+    """令牌桶限速器
+
+    每分钟补充 rate 个令牌，最多积累 burst 个：短时间内最多连续发送 burst 封邮件，
+    之后按 rate 的速度发送。
+    """
+
+    def __init__(self, rate, burst):
+        """初始化令牌桶
+
+        Args:
+            rate: 每分钟发送的邮件数量，0 表示不限速
+            burst: 最多连续发送的邮件数量
+        """
+        self.rate = rate / 60.0
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """取走一个令牌并返回 0；令牌不足时不取走，返回需要等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, stop_event=None):
+        """等待并取走一个令牌
+
+        Args:
+            stop_event: 等待期间被设置时放弃等待
+
+        Returns:
+            bool: 是否取得令牌
+        """
+        if not self.rate:
+            return True
+        while True:
+            wait = self._reserve()
+            if not wait:
+                return True
+            if stop_event is None:
+                time.sleep(wait)
+            elif stop_event.wait(wait):
+                return False
+
+
+# 每个SMTP服务器共用一个令牌桶，修改设置后重新创建的发送器沿用原来的限速状态
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider, rate, burst):
+    """获取SMTP服务器的令牌桶，限速参数修改后重新创建"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(provider)
+        if limiter is None or limiter.rate != rate / 60.0 or limiter.burst != max(1, burst):
+            limiter = _rate_limiters[provider] = TokenBucket(rate, burst)
+        return limiter
+
+
+class Outbox:
+    """发件箱
+
+    待发送的邮件以原始字节保存在 SQLite 中，状态为 pending（等待发送）、sending（正在发送）、
+    sent（已发送）或 failed（无法发送）。程序在发送过程中退出时，sending 状态的邮件
+    在下次启动后重新发送（服务器已接收但尚未记录为已发送的邮件可能重复发送一次）。
+    """
+
+    def __init__(self, db_path="outbox.db"):
+        """初始化发件箱
+
+        Args:
+            db_path: 数据库路径
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.initialize_db()
+
+    def initialize_db(self):
+        """初始化数据库"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider TEXT,
+                sender TEXT,
+                recipients TEXT,
+                message BLOB,
+                files TEXT,
+                status TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                next_attempt REAL,
+                last_error TEXT,
+                created_at REAL,
+                sent_at REAL
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, next_attempt)")
+
+            # 兼容没有 files 列的旧数据库
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(outbox)")]
+            if 'files' not in columns:
+                conn.execute("ALTER TABLE outbox ADD COLUMN files TEXT")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def enqueue(self, provider, sender, recipients, message, files=None):
+        """加入一封待发送的邮件
+
+        Args:
+            provider: SMTP服务器
+            sender: 发件人地址
+            recipients: 收件人地址列表
+            message: 邮件原始字节（以 CRLF 换行）
+            files: 从磁盘读取的附件 [(占位符, 文件路径)]，此时 message 为 StreamingMessage 的骨架，
+                附件文件在发送完成前需要保留
+
+        Returns:
+            int: 发件箱中的邮件ID
+        """
+        now = time.time()
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.execute(
+                    "INSERT INTO outbox (provider, sender, recipients, message, files, next_attempt, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (provider, sender, json.dumps(recipients), message,
+                     json.dumps(files, ensure_ascii=False) if files else None, now, now)
+                )
+                conn.commit()
+                return cursor.lastrowid
+            finally:
+                conn.close()
+
+    def recover(self):
+        """把上次退出时仍在发送的邮件恢复为等待发送，每个进程只恢复一次
+
+        Returns:
+            int: 恢复的邮件数量
+        """
+        path = os.path.abspath(self.db_path)
+        with _recovered_lock:
+            if path in _recovered_paths:
+                return 0
+            _recovered_paths.add(path)
+
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                count = conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'").rowcount
+                conn.commit()
+                return count
+            finally:
+                conn.close()
+
+    def claim_due(self, limit=20, provider=None):
+        """取出已到发送时间的邮件并标记为正在发送
+
+        Args:
+            limit: 最多取出的邮件数量
+            provider: 只取出该SMTP服务器的邮件，None 表示所有服务器
+
+        Returns:
+            list: [{'id', 'provider', 'sender', 'recipients', 'message', 'files', 'attempts'}]，按加入顺序排列
+        """
+        query = ("SELECT id, provider, sender, recipients, message, files, attempts FROM outbox "
+                 "WHERE status = 'pending' AND next_attempt <= ?")
+        params = [time.time()]
+        if provider is not None:
+            query += " AND provider = ?"
+            params.append(provider)
+        query += " ORDER BY next_attempt, id LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                rows = conn.execute(query, params).fetchall()
+                conn.executemany("UPDATE outbox SET status = 'sending' WHERE id = ?", [(row[0],) for row in rows])
+                conn.commit()
+            finally:
+                conn.close()
+        return [
+            {'id': row[0], 'provider': row[1], 'sender': row[2], 'recipients': json.loads(row[3]),
+             'message': row[4], 'files': json.loads(row[5]) if row[5] else None, 'attempts': row[6]}
+            for row in rows
+        ]
+
+    def release(self, entry_ids):
+        """把取出后未发送的邮件放回等待发送"""
+        self._update(entry_ids, "status = 'pending'")
+
+    def mark_sent(self, entry_id):
+        """标记邮件已发送，不再保留邮件内容"""
+        self._update([entry_id], "status = 'sent', message = NULL, last_error = NULL, sent_at = ?", time.time())
+
+    def mark_retry(self, entry_id, error, delay):
+        """记录一次失败，delay 秒后重新发送"""
+        self._update([entry_id], "status = 'pending', attempts = attempts + 1, last_error = ?, next_attempt = ?",
+                     str(error), time.time() + delay)
+
+    def mark_failed(self, entry_id, error):
+        """标记邮件无法发送"""
+        self._update([entry_id], "status = 'failed', attempts = attempts + 1, last_error = ?", str(error))
+
+    def retry_failed(self):
+        """把无法发送的邮件重新加入发送队列
+
+        Returns:
+            int: 重新加入的邮件数量
+        """
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                count = conn.execute(
+                    "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt = ? WHERE status = 'failed'",
+                    (time.time(),)
+                ).rowcount
+                conn.commit()
+                return count
+            finally:
+                conn.close()
+
+    def get_failed(self):
+        """读取无法发送的邮件
+
+        Returns:
+            list: [{'id', 'recipients', 'attempts', 'last_error', 'created_at'}]
+        """
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                rows = conn.execute(
+                    "SELECT id, recipients, attempts, last_error, created_at FROM outbox "
+                    "WHERE status = 'failed' ORDER BY id"
+                ).fetchall()
+            finally:
+                conn.close()
+        return [
+            {'id': row[0], 'recipients': json.loads(row[1]), 'attempts': row[2],
+             'last_error': row[3], 'created_at': row[4]}
+            for row in rows
+        ]
+
+    def counts(self):
+        """各状态的邮件数量
+
+        Returns:
+            dict: {状态: 数量}
+        """
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            finally:
+                conn.close()
+
+    def next_due(self):
+        """最早一封等待发送的邮件的发送时间，没有时返回 None"""
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                return conn.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()[0]
+            finally:
+                conn.close()
+
+    def purge_sent(self, older_than):
+        """删除发送时间早于 older_than 秒之前的已发送记录"""
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (time.time() - older_than,))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _update(self, entry_ids, assignments, *values):
+        entry_ids = list(entry_ids)
+        if not entry_ids:
+            return
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                for start in range(0, len(entry_ids), _MAX_SQL_PARAMS):
+                    chunk = entry_ids[start:start + _MAX_SQL_PARAMS]
+                    placeholders = ','.join('?' * len(chunk))
+                    conn.execute(f"UPDATE outbox SET {assignments} WHERE id IN ({placeholders})",
+                                 list(values) + chunk)
+                conn.commit()
+            finally:
+                conn.close()
+
+
+class OutboxSender(threading.Thread):
+    """发件箱的后台发送线程
+
+    按加入顺序发送到期的邮件，每封邮件发送前从该SMTP服务器的令牌桶取得令牌。
+    暂时性错误按指数退避重试，超过最大次数或遇到永久性错误时标记为无法发送。
+    """
+
+    def __init__(self, outbox, send_raw, provider=None, max_attempts=8, retry_base_delay=30,
+                 retry_max_delay=3600, poll_interval=30, keep_sent_days=7):
+        """初始化发送线程
+
+        Args:
+            outbox: 发件箱
+            send_raw: 发送原始邮件的函数，参数为 (发件人, 收件人列表, 原始字节, stop_event, 附件文件)，
+                等待限速时被取消返回 False
+            provider: 只发送该SMTP服务器的邮件，None 表示所有服务器
+            max_attempts: 最多尝试发送的次数
+            retry_base_delay: 第一次重试前的等待时间（秒），之后每次加倍
+            retry_max_delay: 重试等待时间的上限（秒）
+            poll_interval: 没有新邮件加入时检查发件箱的间隔（秒）
+            keep_sent_days: 已发送记录的保留天数
+        """
+        super().__init__(name="OutboxSender", daemon=True)
+        self.outbox = outbox
+        self.send_raw = send_raw
+        self.provider = provider
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.poll_interval = poll_interval
+        self.keep_sent_days = keep_sent_days
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+
+    def run(self):
+        recovered = self.outbox.recover()
+        if recovered:
+            print(f"发件箱中有 {recovered} 封邮件在上次退出时未发送完成，重新发送")
+        self.outbox.purge_sent(self.keep_sent_days * 86400)
+
+        while not self.stop_event.is_set():
+            entries = self.outbox.claim_due(provider=self.provider)
+            if not entries:
+                next_due = self.outbox.next_due()
+                timeout = self.poll_interval if next_due is None else \
+                    min(self.poll_interval, max(0, next_due - time.time()))
+                self.wake_event.wait(timeout)
+                self.wake_event.clear()
+                continue
+
+            for index, entry in enumerate(entries):
+                if self.stop_event.is_set() or not self._deliver(entry):
+                    self.outbox.release([e['id'] for e in entries[index:]])
+                    break
+
+    def _deliver(self, entry):
+        """发送一封邮件并记录结果，等待限速时被取消返回 False"""
+        try:
+            if not self.send_raw(entry['sender'], entry['recipients'], entry['message'],
+                                 self.stop_event, entry['files']):
+                return False
+        except Exception as e:
+            attempts = entry['attempts'] + 1
+            if is_temporary_error(e) and attempts < self.max_attempts:
+                delay = min(self.retry_base_delay * 2 ** (attempts - 1), self.retry_max_delay)
+                print(f"发件箱邮件 {entry['id']} 发送失败: {e}，{delay} 秒后第 {attempts + 1} 次尝试")
+                self.outbox.mark_retry(entry['id'], e, delay)
+            else:
+                print(f"发件箱邮件 {entry['id']} 无法发送: {e}")
+                self.outbox.mark_failed(entry['id'], e)
+            return True
+        self.outbox.mark_sent(entry['id'])
+        return True
+
+    def wake(self):
+        """有新邮件加入时立即检查发件箱"""
+        self.wake_event.set()
+
+    def stop(self, timeout=30):
+        """停止发送线程，正在发送的邮件会发送完毕"""
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
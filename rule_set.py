@@ -0,0 +1,162 @@
+import datetime
+import json
+import os
+import threading
+from keyword_matcher import KeywordMatcher
+from cjk_segmenter import CJKSegmenter
+from classification_cache import rules_snapshot, rules_version
+
+
+def load_rules_file(path):
+    """读取分类规则文件
+
+    文件为 JSON，格式为 {"revision": 修订号, "default_category": 默认分类,
+    "categories": {分类: 关键词列表或 {关键词: 权重}}}，分类按文件中的顺序排列（得分相同时取靠前的分类）。
+
+    Args:
+        path: 规则文件路径
+
+    Returns:
+        tuple: (分类关键词, 默认分类)，默认分类未指定时为 None；文件不存在时返回 None
+
+    Raises:
+        ValueError: 文件格式错误
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    categories = data.get('categories') if isinstance(data, dict) else None
+    if not isinstance(categories, dict):
+        raise ValueError("规则文件缺少 categories")
+    for category, keywords in categories.items():
+        # 字符串也可以迭代，不检查的话会被当作逐个字符的关键词
+        if not isinstance(keywords, (list, dict)):
+            raise ValueError(f"分类 {category} 的关键词应为列表或 {{关键词: 权重}}，而不是 {type(keywords).__name__}")
+        if not all(isinstance(keyword, str) for keyword in keywords):
+            raise ValueError(f"分类 {category} 的关键词必须是字符串")
+    return categories, data.get('default_category')
+
+
+def save_rules_file(path, category_keywords, default_category):
+    """保存分类规则文件，每次保存时修订号加1
+
+    先写临时文件再替换，监听线程不会读到写了一半的文件。
+
+    Returns:
+        int: 新的修订号
+    """
+    revision = 0
+    try:
+        with open(path, encoding='utf-8') as f:
+            revision = int(json.load(f).get('revision', 0))
+    except (OSError, ValueError, AttributeError):
+        pass
+    data = {
+        'revision': revision + 1,
+        'updated_at': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'default_category': default_category,
+        'categories': category_keywords,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return data['revision']
+
+
+def file_signature(path):
+    """文件的修改时间和大小，文件不存在时返回 None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class RuleSet:
+    """编译好的一组分类规则
+
+    创建后不再修改：规则更新时构建新的 RuleSet 再整体替换，正在使用旧规则的分类调用不受影响。
+    """
+
+    def __init__(self, category_keywords, default_category, whole_word=True,
+                 cjk_segmentation='dict', cjk_dict_path=None, source=None):
+        """编译规则
+
+        Args:
+            category_keywords: {分类: 关键词列表} 或 {分类: {关键词: 权重}}
+            default_category: 没有匹配到关键词时的分类
+            whole_word: 是否只匹配完整的单词
+            cjk_segmentation: 中文切分方式，"dict" 按词典分词，"char" 按单个汉字匹配
+            cjk_dict_path: 分词词典路径
+            source: 规则来源（规则文件路径，来自配置时为 None）
+        """
+        self.category_keywords = category_keywords
+        self.default_category = default_category
+        self.whole_word = whole_word
+        self.source = source
+
+        self.segmenter = None
+        if whole_word and cjk_segmentation == 'dict':
+            self.segmenter = CJKSegmenter(cjk_dict_path, user_words=[
+                keyword for keywords in category_keywords.values() for keyword in keywords
+            ])
+        tokenizer = f"dict:{self.segmenter.signature}" if self.segmenter else 'char'
+
+        self.keyword_matcher = KeywordMatcher(category_keywords, whole_word=whole_word, segmenter=self.segmenter)
+        self.snapshot = rules_snapshot(category_keywords, default_category, whole_word, tokenizer)
+        self.version = rules_version(self.snapshot)
+
+    @property
+    def categories(self):
+        """所有分类（包括默认分类）"""
+        categories = list(self.category_keywords)
+        if self.default_category not in categories:
+            categories.append(self.default_category)
+        return categories
+
+    def close(self):
+        """关闭分词词典"""
+        if self.segmenter:
+            self.segmenter.close()
+
+
+class RulesWatcher(threading.Thread):
+    """分类规则文件的监听线程
+
+    定期检查文件的修改时间和大小，变化后调用 on_change。编译新规则也在该线程中完成，
+    分类线程在此期间继续使用旧规则。
+    """
+
+    def __init__(self, path, on_change, interval=5):
+        """初始化监听线程
+
+        Args:
+            path: 规则文件路径
+            on_change: 文件变化（包括新建和删除）后调用的函数
+            interval: 检查间隔（秒）
+        """
+        super().__init__(name="RulesWatcher", daemon=True)
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.signature = file_signature(path)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            signature = file_signature(self.path)
+            if signature == self.signature:
+                continue
+            self.signature = signature
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"重新加载分类规则出错: {e}")
+
+    def stop(self):
+        """停止监听"""
+        self.stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(self.interval + 1)
@@ -0,0 +1,232 @@
+import datetime
+import re
+
+# IMAP 日期格式使用英文月份缩写，不能依赖本地化的 strftime('%b')
+_MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# 字面量的开头 "{字节数}\r\n"
+_LITERAL = re.compile(rb'\{(\d+)\}\r\n')
+
+
+def _imap_date(value):
+    """把 date/datetime 转换为 IMAP SEARCH 使用的 dd-Mon-yyyy 格式"""
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if not isinstance(value, datetime.date):
+        raise TypeError(f"日期条件需要 date 或 datetime，而不是 {type(value).__name__}")
+    return f"{value.day:02d}-{_MONTHS[value.month - 1]}-{value.year}"
+
+
+def _quote(value):
+    """把字符串转换为 IMAP 带引号的字符串
+
+    带引号的字符串只能包含7位字符（RFC 3501 4.3），非ASCII字符串转换为字面量 "{字节数}\r\n内容"
+    """
+    value = str(value)
+    if '\r' in value or '\n' in value:
+        raise ValueError("搜索条件不能包含换行符")
+    if not value.isascii():
+        return f"{{{len(value.encode('utf-8'))}}}\r\n{value}"
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class SearchQuery:
+    """IMAP SEARCH 条件构造器
+
+    多个条件之间为“与”关系，可以用 or_()、not_() 组合，例如最近3天的未读邮件：
+
+        SearchQuery().unseen().since(datetime.date.today() - datetime.timedelta(days=2))
+
+    传给 EmailConnector.fetch_emails() 等方法的 search_criteria 参数后由服务器完成筛选，
+    只有匹配的邮件会被下载。包含非 ASCII 字符时自动使用 CHARSET UTF-8，并以字面量发送，
+    需要用 uid_search() 执行。
+    """
+
+    def __init__(self):
+        self.terms = []
+
+    def since(self, date):
+        """收件日期不早于 date"""
+        return self._add(f"SINCE {_imap_date(date)}")
+
+    def before(self, date):
+        """收件日期早于 date"""
+        return self._add(f"BEFORE {_imap_date(date)}")
+
+    def on(self, date):
+        """收件日期为 date"""
+        return self._add(f"ON {_imap_date(date)}")
+
+    def from_(self, address):
+        """发件人包含 address"""
+        return self._add(f"FROM {_quote(address)}")
+
+    def to(self, address):
+        """收件人包含 address"""
+        return self._add(f"TO {_quote(address)}")
+
+    def subject(self, text):
+        """主题包含 text"""
+        return self._add(f"SUBJECT {_quote(text)}")
+
+    def text(self, text):
+        """头部或正文包含 text"""
+        return self._add(f"TEXT {_quote(text)}")
+
+    def unseen(self):
+        """未读邮件"""
+        return self._add("UNSEEN")
+
+    def seen(self):
+        """已读邮件"""
+        return self._add("SEEN")
+
+    def flagged(self):
+        """已标记（重要）的邮件"""
+        return self._add("FLAGGED")
+
+    def answered(self):
+        """已回复的邮件"""
+        return self._add("ANSWERED")
+
+    def unanswered(self):
+        """未回复的邮件"""
+        return self._add("UNANSWERED")
+
+    def larger(self, size):
+        """大小超过 size 字节"""
+        return self._add(f"LARGER {int(size)}")
+
+    def smaller(self, size):
+        """大小小于 size 字节"""
+        return self._add(f"SMALLER {int(size)}")
+
+    def keyword(self, flag):
+        """带有自定义标记 flag"""
+        return self._add(f"KEYWORD {self._flag(flag)}")
+
+    def unkeyword(self, flag):
+        """不带自定义标记 flag"""
+        return self._add(f"UNKEYWORD {self._flag(flag)}")
+
+    def uid(self, message_set):
+        """UID 在 message_set（如 "100:*"）范围内"""
+        return self._add(f"UID {message_set}")
+
+    def or_(self, *queries):
+        """满足任意一个子条件；IMAP 的 OR 只接受两个参数，多个时嵌套组合"""
+        if len(queries) < 2:
+            raise ValueError("or_() 至少需要两个条件")
+        criteria = [query._criteria() for query in queries]
+        combined = criteria[-1]
+        for term in reversed(criteria[:-1]):
+            combined = f"OR {term} {combined}"
+        return self._add(combined)
+
+    def not_(self, query):
+        """不满足子条件"""
+        return self._add(f"NOT {query._criteria()}")
+
+    def is_empty(self):
+        """是否没有任何条件（相当于 ALL）"""
+        return not self.terms
+
+    def build(self):
+        """生成 UID SEARCH 的参数
+
+        Returns:
+            tuple: (charset, criteria)，criteria 只含 ASCII 时为 str，
+                否则为 UTF-8 编码的 bytes，其中的非ASCII字符串为字面量
+        """
+        criteria = ' '.join(self.terms) if self.terms else 'ALL'
+        if criteria.isascii():
+            return None, criteria
+        return 'UTF-8', criteria.encode('utf-8')
+
+    def _criteria(self):
+        """作为 OR/NOT 的参数时，多个条件需要用括号括起来"""
+        if not self.terms:
+            return 'ALL'
+        if len(self.terms) == 1:
+            return self.terms[0]
+        return f"({' '.join(self.terms)})"
+
+    def _flag(self, flag):
+        flag = str(flag)
+        if not flag or any(char in flag for char in ' ()"{%*\\]'):
+            raise ValueError(f"无效的邮件标记: {flag}")
+        return flag
+
+    def _add(self, term):
+        self.terms.append(term)
+        return self
+
+    def __str__(self):
+        return ' '.join(self.terms) if self.terms else 'ALL'
+
+    def __repr__(self):
+        return f"SearchQuery({str(self)!r})"
+
+
+def split_literals(criteria):
+    """把含字面量的搜索条件拆分为逐次发送的片段
+
+    除最后一段外，每段以字面量的长度 "{n}" 结尾（不含 CRLF），服务器返回继续响应 "+" 后再发送下一段，
+    下一段以字面量内容开头。
+
+    Args:
+        criteria: SearchQuery.build() 返回的 bytes
+
+    Returns:
+        list: bytes 片段列表，没有字面量时只有一段
+    """
+    parts = []
+    start = 0
+    position = 0
+    while True:
+        match = _LITERAL.search(criteria, position)
+        if not match:
+            break
+        parts.append(criteria[start:match.end() - 2])
+        start = match.end()
+        # 跳过字面量内容，其中的 "{n}" 不是字面量
+        position = start + int(match.group(1))
+    parts.append(criteria[start:])
+    return parts
+
+
+class _LiteralSender:
+    """按服务器的继续响应逐个返回要发送的片段
+
+    imaplib 的 literal 属性为方法时，每收到一次继续响应就调用一次并发送返回值，
+    以此在一条命令中发送多个字面量。
+    """
+
+    def __init__(self, parts):
+        self.parts = iter(parts)
+
+    def next_part(self, continuation):
+        return next(self.parts)
+
+
+def uid_search(mail, search_criteria):
+    """在已选中的文件夹中执行 UID SEARCH
+
+    Args:
+        mail: imaplib.IMAP4 连接
+        search_criteria: IMAP搜索条件字符串或 SearchQuery
+
+    Returns:
+        tuple: 与 mail.uid('SEARCH', ...) 相同的 (status, data)
+    """
+    if not isinstance(search_criteria, SearchQuery):
+        return mail.uid('SEARCH', search_criteria)
+
+    charset, criteria = search_criteria.build()
+    if charset is None:
+        return mail.uid('SEARCH', criteria)
+
+    parts = split_literals(criteria)
+    if len(parts) > 1:
+        mail.literal = _LiteralSender(parts[1:]).next_part
+    return mail.uid('SEARCH', 'CHARSET', charset, parts[0])
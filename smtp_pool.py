@@ -0,0 +1,27 @@
+from connection_pool import ConnectionPool
+
+
+class SMTPConnectionPool(ConnectionPool):
+    """有上限的SMTP连接池
+
+    连接只在创建时完成 EHLO、STARTTLS 和登录，之后可以连续发送多封邮件；
+    借出前对空闲较久的连接执行 NOOP 健康检查，空闲超时的连接会被注销。
+    """
+
+    protocol = "SMTP"
+
+    def _is_healthy(self, server):
+        try:
+            code, _ = server.noop()
+            return code == 250
+        except Exception:
+            return False
+
+    def _logout(self, server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
@@ -0,0 +1,299 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+
+# 特征哈希的桶数（2的幂），约26万个桶，常见邮件词汇量下冲突很少
+DEFAULT_HASH_FEATURES = 2 ** 18
+
+# 训练时不作为标签使用的分类（邮件还没有被分类过）
+_UNLABELED = {'', '未分类'}
+
+# 单词之间的分隔字节：str.split() 在ASCII范围内视为空白的字符，以及分隔邮件的 \x00
+# （预处理会删除 \x00 等控制字符，文本中不会出现）
+_SEPARATORS = np.zeros(256, dtype=bool)
+_SEPARATORS[[0x00, 0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x1C, 0x1D, 0x1E, 0x1F, 0x20]] = True
+
+# 单词的多项式哈希 sum(字节 * P^位置) mod 2^32，可以由前缀和一次算出所有单词的哈希
+# （哈希桶最多只用到其中的高位，32位足够）
+_HASH_BASE = 0x01000193
+_HASH_BASE_INVERSE = pow(_HASH_BASE, -1, 2 ** 32)
+# 取哈希桶前先乘以该奇数取高位，使低位相近的哈希值也能分散到不同的桶
+_HASH_MIX = np.uint32(0x9E3779B1)
+
+# 每次哈希处理的数据量，限制前缀和等临时数组的内存，也让它们留在CPU缓存中
+_HASH_CHUNK_SIZE = 1 << 18
+
+_powers_lock = threading.Lock()
+_powers = np.ones(1, dtype=np.uint32)
+_inverse_powers = np.ones(1, dtype=np.uint32)
+
+
+def _get_powers(size):
+    """返回 P^0..P^(size-1) 和对应的逆元（uint32 乘法溢出即为 mod 2^32）"""
+    global _powers, _inverse_powers
+    with _powers_lock:
+        if len(_powers) < size:
+            powers = np.full(size, _HASH_BASE, dtype=np.uint32)
+            inverse_powers = np.full(size, _HASH_BASE_INVERSE, dtype=np.uint32)
+            powers[0] = inverse_powers[0] = 1
+            _powers = np.cumprod(powers, dtype=np.uint32)
+            _inverse_powers = np.cumprod(inverse_powers, dtype=np.uint32)
+        return _powers, _inverse_powers
+
+
+def _hash_chunk(data, shift):
+    """对一段以 \\x00 分隔邮件的数据计算每个单词的哈希桶，返回 (桶编号数组, 邮件序号数组)"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    size = len(buffer)
+    separators = _SEPARATORS[buffer]
+    words = ~separators
+    starts = np.flatnonzero(words & np.concatenate(([True], separators[:-1])))
+    ends = np.flatnonzero(words & np.concatenate((separators[1:], [True]))) + 1
+
+    powers, inverse_powers = _get_powers(size + 1)
+    prefix = np.zeros(size + 1, dtype=np.uint32)
+    np.cumsum(buffer * powers[:size], out=prefix[1:], dtype=np.uint32)
+    # 单词 [start, end) 的哈希 = (prefix[end] - prefix[start]) / P^start
+    hashes = (prefix[ends] - prefix[starts]) * inverse_powers[starts]
+    buckets = ((hashes * _HASH_MIX) >> np.uint32(shift)).astype(np.intp)
+    documents = np.searchsorted(np.flatnonzero(buffer == 0), starts)
+    return buckets, documents
+
+
+def hash_documents(documents, n_features=DEFAULT_HASH_FEATURES):
+    """计算一批邮件中每个单词的哈希桶
+
+    直接在编码后的字节上用 numpy 切分单词并计算哈希，不为每个单词创建字符串对象，
+    结果在不同进程和重启后保持不变（与内置 hash() 不同），可以保存到模型文件中。
+
+    Args:
+        documents: 每封邮件预处理后的 UTF-8 字节，单词之间以空白分隔
+        n_features: 哈希桶数量（2的幂）
+
+    Returns:
+        tuple: (桶编号数组, 每个单词所属邮件的序号数组)，按邮件顺序排列
+    """
+    if n_features > 2 ** 32:
+        raise ValueError("n_features 不能超过 2^32")
+    shift = 32 - (n_features.bit_length() - 1)
+    all_buckets = []
+    all_documents = []
+    start = 0
+    while start < len(documents):
+        # 每次取约 _HASH_CHUNK_SIZE 字节的邮件一起处理
+        stop = start
+        size = 0
+        while stop < len(documents) and (stop == start or size + len(documents[stop]) < _HASH_CHUNK_SIZE):
+            size += len(documents[stop]) + 1
+            stop += 1
+        with np.errstate(over='ignore'):
+            buckets, document_ids = _hash_chunk(b'\x00'.join(documents[start:stop]), shift)
+        all_buckets.append(buckets)
+        all_documents.append(document_ids + start)
+        start = stop
+    if not all_buckets:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(all_buckets), np.concatenate(all_documents)
+
+
+class NaiveBayesClassifier:
+    """基于哈希特征的多项式朴素贝叶斯分类器
+
+    每封邮件表示为单词哈希桶的计数（稀疏向量），模型只保存每个分类在各个桶上的单词计数，
+    因此可以随时用新的样本增量更新（partial_fit），不需要重新训练。
+    预测时整批邮件的单词一起取出对数概率后按邮件求和，整批分类只需几次数组运算。
+    """
+
+    def __init__(self, n_features=DEFAULT_HASH_FEATURES, alpha=1.0, min_samples=20, stop_words=()):
+        """初始化分类器
+
+        Args:
+            n_features: 哈希桶数量，必须是2的幂
+            alpha: 拉普拉斯平滑系数
+            min_samples: 训练样本少于该数量时 ready 为 False，由调用方改用关键词规则
+            stop_words: 训练和预测时忽略的单词，也可以是返回停用词的函数，第一次训练或预测时才调用
+        """
+        if n_features < 2 or n_features & (n_features - 1):
+            raise ValueError("n_features 必须是2的幂")
+        self.n_features = n_features
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.categories = []
+        # feature_counts[桶, 分类] 为该分类的训练邮件中落在该桶的单词数
+        self.feature_counts = np.zeros((n_features, 0), dtype=np.float32)
+        self.class_counts = np.zeros(0, dtype=np.float64)
+        self.lock = threading.Lock()
+        self._parameters = None
+
+        self.stop_words = stop_words
+        self._stop_buckets = None
+
+    @property
+    def sample_count(self):
+        return int(self.class_counts.sum())
+
+    @property
+    def ready(self):
+        """是否已有足够的训练数据（至少两个分类）"""
+        return self.sample_count >= self.min_samples and np.count_nonzero(self.class_counts) >= 2
+
+    @property
+    def stop_buckets(self):
+        """停用词所在的哈希桶，第一次使用时计算
+
+        按桶忽略停用词：与停用词同桶的少数单词也会被忽略，训练和预测时一致。
+        """
+        if self._stop_buckets is None:
+            stop_words = self.stop_words() if callable(self.stop_words) else self.stop_words
+            stop_buckets = np.zeros(self.n_features, dtype=bool)
+            if stop_words:
+                data = ' '.join(stop_words).encode('utf-8')
+                stop_buckets[hash_documents([data], self.n_features)[0]] = True
+            self._stop_buckets = stop_buckets
+        return self._stop_buckets
+
+    def _features(self, documents):
+        """计算单词的哈希桶并去掉停用词，返回 (桶编号数组, 邮件序号数组)"""
+        buckets, document_ids = hash_documents(documents, self.n_features)
+        keep = ~self.stop_buckets[buckets]
+        return buckets[keep], document_ids[keep]
+
+    def fit(self, documents, labels):
+        """清空已有的统计后重新训练
+
+        Args:
+            documents: 每封邮件预处理后的字节，见 hash_documents()
+            labels: 每封邮件的分类
+        """
+        with self.lock:
+            self.categories = []
+            self.feature_counts = np.zeros((self.n_features, 0), dtype=np.float32)
+            self.class_counts = np.zeros(0, dtype=np.float64)
+            self._parameters = None
+        self.partial_fit(documents, labels)
+
+    def partial_fit(self, documents, labels):
+        """用新的样本更新模型，遇到新的分类时自动加入
+
+        Args:
+            documents: 每封邮件预处理后的字节，见 hash_documents()
+            labels: 每封邮件的分类
+        """
+        labeled = [(document, label) for document, label in zip(documents, labels)
+                   if label is not None and label not in _UNLABELED]
+        if not labeled:
+            return
+        buckets, document_ids = self._features([document for document, _ in labeled])
+
+        with self.lock:
+            new_categories = list(dict.fromkeys(label for _, label in labeled if label not in self.categories))
+            if new_categories:
+                self.categories.extend(new_categories)
+                self.feature_counts = np.hstack([
+                    self.feature_counts,
+                    np.zeros((self.n_features, len(new_categories)), dtype=np.float32)
+                ])
+                self.class_counts = np.concatenate([self.class_counts, np.zeros(len(new_categories))])
+
+            columns = {category: index for index, category in enumerate(self.categories)}
+            label_columns = np.array([columns[label] for _, label in labeled], dtype=np.intp)
+            class_count = len(self.categories)
+            # 所有分类的计数用一次 bincount 完成：桶编号 * 分类数 + 分类列
+            counts = np.bincount(buckets * class_count + label_columns[document_ids],
+                                 minlength=self.n_features * class_count)
+            self.feature_counts += counts.reshape(self.n_features, class_count).astype(np.float32)
+            self.class_counts += np.bincount(label_columns, minlength=class_count)
+            self._parameters = None
+
+    def predict(self, documents):
+        """批量预测
+
+        Args:
+            documents: 每封邮件预处理后的字节，见 hash_documents()
+
+        Returns:
+            list: [(分类, 后验概率)]，没有任何有效单词的邮件按先验概率取最常见的分类
+        """
+        if not documents:
+            return []
+        log_probs, log_priors, categories = self._get_parameters()
+        buckets, document_ids = self._features(documents)
+
+        joint = np.tile(log_priors, (len(documents), 1))
+        if len(buckets):
+            # 单词按邮件顺序排列，reduceat 按每封邮件第一个单词的位置分段求和
+            firsts = np.flatnonzero(np.concatenate(([True], document_ids[1:] != document_ids[:-1])))
+            joint[document_ids[firsts]] += np.add.reduceat(log_probs[buckets], firsts, axis=0)
+
+        best = joint.argmax(axis=1)
+        # 最大值处的后验概率：1 / sum(exp(joint - max))
+        top = joint[np.arange(len(documents)), best]
+        confidence = 1.0 / np.exp(joint - top[:, None]).sum(axis=1)
+        return [(categories[index], float(probability)) for index, probability in zip(best, confidence)]
+
+    def _get_parameters(self):
+        """返回 (对数条件概率, 对数先验概率, 分类列表)，模型更新后第一次预测时重新计算"""
+        with self.lock:
+            if self._parameters is None:
+                counts = self.feature_counts + np.float32(self.alpha)
+                log_probs = np.log(counts) - np.log(counts.sum(axis=0))
+                log_priors = np.log(self.class_counts + 1) - np.log(self.class_counts.sum() + len(self.categories))
+                self._parameters = (log_probs.astype(np.float32), log_priors, list(self.categories))
+            return self._parameters
+
+    def save(self, path):
+        """保存模型（先写临时文件再替换，写入过程中崩溃不会损坏原模型）"""
+        with self.lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    feature_counts=self.feature_counts,
+                    class_counts=self.class_counts,
+                    categories=np.array(self.categories, dtype=str),
+                    alpha=self.alpha,
+                )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, min_samples=20, stop_words=()):
+        """读取 save() 保存的模型，文件不存在或损坏时返回 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                feature_counts = data['feature_counts']
+                model = cls(feature_counts.shape[0], float(data['alpha']), min_samples, stop_words)
+                model.feature_counts = feature_counts.astype(np.float32)
+                model.class_counts = data['class_counts'].astype(np.float64)
+                model.categories = [str(category) for category in data['categories']]
+            return model
+        except Exception as e:
+            print(f"读取分类模型失败: {e}")
+            return None
+
+
+def load_training_data(db_path):
+    """从邮件分析数据库的 emails 表读取已分类的邮件
+
+    Args:
+        db_path: 数据库路径（EmailAnalytics 使用的数据库）
+
+    Returns:
+        list: [(主题和正文合并后的文本, 分类)]
+    """
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT subject, body, category FROM emails WHERE category IS NOT NULL AND category NOT IN (?, ?)",
+            tuple(_UNLABELED)
+        ).fetchall()
+    except sqlite3.Error as e:
+        print(f"读取训练数据失败: {e}")
+        return []
+    finally:
+        conn.close()
+    return [(f"{subject or ''}\n{body or ''}", category) for subject, body, category in rows]
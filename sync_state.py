@@ -0,0 +1,156 @@
+import sqlite3
+import threading
+
+
+class SyncStateStore:
+    """邮件文件夹同步状态存储
+
+    为每个文件夹记录 UIDVALIDITY、已同步的最大 UID 和 CONDSTORE 的 HIGHESTMODSEQ，
+    与邮件分析数据一同保存在 SQLite 数据库中。
+    """
+
+    def __init__(self, db_path="email_data.db"):
+        """初始化同步状态存储
+
+        Args:
+            db_path: 数据库路径
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.initialize_db()
+
+    def initialize_db(self):
+        """初始化数据库"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS folder_sync_state (
+                account TEXT,
+                folder TEXT,
+                uidvalidity INTEGER,
+                last_uid INTEGER DEFAULT 0,
+                highest_modseq INTEGER,
+                updated_at TEXT,
+                PRIMARY KEY (account, folder)
+            )
+            ''')
+
+            # 兼容没有 highest_modseq 列的旧数据库
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(folder_sync_state)")]
+            if 'highest_modseq' not in columns:
+                conn.execute("ALTER TABLE folder_sync_state ADD COLUMN highest_modseq INTEGER")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_state(self, account, folder):
+        """获取文件夹的同步状态
+
+        Args:
+            account: 邮箱账号
+            folder: 文件夹名称
+
+        Returns:
+            tuple: (uidvalidity, last_uid)，不存在时返回 (None, 0)
+        """
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                row = conn.execute(
+                    "SELECT uidvalidity, last_uid FROM folder_sync_state WHERE account = ? AND folder = ?",
+                    (account, folder)
+                ).fetchone()
+            finally:
+                conn.close()
+
+        if not row:
+            return None, 0
+        return row[0], row[1] or 0
+
+    def save_state(self, account, folder, uidvalidity, last_uid, highest_modseq=None):
+        """保存文件夹的同步状态
+
+        Args:
+            account: 邮箱账号
+            folder: 文件夹名称
+            uidvalidity: 文件夹的 UIDVALIDITY
+            last_uid: 已同步的最大 UID
+            highest_modseq: 已同步到的 HIGHESTMODSEQ，服务器不支持 CONDSTORE 时为 None
+        """
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute('''
+                INSERT OR REPLACE INTO folder_sync_state (account, folder, uidvalidity, last_uid, highest_modseq, updated_at)
+                VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'))
+                ''', (account, folder, uidvalidity, last_uid, highest_modseq))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def get_highest_modseq(self, account, folder):
+        """获取文件夹已同步到的 HIGHESTMODSEQ，没有记录时返回 None"""
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                row = conn.execute(
+                    "SELECT highest_modseq FROM folder_sync_state WHERE account = ? AND folder = ?",
+                    (account, folder)
+                ).fetchone()
+            finally:
+                conn.close()
+
+        return row[0] if row else None
+
+    def save_highest_modseq(self, account, folder, highest_modseq):
+        """只更新文件夹的 HIGHESTMODSEQ（标记同步完成后调用）"""
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute('''
+                UPDATE folder_sync_state SET highest_modseq = ?, updated_at = datetime('now', 'localtime')
+                WHERE account = ? AND folder = ?
+                ''', (highest_modseq, account, folder))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def advance_last_uid(self, account, folder, uidvalidity, last_uid):
+        """把已同步的最大 UID 推进到 last_uid（IDLE获取新邮件后调用），HIGHESTMODSEQ 不变
+
+        只有保存的 UIDVALIDITY 与 uidvalidity 相同、且原来的 last_uid 更小时才更新，
+        没有同步记录时不更新。
+
+        Returns:
+            bool: 是否更新了同步状态
+        """
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.execute('''
+                UPDATE folder_sync_state SET last_uid = ?, updated_at = datetime('now', 'localtime')
+                WHERE account = ? AND folder = ? AND uidvalidity = ? AND last_uid < ?
+                ''', (last_uid, account, folder, uidvalidity, last_uid))
+                conn.commit()
+                return cursor.rowcount > 0
+            finally:
+                conn.close()
+
+    def reset_state(self, account, folder=None):
+        """清除同步状态，下次同步时将执行全量同步
+
+        Args:
+            account: 邮箱账号
+            folder: 文件夹名称，为 None 时清除该账号的所有文件夹
+        """
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                if folder is None:
+                    conn.execute("DELETE FROM folder_sync_state WHERE account = ?", (account,))
+                else:
+                    conn.execute("DELETE FROM folder_sync_state WHERE account = ? AND folder = ?",
+                                 (account, folder))
+                conn.commit()
+            finally:
+                conn.close()
@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_classifier import EmailClassifier
+
+EMAILS = [
+    {'subject': 'Payment', 'body': 'please pay the fee before friday'},
+    {'subject': 'Survey', 'body': 'thanks for your feedback on the product'},
+    {'subject': 'Lunch', 'body': 'see you at noon'},
+]
+
+
+class RulesChangeInvalidationTest(unittest.TestCase):
+    """新增关键词后，可能包含它的缓存结果必须失效"""
+
+    def make_classifier(self, whole_word):
+        workdir = tempfile.mkdtemp(prefix='mail-test-')
+        config = types.SimpleNamespace(
+            CATEGORY_KEYWORDS={'账单': ['invoice'], '反馈': ['survey']},
+            DEFAULT_CATEGORY='其他',
+            KEYWORD_WHOLE_WORD=whole_word,
+            CJK_SEGMENTATION='char',
+            CLASSIFICATION_RULES_FILE=os.path.join(workdir, 'rules.json'),
+            RULES_RELOAD_INTERVAL=0,
+            CLASSIFICATION_CACHE_ENABLED=True,
+            CLASSIFICATION_CACHE_DB=os.path.join(workdir, 'cache.db'),
+            NLTK_DATA_DIR=workdir,
+        )
+        classifier = EmailClassifier(config)
+        self.addCleanup(classifier.close)
+        return classifier
+
+    def classify_after_adding_fee(self, whole_word):
+        classifier = self.make_classifier(whole_word)
+        before = [category for category, _ in classifier.classify_batch(EMAILS)]
+        self.assertEqual(before, ['其他', '反馈', '其他'])
+        self.assertTrue(classifier.update_rules({'账单': ['invoice', 'fee'], '反馈': ['survey']}))
+        return [category for category, _ in classifier.classify_batch(EMAILS)]
+
+    def test_whole_word_mode(self):
+        # "feedback" 不包含完整的单词 "fee"
+        self.assertEqual(self.classify_after_adding_fee(True), ['账单', '反馈', '其他'])
+
+    def test_substring_mode(self):
+        # 按子串匹配时 "feedback" 也包含 "fee"，得分相同时按分类顺序取 "账单"
+        self.assertEqual(self.classify_after_adding_fee(False), ['账单', '账单', '其他'])
+
+
+if __name__ == '__main__':
+    unittest.main()
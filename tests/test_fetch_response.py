@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_connector import EmailConnector
+from imap_bodystructure import extract_bodystructure, parse_bodystructure, find_text_part
+
+
+def make_connector():
+    workdir = tempfile.mkdtemp(prefix='mail-test-')
+    config = types.SimpleNamespace(
+        EMAIL_ADDRESS='me@example.com',
+        EMAIL_PASSWORD='x',
+        IMAP_SERVER='127.0.0.1',
+        IMAP_PORT=993,
+        SYNC_STATE_DB=os.path.join(workdir, 'state.db'),
+    )
+    return EmailConnector(config)
+
+
+class BodystructureLiteralTest(unittest.TestCase):
+    """BODYSTRUCTURE 中的字面量应作为字符串放回，不能被当作数据项或丢弃"""
+
+    def setUp(self):
+        self.connector = make_connector()
+
+    def tearDown(self):
+        self.connector.pool.close()
+
+    def parse(self, msg_data):
+        responses = self.connector._parse_fetch_response(msg_data)
+        self.assertEqual(list(responses), ['7'])
+        return responses['7']
+
+    def test_literal_filename_and_description(self):
+        filename = '发票 "2024".pdf'.encode('utf-8')
+        description = b'scan'
+        header = b'Subject: hi\r\n\r\n'
+        # imaplib 的返回格式：每个字面量为 (前缀, 数据) 元组，之后的部分接在下一个元素中
+        msg_data = [
+            (b'1 (UID 7 FLAGS (\\Seen) BODYSTRUCTURE (("APPLICATION" "PDF" ("NAME" {%d}' % len(filename),
+             filename),
+            (b') NIL {%d}' % len(description), description),
+            (b' "BASE64" 1024 NIL ("ATTACHMENT" ("FILENAME" "a.pdf")) NIL NIL)'
+             b'("TEXT" "PLAIN" ("CHARSET" "GBK") NIL NIL "BASE64" 300 5 NIL NIL NIL NIL) "MIXED")'
+             b' BODY[HEADER.FIELDS (SUBJECT)] {%d}' % len(header), header),
+            b')',
+        ]
+        response = self.parse(msg_data)
+
+        self.assertEqual(response['literals'], {'BODY[HEADER.FIELDS (SUBJECT)]': header})
+        structure = parse_bodystructure(extract_bodystructure(response['meta']))
+        attachment, text = structure[0], structure[1]
+        self.assertEqual(attachment[2], ['NAME', '发票 "2024".pdf'])
+        self.assertIsNone(attachment[3])
+        self.assertEqual(attachment[4], 'scan')
+        self.assertEqual(attachment[5], 'BASE64')
+        self.assertEqual(structure[2], 'MIXED')
+
+        text_part = find_text_part(structure)
+        self.assertEqual(text_part['section'], '2')
+        self.assertEqual(text_part['charset'], 'GBK')
+
+    def test_message_literal_is_kept_as_data_item(self):
+        raw = b'Subject: hi\r\n\r\nbody\r\n'
+        response = self.parse([(b'1 (UID 7 RFC822 {%d}' % len(raw), raw), b')'])
+        self.assertEqual(response['literals'], {'RFC822': raw})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import datetime
+import imaplib
+import os
+import socket
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_query import SearchQuery, split_literals, uid_search
+
+
+class FakeIMAPServer(threading.Thread):
+    """在 socketpair 的一端模拟 IMAP 服务器，记录客户端发送的全部字节"""
+
+    def __init__(self, sock):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.received = b''
+
+    def run(self):
+        self.sock.sendall(b'* OK fake server ready\r\n')
+        buffer = b''
+        command = b''
+        while True:
+            data = self.sock.recv(4096)
+            if not data:
+                break
+            self.received += data
+            buffer += data
+            while b'\r\n' in buffer:
+                line, buffer = buffer.split(b'\r\n', 1)
+                command += line
+                if line.endswith(b'}'):
+                    # 字面量：返回继续响应，内容在后续数据中
+                    length = int(line[line.rindex(b'{') + 1:-1])
+                    self.sock.sendall(b'+ go ahead\r\n')
+                    while len(buffer) < length:
+                        data = self.sock.recv(4096)
+                        self.received += data
+                        buffer += data
+                    command += buffer[:length]
+                    buffer = buffer[length:]
+                    continue
+                tag = command.split(b' ', 1)[0]
+                if b' CAPABILITY' in command:
+                    self.sock.sendall(b'* CAPABILITY IMAP4rev1\r\n' + tag + b' OK done\r\n')
+                else:
+                    self.sock.sendall(b'* SEARCH 3 7\r\n' + tag + b' OK done\r\n')
+                command = b''
+        self.sock.close()
+
+
+class SocketIMAP4(imaplib.IMAP4):
+    def __init__(self, sock):
+        self._test_sock = sock
+        super().__init__()
+
+    def open(self, host='', port=imaplib.IMAP4_PORT, timeout=None):
+        self.host = host
+        self.port = port
+        self.sock = self._test_sock
+        self.file = self.sock.makefile('rb')
+
+
+class SearchQueryBuildTest(unittest.TestCase):
+    def test_ascii_terms_are_quoted(self):
+        query = SearchQuery().from_('alice@example.com').subject('a "b"').since(datetime.date(2024, 3, 5))
+        self.assertEqual(query.build(), (None, 'FROM "alice@example.com" SUBJECT "a \\"b\\"" SINCE 05-Mar-2024'))
+
+    def test_non_ascii_terms_are_literals(self):
+        query = SearchQuery().from_('张三').subject('发票').unseen()
+        self.assertEqual(query.build(), (
+            'UTF-8',
+            b'FROM {6}\r\n\xe5\xbc\xa0\xe4\xb8\x89 SUBJECT {6}\r\n\xe5\x8f\x91\xe7\xa5\xa8 UNSEEN',
+        ))
+
+    def test_split_literals(self):
+        criteria = SearchQuery().text('{3}价格').not_(SearchQuery().from_('李四')).build()[1]
+        self.assertEqual(split_literals(criteria), [
+            b'TEXT {9}',
+            b'{3}\xe4\xbb\xb7\xe6\xa0\xbc NOT FROM {6}',
+            b'\xe6\x9d\x8e\xe5\x9b\x9b',
+        ])
+
+
+class UidSearchCommandTest(unittest.TestCase):
+    def setUp(self):
+        client, server = socket.socketpair()
+        self.server = FakeIMAPServer(server)
+        self.server.start()
+        self.mail = SocketIMAP4(client)
+        self.mail.state = 'SELECTED'
+        self.server.received = b''
+
+    def tearDown(self):
+        self.mail.shutdown()
+        self.server.join(timeout=5)
+
+    def test_ascii_query(self):
+        status, data = uid_search(self.mail, SearchQuery().from_('bob').unseen())
+        self.assertEqual((status, data), ('OK', [b'3 7']))
+        self.assertRegex(self.server.received, rb'^[A-Z]+\d+ UID SEARCH FROM "bob" UNSEEN\r\n$')
+
+    def test_non_ascii_query_sends_literals(self):
+        status, data = uid_search(self.mail, SearchQuery().from_('张三').subject('发票'))
+        self.assertEqual((status, data), ('OK', [b'3 7']))
+        command = self.server.received.split(b' ', 1)[1]
+        self.assertEqual(command, (
+            b'UID SEARCH CHARSET UTF-8 FROM {6}\r\n'
+            b'\xe5\xbc\xa0\xe4\xb8\x89 SUBJECT {6}\r\n'
+            b'\xe5\x8f\x91\xe7\xa5\xa8\r\n'
+        ))
+        self.assertIsNone(self.mail.literal)
+
+
+if __name__ == '__main__':
+    unittest.main()